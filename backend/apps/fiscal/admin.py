@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import CompanyFiscalConfig, NFeImport, NFeItem
+from .models import CompanyFiscalConfig, FiscalSyncRun, NFeImport, NFeItem, NFeXmlBlob
 
 
 @admin.register(CompanyFiscalConfig)
 class CompanyFiscalConfigAdmin(admin.ModelAdmin):
-    list_display = ['company', 'cnpj', 'uf', 'is_active', 'last_nsu', 'updated_at']
+    list_display = ['company', 'cnpj', 'uf', 'is_active', 'last_nsu', 'max_nsu', 'nsu_blocked_until', 'updated_at']
     list_filter = ['is_active']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['last_sync_at', 'created_at', 'updated_at']
 
 
 class NFeItemInline(admin.TabularInline):
@@ -24,6 +24,33 @@ class NFeImportAdmin(admin.ModelAdmin):
     inlines = [NFeItemInline]
 
     def has_xml(self, obj):
-        return bool(obj.xml_encrypted)
+        return obj.has_xml
     has_xml.boolean = True
     has_xml.short_description = 'Tem XML'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('xml_encrypted')
+
+
+@admin.register(NFeXmlBlob)
+class NFeXmlBlobAdmin(admin.ModelAdmin):
+    list_display = ['xml_hash', 'size', 'stored_size', 'created_at']
+    search_fields = ['xml_hash']
+    exclude = ['data']
+    readonly_fields = ['xml_hash', 'size', 'stored_size', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FiscalSyncRun)
+class FiscalSyncRunAdmin(admin.ModelAdmin):
+    list_display = ['company', 'status', 'start_nsu', 'end_nsu', 'max_nsu', 'docs_persisted', 'docs_per_sec', 'started_at']
+    list_filter = ['status', 'company']
+    readonly_fields = [f.name for f in FiscalSyncRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,69 @@
+"""
+Benchmark da sincronização por NSU contra uma SEFAZ local (fake_sefaz).
+Roda dentro de uma transação desfeita ao final (não deixa dados no banco).
+
+    python manage.py bench_nsu_sync --docs 1000 --latency 0.2 --workers 1 4
+    python manage.py bench_nsu_sync --serve --port 8089 --docs 5000
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.fiscal.models import CompanyFiscalConfig, NFeImport
+from apps.fiscal.services import client_cache
+from apps.fiscal.services.crypto import fiscal_crypto
+from apps.fiscal.services.fake_sefaz import FakeSefazServer, self_signed_pfx
+from apps.fiscal.services.nsu_sync import sync_company
+from apps.users.models import CompanySettings
+from core.bench import rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Mede docs/s da sincronização NSU com latência simulada da SEFAZ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=1000, help='Documentos disponíveis na SEFAZ local.')
+        parser.add_argument('--latency', type=float, default=0.2, help='Latência por consulta (s).')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='Tamanhos do pool de parse.')
+        parser.add_argument('--serve', action='store_true', help='Só sobe a SEFAZ local (Ctrl+C para sair).')
+        parser.add_argument('--port', type=int, default=0)
+
+    def handle(self, *args, **options):
+        server = FakeSefazServer(total_docs=options['docs'], latency=options['latency'], port=options['port'])
+        if options['serve']:
+            self.stdout.write(f'SEFAZ local em {server.url} (FISCAL_SEFAZ_DIST_URL)')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+        server.start()
+        try:
+            with override_settings(FISCAL_SEFAZ_DIST_URL=server.url):
+                self.stdout.write(f'{options["docs"]} docs, latência {options["latency"]}s')
+                self.stdout.write(f'{"workers":>8} {"páginas":>8} {"docs/s":>8} {"fetch ms":>9} '
+                                  f'{"parse ms":>9} {"persist ms":>11} {"total s":>8}')
+                for workers in options['workers']:
+                    with rolled_back():
+                        self._run(workers, options['docs'])
+        finally:
+            client_cache.invalidate()
+            server.stop()
+
+    def _run(self, workers, docs):
+        company = CompanySettings.objects.create(name='__bench_nsu__')
+        password = 'bench'
+        CompanyFiscalConfig.objects.create(
+            company=company, cnpj='98765432000110', uf='SP',
+            cert_pfx_encrypted=fiscal_crypto.encrypt(self_signed_pfx(password)),
+            cert_password_encrypted=fiscal_crypto.encrypt_str(password).decode('utf-8'),
+        )
+        started = time.perf_counter()
+        run = sync_company(company.id, max_docs=docs, workers=workers, min_interval=0)
+        elapsed = time.perf_counter() - started
+        assert NFeImport.objects.filter(company=company).count() == run.docs_persisted
+        self.stdout.write(
+            f'{workers:>8} {run.pages:>8} {float(run.docs_per_sec):>8.1f} {run.fetch_ms:>9} '
+            f'{run.parse_ms:>9} {run.persist_ms:>11} {elapsed:>8.2f}'
+        )
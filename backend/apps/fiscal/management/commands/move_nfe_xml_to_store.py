@@ -0,0 +1,28 @@
+"""
+Move o XML das NF-e gravado inline (NFeImport.xml_encrypted) para o
+armazenamento comprimido por hash (NFeXmlBlob). Pode ser executado de novo
+sem efeito nas NF-e já migradas.
+
+    python manage.py move_nfe_xml_to_store --batch 200
+"""
+from django.core.management.base import BaseCommand
+
+from apps.fiscal.services.xml_store import migrate_inline
+
+
+class Command(BaseCommand):
+    help = 'Migra XMLs de NF-e inline para NFeXmlBlob (gzip + criptografia, sem duplicados).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=200, help='NF-e por lote.')
+
+    def handle(self, *args, **options):
+        stats = migrate_inline(batch_size=max(options['batch'], 1))
+        self.stdout.write(
+            f'Migrados: {stats["moved"]}  falhas: {stats["failed"]}  '
+            f'inline: {stats["inline_bytes"]} bytes -> armazenado: {stats["stored_bytes"]} bytes'
+        )
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(
+                'XMLs com falha não foram alterados (chave de criptografia diferente?).'
+            ))
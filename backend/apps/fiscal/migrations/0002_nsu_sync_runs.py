@@ -0,0 +1,60 @@
+# Migration: NSU sync scheduling state (consMaxNSU, backoff window) and FiscalSyncRun metrics
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_must_change_password'),
+        ('fiscal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyfiscalconfig',
+            name='max_nsu',
+            field=models.CharField(default='0', max_length=20, verbose_name='Maior NSU na SEFAZ (consMaxNSU)'),
+        ),
+        migrations.AddField(
+            model_name='companyfiscalconfig',
+            name='nsu_blocked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Próxima consulta NSU permitida em'),
+        ),
+        migrations.AddField(
+            model_name='companyfiscalconfig',
+            name='last_sync_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última sincronização NSU'),
+        ),
+        migrations.CreateModel(
+            name='FiscalSyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Em andamento'), ('success', 'Concluída'), ('partial', 'Parcial (limite de documentos)'), ('blocked', 'Bloqueada pela SEFAZ (656)'), ('error', 'Erro')], default='running', max_length=10, verbose_name='Status')),
+                ('start_nsu', models.CharField(default='0', max_length=20, verbose_name='NSU inicial')),
+                ('end_nsu', models.CharField(default='0', max_length=20, verbose_name='NSU final')),
+                ('max_nsu', models.CharField(blank=True, max_length=20, verbose_name='consMaxNSU')),
+                ('pages', models.PositiveIntegerField(default=0, verbose_name='Páginas consultadas')),
+                ('docs_received', models.PositiveIntegerField(default=0, verbose_name='Documentos recebidos')),
+                ('docs_persisted', models.PositiveIntegerField(default=0, verbose_name='Documentos gravados')),
+                ('fetch_ms', models.PositiveIntegerField(default=0, verbose_name='Tempo em consultas (ms)')),
+                ('parse_ms', models.PositiveIntegerField(default=0, verbose_name='Tempo em decodificação (ms, soma dos workers)')),
+                ('persist_ms', models.PositiveIntegerField(default=0, verbose_name='Tempo gravando (ms)')),
+                ('docs_per_sec', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Documentos/s')),
+                ('batches', models.JSONField(blank=True, default=list, verbose_name='Métricas por página')),
+                ('last_cstat', models.CharField(blank=True, max_length=10, verbose_name='Último cStat')),
+                ('last_xmotivo', models.TextField(blank=True, verbose_name='Último xMotivo')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Início')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fim')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fiscal_sync_runs', to='users.companysettings', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Sincronização NSU',
+                'verbose_name_plural': 'Sincronizações NSU',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['company', 'started_at'], name='fiscal_syncrun_company_idx')],
+            },
+        ),
+    ]
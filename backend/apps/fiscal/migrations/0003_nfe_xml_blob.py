@@ -0,0 +1,27 @@
+# Migration: NF-e XML blob store (compressed, content-addressed by xml_hash)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiscal', '0002_nsu_sync_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFeXmlBlob',
+            fields=[
+                ('xml_hash', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Hash SHA256 do XML')),
+                ('data', models.BinaryField(verbose_name='XML comprimido e criptografado')),
+                ('size', models.PositiveIntegerField(verbose_name='Tamanho original (bytes)')),
+                ('stored_size', models.PositiveIntegerField(verbose_name='Tamanho armazenado (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'XML de NF-e',
+                'verbose_name_plural': 'XMLs de NF-e',
+            },
+        ),
+    ]
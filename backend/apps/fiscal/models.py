@@ -26,6 +26,13 @@ class CompanyFiscalConfig(models.Model):
     )
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
     last_nsu = models.CharField(max_length=20, default='0', verbose_name='Último NSU')
+    max_nsu = models.CharField(max_length=20, default='0', verbose_name='Maior NSU na SEFAZ (consMaxNSU)')
+    nsu_blocked_until = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Próxima consulta NSU permitida em'
+    )  # cStat 137/656 ou ultNSU == maxNSU: SEFAZ exige 1 hora de espera
+    last_sync_at = models.DateTimeField(blank=True, null=True, verbose_name='Última sincronização NSU')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -126,7 +133,28 @@ class NFeImport(models.Model):
 
     @property
     def has_xml(self):
-        return bool(self.xml_encrypted)
+        # xml_hash acompanha sempre o XML (em NFeXmlBlob ou, legado, em xml_encrypted)
+        return bool(self.xml_hash)
+
+
+class NFeXmlBlob(models.Model):
+    """
+    XML completo de NF-e fora da tabela principal, endereçado pelo SHA256 do XML
+    (NFeImport.xml_hash): comprimido (gzip) e depois criptografado (Fernet).
+    Mesmo XML em mais de uma importação é gravado uma única vez.
+    """
+    xml_hash = models.CharField(max_length=64, primary_key=True, verbose_name='Hash SHA256 do XML')
+    data = models.BinaryField(verbose_name='XML comprimido e criptografado')
+    size = models.PositiveIntegerField(verbose_name='Tamanho original (bytes)')
+    stored_size = models.PositiveIntegerField(verbose_name='Tamanho armazenado (bytes)')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'XML de NF-e'
+        verbose_name_plural = 'XMLs de NF-e'
+
+    def __str__(self):
+        return f'XML {self.xml_hash[:12]} ({self.stored_size}/{self.size} bytes)'
 
 
 class NFeItem(models.Model):
@@ -169,3 +197,54 @@ class NFeItem(models.Model):
 
     def __str__(self):
         return f'{self.item_number} - {self.description[:50]}'
+
+
+class FiscalSyncRunStatus(models.TextChoices):
+    RUNNING = 'running', 'Em andamento'
+    SUCCESS = 'success', 'Concluída'
+    PARTIAL = 'partial', 'Parcial (limite de documentos)'
+    BLOCKED = 'blocked', 'Bloqueada pela SEFAZ (656)'
+    ERROR = 'error', 'Erro'
+
+
+class FiscalSyncRun(models.Model):
+    """Execução de sincronização por NSU: progresso e métricas de vazão."""
+    company = models.ForeignKey(
+        'users.CompanySettings',
+        on_delete=models.CASCADE,
+        related_name='fiscal_sync_runs',
+        verbose_name='Empresa'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=FiscalSyncRunStatus.choices,
+        default=FiscalSyncRunStatus.RUNNING,
+        verbose_name='Status'
+    )
+    start_nsu = models.CharField(max_length=20, default='0', verbose_name='NSU inicial')
+    end_nsu = models.CharField(max_length=20, default='0', verbose_name='NSU final')
+    max_nsu = models.CharField(max_length=20, blank=True, verbose_name='consMaxNSU')
+    pages = models.PositiveIntegerField(default=0, verbose_name='Páginas consultadas')
+    docs_received = models.PositiveIntegerField(default=0, verbose_name='Documentos recebidos')
+    docs_persisted = models.PositiveIntegerField(default=0, verbose_name='Documentos gravados')
+    fetch_ms = models.PositiveIntegerField(default=0, verbose_name='Tempo em consultas (ms)')
+    parse_ms = models.PositiveIntegerField(default=0, verbose_name='Tempo em decodificação (ms, soma dos workers)')
+    persist_ms = models.PositiveIntegerField(default=0, verbose_name='Tempo gravando (ms)')
+    docs_per_sec = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Documentos/s')
+    batches = models.JSONField(default=list, blank=True, verbose_name='Métricas por página')
+    last_cstat = models.CharField(max_length=10, blank=True, verbose_name='Último cStat')
+    last_xmotivo = models.TextField(blank=True, verbose_name='Último xMotivo')
+    error = models.TextField(blank=True, verbose_name='Erro')
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name='Início')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='Fim')
+
+    class Meta:
+        verbose_name = 'Sincronização NSU'
+        verbose_name_plural = 'Sincronizações NSU'
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['company', 'started_at'], name='fiscal_syncrun_company_idx'),
+        ]
+
+    def __str__(self):
+        return f'Sync NSU {self.company_id} {self.start_nsu}->{self.end_nsu} ({self.status})'
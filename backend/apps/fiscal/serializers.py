@@ -2,7 +2,7 @@
 Serializers do módulo fiscal.
 """
 from rest_framework import serializers
-from .models import CompanyFiscalConfig, NFeImport, NFeItem
+from .models import CompanyFiscalConfig, FiscalSyncRun, NFeImport, NFeItem
 
 
 class CompanyFiscalConfigSerializer(serializers.ModelSerializer):
@@ -11,10 +11,12 @@ class CompanyFiscalConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = CompanyFiscalConfig
         fields = [
-            'id', 'cnpj', 'uf', 'is_active', 'last_nsu',
-            'created_at', 'updated_at',
+            'id', 'cnpj', 'uf', 'is_active', 'last_nsu', 'max_nsu',
+            'nsu_blocked_until', 'last_sync_at', 'created_at', 'updated_at',
+        ]
+        read_only_fields = [
+            'id', 'last_nsu', 'max_nsu', 'nsu_blocked_until', 'last_sync_at', 'created_at', 'updated_at',
         ]
-        read_only_fields = ['id', 'last_nsu', 'created_at', 'updated_at']
 
 
 class CompanyFiscalConfigCreateUpdateSerializer(serializers.Serializer):
@@ -64,7 +66,7 @@ class NFeImportListSerializer(serializers.ModelSerializer):
         return '-'
 
     def get_tem_xml(self, obj):
-        return bool(obj.xml_encrypted)
+        return obj.has_xml
 
 
 class NFeImportDetailSerializer(serializers.ModelSerializer):
@@ -86,4 +88,18 @@ class NFeImportDetailSerializer(serializers.ModelSerializer):
         return obj.resumo_json or {}
 
     def get_tem_xml(self, obj):
-        return bool(obj.xml_encrypted)
+        return obj.has_xml
+
+
+class FiscalSyncRunSerializer(serializers.ModelSerializer):
+    """Execução da sincronização por NSU (progresso e métricas)."""
+
+    class Meta:
+        model = FiscalSyncRun
+        fields = [
+            'id', 'status', 'start_nsu', 'end_nsu', 'max_nsu', 'pages',
+            'docs_received', 'docs_persisted', 'fetch_ms', 'parse_ms', 'persist_ms',
+            'docs_per_sec', 'batches', 'last_cstat', 'last_xmotivo', 'error',
+            'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
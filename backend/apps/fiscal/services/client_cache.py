@@ -0,0 +1,56 @@
+"""
+Cache por processo de SefazDistribuicaoClient (certificado já descriptografado,
+PEM gravado uma vez e sessão HTTP keep-alive).
+
+Chave: CompanyFiscalConfig.id; o client é reaproveitado enquanto updated_at da
+configuração não mudar (novo certificado/senha/CNPJ/UF) e até CLIENT_MAX_AGE.
+A sincronização por NSU não altera updated_at (grava só os campos de NSU).
+"""
+import threading
+import time
+
+from .crypto import fiscal_crypto
+
+CLIENT_MAX_AGE = 6 * 60 * 60
+
+_lock = threading.Lock()
+_clients = {}  # config_id -> (updated_at, created, client)
+
+
+def decrypt_certificate(config):
+    """(pfx_bytes, senha) descriptografados da configuração fiscal."""
+    pass_data = config.cert_password_encrypted
+    if isinstance(pass_data, str):
+        pass_data = pass_data.encode('utf-8')
+    elif pass_data is not None:
+        pass_data = bytes(pass_data)
+    pfx = fiscal_crypto.decrypt(bytes(config.cert_pfx_encrypted or b''))
+    return pfx, fiscal_crypto.decrypt_str(pass_data or b'')
+
+
+def get_client(config):
+    """Client da empresa (cria na primeira chamada ou quando a configuração mudou)."""
+    from .sefaz_client import SefazDistribuicaoClient
+
+    now = time.monotonic()
+    with _lock:
+        entry = _clients.get(config.pk)
+        if entry and entry[0] == config.updated_at and now - entry[1] < CLIENT_MAX_AGE:
+            return entry[2]
+        if entry:
+            _clients.pop(config.pk)
+            entry[2].close()
+        pfx, password = decrypt_certificate(config)
+        client = SefazDistribuicaoClient(pfx_bytes=pfx, password=password, cnpj=config.cnpj, uf=config.uf, tp_amb=1)
+        _clients[config.pk] = (config.updated_at, now, client)
+        return client
+
+
+def invalidate(config_id=None):
+    """Descarta o client de uma configuração (ou todos)."""
+    with _lock:
+        ids = list(_clients) if config_id is None else [config_id]
+        for pk in ids:
+            entry = _clients.pop(pk, None)
+            if entry:
+                entry[2].close()
@@ -0,0 +1,185 @@
+"""
+SEFAZ local (NFeDistribuicaoDFe) para testes e benchmark da sincronização por NSU.
+
+Servidor HTTP que responde ao envelope SOAP de distNSU com docZips gerados
+(resNFe e procNFe, gzip + base64), páginas de até 50 documentos, cStat 138/137
+e, opcionalmente, 656 após N páginas. Não usar em produção.
+
+Uso:
+    server = FakeSefazServer(total_docs=500, latency=0.2)
+    server.start()
+    # settings.FISCAL_SEFAZ_DIST_URL = server.url
+    ...
+    server.stop()
+"""
+import base64
+import gzip
+import re
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NFE_NS = 'http://www.portalfiscal.inf.br/nfe'
+PAGE_SIZE = 50
+_ULT_NSU = re.compile(r'<ultNSU>(\d+)</ultNSU>')
+
+
+def access_key_for(nsu, cnpj='12345678000190'):
+    """Chave de 44 dígitos determinística para o NSU."""
+    return f'3524{cnpj[:14]:0>14}55001{nsu:09d}1{nsu % 100000000:08d}0'[:44].ljust(44, '0')
+
+
+def res_nfe_xml(nsu):
+    return (
+        f'<resNFe xmlns="{NFE_NS}" versao="1.01">'
+        f'<chNFe>{access_key_for(nsu)}</chNFe><CNPJ>12345678000190</CNPJ>'
+        f'<xNome>FORNECEDOR {nsu}</xNome><dhEmi>2024-01-15T10:00:00-03:00</dhEmi>'
+        f'<vNF>{nsu}.00</vNF><cSitNFe>1</cSitNFe></resNFe>'
+    ).encode('utf-8')
+
+
+def proc_nfe_xml(nsu, items=3):
+    dets = ''.join(
+        f'<det nItem="{n}"><prod><cProd>{n}</cProd><xProd>PRODUTO {n}</xProd><NCM>23091000</NCM>'
+        f'<CFOP>5102</CFOP><qCom>2.0000</qCom><vUnCom>10.00</vUnCom><vProd>20.00</vProd></prod></det>'
+        for n in range(1, items + 1)
+    )
+    return (
+        f'<nfeProc xmlns="{NFE_NS}" versao="4.00"><NFe><infNFe Id="NFe{access_key_for(nsu)}" versao="4.00">'
+        f'<ide><dhEmi>2024-01-15T10:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>12345678000190</CNPJ><xNome>FORNECEDOR {nsu}</xNome></emit>'
+        f'<dest><CNPJ>98765432000110</CNPJ><xNome>PETSHOP</xNome></dest>{dets}'
+        f'<total><ICMSTot><vNF>{20 * items}.00</vNF></ICMSTot></total>'
+        f'</infNFe></NFe><protNFe><infProt><chNFe>{access_key_for(nsu)}</chNFe><cStat>100</cStat></infProt>'
+        f'</protNFe></nfeProc>'
+    ).encode('utf-8')
+
+
+def doc_zip_dict(nsu, full):
+    """docZip no formato devolvido por SefazDistribuicaoClient ({'nsu', 'schema', 'value'})."""
+    xml = proc_nfe_xml(nsu) if full else res_nfe_xml(nsu)
+    return {
+        'nsu': f'{nsu:015d}',
+        'schema': 'procNFe_v4.00.xsd' if full else 'resNFe_v1.01.xsd',
+        'value': base64.b64encode(gzip.compress(xml)).decode('ascii'),
+    }
+
+
+def doc_zip(nsu, full):
+    doc = doc_zip_dict(nsu, full)
+    return f'<docZip NSU="{doc["nsu"]}" schema="{doc["schema"]}">{doc["value"]}</docZip>'
+
+
+def envelope(c_stat, x_motivo, ult_nsu, max_nsu, doc_zips=()):
+    lote = f'<loteDistDFeInt>{"".join(doc_zips)}</loteDistDFeInt>' if doc_zips else ''
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+        '<nfeDistDFeInteresseResponse xmlns="http://www.portalfiscal.inf.br/nfe/wsdl/NFeDistribuicaoDFe">'
+        f'<nfeDistDFeInteresseResult><retDistDFeInt xmlns="{NFE_NS}" versao="1.01">'
+        f'<tpAmb>2</tpAmb><verAplic>FAKE</verAplic><cStat>{c_stat}</cStat><xMotivo>{x_motivo}</xMotivo>'
+        f'<dhResp>{datetime.now(dt_timezone.utc).isoformat()}</dhResp>'
+        f'<ultNSU>{ult_nsu:015d}</ultNSU><maxNSU>{max_nsu:015d}</maxNSU>{lote}'
+        '</retDistDFeInt></nfeDistDFeInteresseResult></nfeDistDFeInteresseResponse>'
+        '</soap:Body></soap:Envelope>'
+    )
+
+
+class FakeSefazServer:
+    """
+    total_docs: maior NSU disponível; full_every: a cada N NSUs um procNFe (demais resNFe);
+    latency: segundos de espera por consulta; block_after_pages: responde 656 a partir da página N.
+    """
+
+    def __init__(self, total_docs=200, full_every=2, latency=0.0, block_after_pages=None, host='127.0.0.1', port=0):
+        self.total_docs = total_docs
+        self.full_every = max(full_every, 1)
+        self.latency = latency
+        self.block_after_pages = block_after_pages
+        self.requests = []
+        self.connections = set()  # (host, porta) dos clientes: mede o reuso de conexão
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/NFeDistribuicaoDFe.asmx'
+
+    def respond(self, ult_nsu):
+        """Corpo SOAP da consulta a partir de ult_nsu."""
+        with self._lock:
+            self.requests.append(ult_nsu)
+            page = len(self.requests)
+        if self.block_after_pages is not None and page > self.block_after_pages:
+            return envelope(656, 'Rejeicao: Consumo Indevido', ult_nsu, self.total_docs)
+        if ult_nsu >= self.total_docs:
+            return envelope(137, 'Nenhum documento localizado', ult_nsu, self.total_docs)
+        last = min(ult_nsu + PAGE_SIZE, self.total_docs)
+        docs = [doc_zip(nsu, nsu % self.full_every == 0) for nsu in range(ult_nsu + 1, last + 1)]
+        return envelope(138, 'Documento localizado', last, self.total_docs, docs)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_POST(self):
+                with server._lock:
+                    server.connections.add(self.client_address)
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8', 'replace')
+                match = _ULT_NSU.search(body)
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                payload = server.respond(int(match.group(1)) if match else 0).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-sefaz', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+
+def self_signed_pfx(password, cnpj='12345678000190'):
+    """Certificado A1 autoassinado (PFX) para o client falar com o servidor local."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f'EMPRESA TESTE:{cnpj}')])
+    now = datetime.now(dt_timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    return pkcs12.serialize_key_and_certificates(
+        b'teste', key, cert, None, serialization.BestAvailableEncryption(password.encode('utf-8')),
+    )
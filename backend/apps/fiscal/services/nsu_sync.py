@@ -0,0 +1,464 @@
+"""
+Sincronização de NF-es por NSU (NFeDistribuicaoDFe / distNSU) com controle de consumo.
+
+Regras da SEFAZ:
+- as consultas de uma empresa são sequenciais (cada uma parte do ultNSU anterior);
+- cStat 137 (nenhum documento) ou ultNSU == maxNSU: aguardar 1 hora;
+- cStat 656 (consumo indevido): bloqueio de 1 hora.
+A janela fica em CompanyFiscalConfig.nsu_blocked_until; o agendador não
+despacha a empresa antes dela e há um intervalo mínimo entre consultas
+(FISCAL_NSU_MIN_REQUEST_INTERVAL). Uma única sincronização por empresa por vez:
+no PostgreSQL via advisory lock de sessão (pg_try_advisory_lock) por empresa,
+válido entre todos os workers; em outros bancos via cache.add.
+
+Pipeline: enquanto a página N é descompactada/parseada/comprimida/criptografada por um pool
+limitado de threads (FISCAL_NSU_SYNC_WORKERS), a página N+1 já é consultada;
+a página N é gravada em seguida, na thread principal. last_nsu só avança depois
+da gravação da página. Progresso e métricas ficam em FiscalSyncRun.
+
+Cada docZip é parseado uma única vez (parse_doc). A gravação de uma página usa
+uma transação e um número fixo de queries: NFeImport existentes buscados com
+access_key__in, novos com bulk_create, demais com bulk_update e itens
+substituídos com um DELETE e um bulk_create. O XML completo vai para o
+NFeXmlBlob (xml_store), fora da linha de NFeImport.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import (
+    CompanyFiscalConfig, FiscalSyncRun, FiscalSyncRunStatus, NFeImport, NFeImportStatus, NFeItem,
+)
+from . import client_cache, xml_store
+from .xml_parser import _local_name, decode_doc_zip_tree, parse_nfe_xml_fiscal, parse_res_nfe_xml
+
+logger = logging.getLogger(__name__)
+
+CSTAT_DOCS_FOUND = '138'
+CSTAT_NO_DOCS = '137'
+CSTAT_BLOCKED = '656'
+MAX_BATCH_METRICS = 200
+LOCK_TIMEOUT = 15 * 60
+# Primeiro argumento de pg_try_advisory_lock(int, int): separa estes locks de outros usos
+NSU_LOCK_NAMESPACE = 0x4E53  # 'NS'
+
+
+@dataclass
+class ParsedDoc:
+    """docZip descompactado e parseado uma única vez (no pool de workers)."""
+    nsu: str
+    schema: str
+    access_key: str = ''
+    resumo: Optional[dict] = None
+    items: List[dict] = field(default_factory=list)
+    xml_hash: Optional[str] = None
+    xml_blob: Optional[bytes] = None  # gzip + Fernet (xml_store.pack)
+    xml_size: int = 0
+    error: str = ''
+    parse_ms: float = 0
+
+    @property
+    def is_full(self):
+        return self.xml_hash is not None
+
+
+@dataclass
+class Page:
+    """Página retornada pela SEFAZ com os documentos em processamento."""
+    requested_nsu: str
+    ult_nsu: str
+    max_nsu: str
+    c_stat: str
+    x_motivo: str
+    fetch_ms: float
+    futures: list
+
+
+def _is_full_nfe(schema):
+    return 'procNFe' in schema or 'nfeProc' in schema or schema.startswith('NFe')
+
+
+def parse_doc(doc) -> Optional[ParsedDoc]:
+    """Descompacta e parseia um docZip (uma única vez); None para documentos ignorados (eventos)."""
+    started = time.perf_counter()
+    nsu = doc.get('nsu') or ''
+    schema = doc.get('schema') or ''
+    value = doc.get('value') or ''
+    if not value:
+        return None
+    try:
+        xml_bytes, root = decode_doc_zip_tree(value)
+        schema = schema or _local_name(root.tag)
+        if 'resNFe' in schema:
+            resumo = parse_res_nfe_xml(root)
+            parsed = ParsedDoc(nsu, 'resNFe', resumo['chave'], resumo)
+        elif _is_full_nfe(schema):
+            nfe = parse_nfe_xml_fiscal(root)
+            parsed = ParsedDoc(
+                nsu, schema, nfe['chave'],
+                resumo={
+                    'chave': nfe['chave'],
+                    'emitente': nfe['emitente'],
+                    'destinatario': nfe['destinatario'],
+                    'data_emissao': nfe['data_emissao'],
+                    'valor_total': nfe['valor_total'],
+                    'situacao': nfe.get('situacao', '1'),
+                },
+                items=nfe.get('items', []),
+            )
+            parsed.xml_hash, parsed.xml_blob, parsed.xml_size = xml_store.pack(xml_bytes)
+        else:
+            return None
+    except Exception as e:
+        parsed = ParsedDoc(nsu, schema, error=str(e)[:200])
+    parsed.parse_ms = (time.perf_counter() - started) * 1000
+    return parsed
+
+
+def _latest_per_key(docs):
+    """Um documento por chave: a NF-e completa prevalece sobre o resumo; depois, o maior NSU."""
+    by_key = {}
+    for doc in docs:
+        if doc is None or doc.error or len(doc.access_key) != 44:
+            continue
+        current = by_key.get(doc.access_key)
+        if current is None or (doc.is_full, doc.nsu) >= (current.is_full, current.nsu):
+            by_key[doc.access_key] = doc
+    return by_key
+
+
+def _apply(nfe, doc, c_stat, x_motivo, now):
+    nfe.resumo_json = doc.resumo
+    nfe.schema = doc.schema
+    nfe.status = NFeImportStatus.IMPORTED
+    nfe.imported_at = now
+    nfe.nsu = doc.nsu or nfe.nsu
+    nfe.sefaz_cstat = c_stat
+    nfe.sefaz_xmotivo = x_motivo
+    if doc.is_full:
+        nfe.xml_hash = doc.xml_hash
+        nfe.xml_encrypted = None  # XML fica em NFeXmlBlob
+
+
+UPDATE_FIELDS = ['resumo_json', 'schema', 'status', 'imported_at', 'nsu', 'sefaz_cstat', 'sefaz_xmotivo', 'updated_at']
+XML_FIELDS = ['xml_encrypted', 'xml_hash']
+
+
+def persist_docs(company, docs, c_stat, x_motivo):
+    """
+    Grava os documentos de uma página (uma transação, queries constantes).
+    Resumo não substitui NF-e completa já gravada. Retorna quantos foram gravados.
+    """
+    by_key = _latest_per_key(docs)
+    if not by_key:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            nfe.access_key: nfe
+            for nfe in NFeImport.objects.filter(company=company, access_key__in=list(by_key))
+            .defer('xml_encrypted')
+        }
+        created, updated = [], []
+        for key, doc in by_key.items():
+            nfe = existing.get(key)
+            if nfe is None:
+                nfe = NFeImport(company=company, access_key=key)
+                created.append(nfe)
+            elif not doc.is_full and nfe.has_xml:
+                continue  # resumo não substitui a NF-e completa já gravada
+            else:
+                nfe.updated_at = now
+                updated.append(nfe)
+            _apply(nfe, doc, c_stat, x_motivo, now)
+
+        xml_store.save_many(
+            (doc.xml_hash, doc.xml_blob, doc.xml_size) for doc in by_key.values() if doc.is_full
+        )
+        NFeImport.objects.bulk_create(created, batch_size=500)
+        if any(nfe.pk is None for nfe in created):
+            # Backend sem RETURNING no INSERT em lote: busca os ids criados
+            ids = dict(NFeImport.objects.filter(
+                company=company, access_key__in=[nfe.access_key for nfe in created],
+            ).values_list('access_key', 'pk'))
+            for nfe in created:
+                nfe.pk = ids[nfe.access_key]
+        # xml_encrypted vem adiado: só entra no UPDATE das NF-e completas
+        updated_full = [nfe for nfe in updated if by_key[nfe.access_key].is_full]
+        updated_res = [nfe for nfe in updated if not by_key[nfe.access_key].is_full]
+        if updated_full:
+            NFeImport.objects.bulk_update(updated_full, UPDATE_FIELDS + XML_FIELDS, batch_size=500)
+        if updated_res:
+            NFeImport.objects.bulk_update(updated_res, UPDATE_FIELDS, batch_size=500)
+
+        full = [nfe for nfe in created + updated if by_key[nfe.access_key].is_full]
+        if full:
+            if updated_full:
+                NFeItem.objects.filter(nfe_import__in=[nfe.pk for nfe in updated_full]).delete()
+            NFeItem.objects.bulk_create([
+                NFeItem(
+                    nfe_import_id=nfe.pk,
+                    item_number=item['item_number'],
+                    description=item['description'],
+                    ncm=item.get('ncm', ''),
+                    cfop=item.get('cfop', ''),
+                    qty=item['qty'],
+                    unit_price=item['unit_price'],
+                    total=item['total'],
+                )
+                for nfe in full
+                for item in by_key[nfe.access_key].items
+            ], batch_size=1000)
+    return len(created) + len(updated)
+
+
+def _nsu_int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class NsuSyncRunner:
+    """Executa uma sincronização por NSU de uma empresa com o client informado."""
+
+    def __init__(self, config, client, max_docs=50, workers=None, min_interval=None, backoff_seconds=None,
+                 sleep=time.sleep):
+        self.config = config
+        self.client = client
+        self.max_docs = max_docs
+        self.workers = max(workers or getattr(settings, 'FISCAL_NSU_SYNC_WORKERS', 4), 1)
+        self.min_interval = getattr(settings, 'FISCAL_NSU_MIN_REQUEST_INTERVAL', 1.0) if min_interval is None else min_interval
+        self.backoff = getattr(settings, 'FISCAL_NSU_BACKOFF_SECONDS', 3600) if backoff_seconds is None else backoff_seconds
+        self.sleep = sleep
+        self._last_request = None
+
+    def _fetch(self, ult_nsu):
+        if self._last_request is not None:
+            wait = self.min_interval - (time.monotonic() - self._last_request)
+            if wait > 0:
+                self.sleep(wait)
+        self._last_request = time.monotonic()
+        started = time.perf_counter()
+        result = self.client.distribuicao_por_ult_nsu(ult_nsu)
+        return result, (time.perf_counter() - started) * 1000
+
+    def _block(self):
+        self.config.nsu_blocked_until = timezone.now() + timedelta(seconds=self.backoff)
+
+    def _persist(self, run, page):
+        wait_started = time.perf_counter()
+        docs = [f.result() for f in page.futures]
+        wait_ms = (time.perf_counter() - wait_started) * 1000
+        started = time.perf_counter()
+        saved = persist_docs(self.config.company, docs, page.c_stat, page.x_motivo)
+        persist_ms = (time.perf_counter() - started) * 1000
+
+        self.config.last_nsu = page.ult_nsu.lstrip('0') or '0'
+        if page.max_nsu:
+            self.config.max_nsu = page.max_nsu.lstrip('0') or '0'
+        self.config.save(update_fields=['last_nsu', 'max_nsu'])
+
+        parse_ms = sum(d.parse_ms for d in docs if d is not None)
+        run.docs_persisted += saved
+        run.parse_ms += round(parse_ms)
+        run.persist_ms += round(persist_ms)
+        run.end_nsu = self.config.last_nsu
+        if len(run.batches) < MAX_BATCH_METRICS:
+            run.batches.append({
+                'nsu': page.requested_nsu,
+                'ult_nsu': self.config.last_nsu,
+                'docs': len(page.futures),
+                'saved': saved,
+                'errors': sum(1 for d in docs if d is not None and d.error),
+                'fetch_ms': round(page.fetch_ms, 1),
+                'parse_ms': round(parse_ms, 1),
+                'parse_wait_ms': round(wait_ms, 1),
+                'persist_ms': round(persist_ms, 1),
+            })
+        run.save(update_fields=[
+            'docs_persisted', 'parse_ms', 'persist_ms', 'end_nsu', 'batches', 'pages', 'docs_received', 'fetch_ms',
+        ])
+
+    def run(self) -> FiscalSyncRun:
+        config = self.config
+        run = FiscalSyncRun.objects.create(
+            company_id=config.company_id,
+            start_nsu=config.last_nsu or '0',
+            end_nsu=config.last_nsu or '0',
+            max_nsu=config.max_nsu or '',
+        )
+        started = time.perf_counter()
+        ult_nsu = config.last_nsu or '0'
+        pending = None
+        status = FiscalSyncRunStatus.SUCCESS
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='nsu-parse') as pool:
+                while True:
+                    if run.docs_received >= self.max_docs:
+                        status = FiscalSyncRunStatus.PARTIAL
+                        break
+                    try:
+                        result, fetch_ms = self._fetch(ult_nsu)
+                    except Exception as e:
+                        logger.warning('SEFAZ sync error', extra={'company_id': config.company_id, 'error': str(e)})
+                        status = FiscalSyncRunStatus.ERROR
+                        run.error = str(e)[:500]
+                        break
+                    run.pages += 1
+                    run.fetch_ms += round(fetch_ms)
+                    c_stat = result.get('cStat', '')
+                    run.last_cstat = c_stat
+                    run.last_xmotivo = result.get('xMotivo', '')
+                    new_ult = result.get('ultNSU') or ult_nsu
+                    max_nsu = result.get('consMaxNSU') or ''
+                    if max_nsu:
+                        run.max_nsu = max_nsu.lstrip('0') or '0'
+
+                    # Página anterior: parse já rodou durante esta consulta
+                    if pending is not None:
+                        self._persist(run, pending)
+                        pending = None
+
+                    if c_stat == CSTAT_DOCS_FOUND:
+                        docs = result.get('docZip_list', [])
+                        run.docs_received += len(docs)
+                        pending = Page(
+                            ult_nsu, new_ult, max_nsu, c_stat, run.last_xmotivo, fetch_ms,
+                            [pool.submit(parse_doc, doc) for doc in docs],
+                        )
+                        ult_nsu = new_ult
+                        if not docs or (max_nsu and _nsu_int(new_ult) >= _nsu_int(max_nsu)):
+                            self._block()  # em dia com a SEFAZ: próxima consulta só após a janela
+                            break
+                    elif c_stat == CSTAT_NO_DOCS:
+                        config.last_nsu = new_ult.lstrip('0') or '0'
+                        if max_nsu:
+                            config.max_nsu = max_nsu.lstrip('0') or '0'
+                        self._block()
+                        break
+                    elif c_stat == CSTAT_BLOCKED:
+                        status = FiscalSyncRunStatus.BLOCKED
+                        self._block()
+                        break
+                    else:
+                        status = FiscalSyncRunStatus.ERROR
+                        run.error = f'cStat {c_stat}: {run.last_xmotivo}'[:500]
+                        break
+                if pending is not None:
+                    self._persist(run, pending)
+        except Exception as e:
+            logger.exception('Falha na sincronização NSU', extra={'company_id': config.company_id})
+            status = FiscalSyncRunStatus.ERROR
+            run.error = str(e)[:500]
+
+        elapsed = time.perf_counter() - started
+        config.last_sync_at = timezone.now()
+        # updated_at fica de fora: ele versiona o certificado no client_cache
+        config.save(update_fields=['last_nsu', 'max_nsu', 'nsu_blocked_until', 'last_sync_at'])
+        run.status = status
+        run.end_nsu = config.last_nsu
+        run.finished_at = timezone.now()
+        run.docs_per_sec = Decimal(str(round(run.docs_persisted / elapsed, 2))) if elapsed > 0 else Decimal('0')
+        run.save()
+        logger.info('Sync NSU concluído', extra={
+            'company_id': config.company_id, 'status': status, 'docs': run.docs_persisted,
+            'pages': run.pages, 'docs_per_sec': float(run.docs_per_sec),
+        })
+        return run
+
+
+def due_configs(now=None):
+    """Configurações ativas, com certificado e fora da janela de bloqueio (mais antigas primeiro)."""
+    now = now or timezone.now()
+    return (
+        CompanyFiscalConfig.objects
+        .filter(is_active=True, cert_pfx_encrypted__isnull=False, cert_password_encrypted__isnull=False)
+        .filter(Q(nsu_blocked_until__isnull=True) | Q(nsu_blocked_until__lte=now))
+        .order_by(F('last_sync_at').asc(nulls_first=True), 'pk')
+    )
+
+
+def _lock_key(company_id):
+    return f'fiscal-nsu-sync:{company_id}'
+
+
+@contextmanager
+def company_sync_lock(company_id):
+    """
+    Exclusividade da sincronização de uma empresa; produz True se o lock foi
+    obtido (sem esperar). No PostgreSQL é um advisory lock de sessão, liberado
+    ao sair do bloco (ou se a conexão cair); nos demais bancos, cache.add com
+    LOCK_TIMEOUT, que só vale entre processos com um cache compartilhado.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [NSU_LOCK_NAMESPACE, company_id])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [NSU_LOCK_NAMESPACE, company_id])
+        return
+    acquired = cache.add(_lock_key(company_id), 1, LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(_lock_key(company_id))
+
+
+def sync_company(company_id, max_docs=50, client=None, **runner_kwargs) -> Optional[FiscalSyncRun]:
+    """
+    Sincroniza uma empresa, respeitando a janela de bloqueio e a exclusividade
+    por empresa. Retorna o FiscalSyncRun ou None se não houve consulta.
+    """
+    config = CompanyFiscalConfig.objects.select_related('company').filter(
+        company_id=company_id, is_active=True,
+    ).first()
+    if not config or not config.cert_pfx_encrypted or not config.cert_password_encrypted:
+        logger.warning('Config fiscal não encontrada', extra={'company_id': company_id})
+        return None
+    if _blocked(config):
+        return None
+    with company_sync_lock(company_id) as acquired:
+        if not acquired:
+            logger.info('Sync NSU já em andamento', extra={'company_id': company_id})
+            return None
+        # Outro worker pode ter acabado de sincronizar: relê last_nsu e a janela sob o lock
+        config.refresh_from_db()
+        if _blocked(config):
+            return None
+        if client is None:
+            try:
+                client = client_cache.get_client(config)
+            except Exception as e:
+                logger.warning('Falha ao preparar certificado: %s', str(e))
+                return FiscalSyncRun.objects.create(
+                    company_id=company_id, status=FiscalSyncRunStatus.ERROR,
+                    start_nsu=config.last_nsu, end_nsu=config.last_nsu,
+                    error='Certificado inválido ou chave de criptografia incorreta.', finished_at=timezone.now(),
+                )
+        return NsuSyncRunner(config, client, max_docs=max_docs, **runner_kwargs).run()
+
+
+def _blocked(config):
+    if config.nsu_blocked_until and config.nsu_blocked_until > timezone.now():
+        logger.info('Sync NSU adiado (janela SEFAZ)', extra={
+            'company_id': config.company_id, 'until': config.nsu_blocked_until.isoformat(),
+        })
+        return True
+    return False
@@ -1,17 +1,24 @@
 """
 Cliente SOAP para NFeDistribuicaoDFe (Distribuição DF-e).
 Usa zeep + requests com certificado A1 (PFX) para TLS.
+
+O PEM (cert + chave) é gravado uma única vez por client, com permissão 0600,
+em tmpfs (/dev/shm) quando disponível, e removido em close() ou na coleta do
+objeto. A requests.Session mantém a conexão (keep-alive), reaproveitando o
+handshake TLS entre as consultas; ver services/client_cache.py.
 """
 import json
 import logging
 import os
 import tempfile
 import time
+import weakref
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +34,7 @@ except ImportError:
 
 ENDPOINTS_PATH = Path(__file__).resolve().parent.parent / 'data' / 'sefaz_endpoints.json'
 DEFAULT_TIMEOUT = 30
+SECURE_TMP_DIR = '/dev/shm'
 MAX_RETRIES = 5
 RETRY_BACKOFF = 2  # segundos base
 
@@ -43,7 +51,11 @@ def _get_url_for_uf(uf: str, tp_amb: int = 1) -> str:
     """
     Retorna URL do NFeDistribuicaoDFe para a UF.
     tp_amb: 1=produção, 2=homologação
+    FISCAL_SEFAZ_DIST_URL (ex.: SEFAZ local, manage.py bench_nsu_sync --serve) substitui a tabela.
     """
+    override = getattr(settings, 'FISCAL_SEFAZ_DIST_URL', '')
+    if override:
+        return override
     data = _load_endpoints()
     env = 'production' if tp_amb == 1 else 'homologation'
     urls = data.get(env, {})
@@ -65,6 +77,24 @@ def _get_url_for_uf(uf: str, tp_amb: int = 1) -> str:
     )
 
 
+def _write_pem(cert_pem: str, key_pem: str) -> str:
+    """Grava cert + chave num arquivo 0600 (tmpfs se houver) e retorna o caminho."""
+    directory = SECURE_TMP_DIR if os.path.isdir(SECURE_TMP_DIR) and os.access(SECURE_TMP_DIR, os.W_OK) else None
+    fd, path = tempfile.mkstemp(prefix='sefaz-', suffix='.pem', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        f.write(cert_pem)
+        f.write('\n')
+        f.write(key_pem)
+    return path
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
 def _extract_pem_from_pfx(pfx_bytes: bytes, password: str) -> tuple[str, str]:
     """
     Extrai cert e key em PEM do PFX.
@@ -119,41 +149,38 @@ class SefazDistribuicaoClient:
         self.timeout = timeout
 
         cert_pem, key_pem = _extract_pem_from_pfx(pfx_bytes, password)
-        self._cert_pem = cert_pem
-        self._key_pem = key_pem
+        self._cert_file = _write_pem(cert_pem, key_pem)
+        self._finalizer = weakref.finalize(self, _unlink, self._cert_file)
         self._session = requests.Session()
-        self._session.cert = None  # será configurado via arquivos temp
+        self._session.cert = self._cert_file
         self._session.verify = True
+        # Uma conexão persistente por client: consultas em sequência reusam o TLS
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def close(self):
+        """Fecha a conexão e remove o PEM do disco."""
+        self._session.close()
+        self._finalizer()
 
     def _request(self, body: str, soap_action: str) -> str:
         """Envia requisição SOAP com certificado."""
         url = _get_url_for_uf(self.uf, self.tp_amb)
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.pem', delete=False) as cert_f:
-            cert_f.write(self._cert_pem)
-            cert_f.write('\n')
-            cert_f.write(self._key_pem)
-            cert_file = cert_f.name
-        try:
-            self._session.cert = cert_file
-            # SEFAZ usa SOAP 1.1 (não SOAP 1.2)
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': '"nfeDistDFeInteresse"',
-            }
-            envelope = f'''<?xml version="1.0" encoding="UTF-8"?>
+        # SEFAZ usa SOAP 1.1 (não SOAP 1.2)
+        headers = {
+            'Content-Type': 'text/xml; charset=utf-8',
+            'SOAPAction': '"nfeDistDFeInteresse"',
+        }
+        envelope = f'''<?xml version="1.0" encoding="UTF-8"?>
 <soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:dfe="http://www.portalfiscal.inf.br/nfe/wsdl/NFeDistribuicaoDFe">
   <soap:Body>
     {body}
   </soap:Body>
 </soap:Envelope>'''
-            resp = self._session.post(url, data=envelope.encode('utf-8'), headers=headers, timeout=self.timeout)
-            resp.raise_for_status()
-            return resp.text
-        finally:
-            try:
-                os.unlink(cert_file)
-            except OSError:
-                pass
+        resp = self._session.post(url, data=envelope.encode('utf-8'), headers=headers, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.text
 
     def _build_dist_nsu(self, ult_nsu: str) -> str:
         """Monta distNSU para consulta por NSU."""
@@ -288,11 +315,12 @@ class SefazDistribuicaoClient:
                 x_motivo = (el.text or '').strip()
             elif tag == 'ultNSU':
                 ult_nsu = (el.text or '').strip()
-            elif tag == 'consMaxNSU':
+            elif tag in ('maxNSU', 'consMaxNSU'):
+                # retDistDFeInt devolve maxNSU (maior NSU disponível para o CNPJ)
                 cons_max_nsu = (el.text or '').strip()
             elif tag == 'docZip':
                 schema = el.get('schema') or ''
-                doc_zips.append({'schema': schema, 'value': (el.text or '').strip()})
+                doc_zips.append({'schema': schema, 'nsu': el.get('NSU') or '', 'value': (el.text or '').strip()})
 
         result = {
             'cStat': c_stat or '',
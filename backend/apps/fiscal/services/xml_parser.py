@@ -45,23 +45,37 @@ def _get_child_text(parent, local_tag):
     return _get_text(el)
 
 
+def _root(xml_content):
+    """Aceita bytes/str ou um Element já parseado (evita parsear o mesmo XML duas vezes)."""
+    if ET.iselement(xml_content):
+        return xml_content
+    return ET.fromstring(xml_content)
+
+
+def decode_doc_zip_tree(doc_zip_base64: str) -> tuple[bytes, ET.Element]:
+    """
+    Descompacta docZip (base64 gzip) e parseia uma única vez.
+    Retorna (xml_bytes, root); o root pode ser passado aos parse_* abaixo.
+    """
+    decompressed = gzip.decompress(base64.b64decode(doc_zip_base64))
+    return decompressed, ET.fromstring(decompressed)
+
+
 def decode_doc_zip(doc_zip_base64: str) -> tuple[bytes, str]:
     """
     Descompacta docZip (base64 gzip) da SEFAZ.
     Retorna (xml_bytes, schema) onde schema é 'resNFe' ou 'procNFe' etc.
     """
-    raw = base64.b64decode(doc_zip_base64)
-    decompressed = gzip.decompress(raw)
-    root = ET.fromstring(decompressed)
-    schema = _local_name(root.tag)
-    return decompressed, schema
+    decompressed, root = decode_doc_zip_tree(doc_zip_base64)
+    return decompressed, _local_name(root.tag)
 
 
-def parse_res_nfe_xml(xml_content: bytes) -> Dict[str, Any]:
+def parse_res_nfe_xml(xml_content) -> Dict[str, Any]:
     """
     Parse resNFe (resumo) - retorna dict com chave, emitente, destinatário, data, valor.
+    xml_content: bytes ou Element (decode_doc_zip_tree).
     """
-    root = ET.fromstring(xml_content)
+    root = _root(xml_content)
     inf = root.find('.//nfe:resNFe', NS) or root.find('.//{http://www.portalfiscal.inf.br/nfe}resNFe')
     if inf is None:
         for el in root.iter():
@@ -112,12 +126,13 @@ def parse_res_nfe_xml(xml_content: bytes) -> Dict[str, Any]:
     }
 
 
-def parse_nfe_xml_fiscal(xml_content: bytes) -> Dict[str, Any]:
+def parse_nfe_xml_fiscal(xml_content) -> Dict[str, Any]:
     """
     Parse NF-e completa (nfeProc ou NFe) e retorna resumo + itens.
     Itens no formato: item_number, description, ncm, cfop, qty, unit_price, total.
+    xml_content: bytes ou Element (decode_doc_zip_tree).
     """
-    root = ET.fromstring(xml_content)
+    root = _root(xml_content)
     inf_nfe = (
         root.find('.//nfe:infNFe', NS)
         or root.find('.//{http://www.portalfiscal.inf.br/nfe}infNFe')
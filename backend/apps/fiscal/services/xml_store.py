@@ -0,0 +1,103 @@
+"""
+Armazenamento do XML completo das NF-e (NFeXmlBlob), fora da linha de NFeImport.
+
+- Endereçado por xml_hash (SHA256 do XML, fiscal_crypto.hash_xml): XML repetido
+  não é gravado de novo.
+- Formato: Fernet(gzip(xml)). A compressão vem antes da criptografia (texto
+  cifrado não comprime).
+- Leitura só no download (load); listagens usam NFeImport.xml_hash/has_xml.
+- NF-e antigas com XML em NFeImport.xml_encrypted continuam legíveis; o comando
+  move_nfe_xml_to_store as migra.
+"""
+import gzip
+
+from ..models import NFeImport, NFeXmlBlob
+from .crypto import fiscal_crypto
+
+COMPRESS_LEVEL = 6
+
+
+def pack(xml_bytes):
+    """(xml_hash, blob) - roda fora da transação (ex.: pool de parse do sync NSU)."""
+    blob = fiscal_crypto.encrypt(gzip.compress(xml_bytes, compresslevel=COMPRESS_LEVEL))
+    return fiscal_crypto.hash_xml(xml_bytes), blob, len(xml_bytes)
+
+
+def unpack(blob):
+    return gzip.decompress(fiscal_crypto.decrypt(bytes(blob)))
+
+
+def save_many(packed):
+    """
+    Grava os blobs ainda inexistentes. packed: iterável de (xml_hash, blob, size).
+    Duas queries (hashes existentes + INSERT em lote). Retorna quantos foram gravados.
+    """
+    by_hash = {h: (blob, size) for h, blob, size in packed}
+    if not by_hash:
+        return 0
+    existing = set(NFeXmlBlob.objects.filter(xml_hash__in=list(by_hash)).values_list('xml_hash', flat=True))
+    new = [
+        NFeXmlBlob(xml_hash=h, data=blob, size=size, stored_size=len(blob))
+        for h, (blob, size) in by_hash.items() if h not in existing
+    ]
+    # ignore_conflicts: outra importação pode ter gravado o mesmo XML no intervalo
+    NFeXmlBlob.objects.bulk_create(new, batch_size=200, ignore_conflicts=True)
+    return len(new)
+
+
+def save(xml_bytes):
+    """Grava o XML (se ainda não existir) e retorna o xml_hash."""
+    packed = pack(xml_bytes)
+    save_many([packed])
+    return packed[0]
+
+
+def load(nfe):
+    """XML completo da NFeImport ou None. Levanta InvalidToken se a chave não confere."""
+    if nfe.xml_hash:
+        blob = NFeXmlBlob.objects.filter(xml_hash=nfe.xml_hash).values_list('data', flat=True).first()
+        if blob is not None:
+            return unpack(blob)
+    # Legado: XML inline em NFeImport.xml_encrypted (lido só aqui)
+    inline = NFeImport.objects.filter(pk=nfe.pk).values_list('xml_encrypted', flat=True).first()
+    return fiscal_crypto.decrypt(bytes(inline)) if inline else None
+
+
+def migrate_inline(batch_size=200):
+    """
+    Move XMLs legados (NFeImport.xml_encrypted) para NFeXmlBlob, em lotes.
+    Retorna {'moved', 'failed', 'inline_bytes', 'stored_bytes'}.
+    """
+    from django.db import transaction
+
+    stats = {'moved': 0, 'failed': 0, 'inline_bytes': 0, 'stored_bytes': 0}
+    failed_ids = []
+    while True:
+        rows = list(
+            NFeImport.objects.filter(xml_encrypted__isnull=False).exclude(pk__in=failed_ids)
+            .order_by('pk').values_list('pk', 'xml_encrypted')[:batch_size]
+        )
+        if not rows:
+            return stats
+        packed, hashes, empty = [], {}, []
+        for pk, inline in rows:
+            if not inline:
+                empty.append(pk)
+                continue
+            try:
+                xml_hash, blob, size = pack(fiscal_crypto.decrypt(bytes(inline)))
+            except Exception:
+                failed_ids.append(pk)
+                stats['failed'] += 1
+                continue
+            packed.append((xml_hash, blob, size))
+            hashes[pk] = xml_hash
+            stats['inline_bytes'] += len(inline)
+            stats['stored_bytes'] += len(blob)
+        with transaction.atomic():
+            save_many(packed)
+            updated = [NFeImport(pk=pk, xml_hash=h, xml_encrypted=None) for pk, h in hashes.items()]
+            NFeImport.objects.bulk_update(updated, ['xml_hash', 'xml_encrypted'], batch_size=batch_size)
+            if empty:
+                NFeImport.objects.filter(pk__in=empty).update(xml_encrypted=None)
+        stats['moved'] += len(updated)
@@ -28,13 +28,8 @@ def import_by_key(self, company_id: int, user_id: int, access_key: str):
     - Cria NFeItem quando XML completo
     """
     from .models import NFeImport, NFeItem, NFeImportStatus, CompanyFiscalConfig
-    from .services.crypto import fiscal_crypto
-    from .services.sefaz_client import SefazDistribuicaoClient
-    from .services.xml_parser import (
-        decode_doc_zip,
-        parse_res_nfe_xml,
-        parse_nfe_xml_fiscal,
-    )
+    from .services import client_cache, xml_store
+    from .services.nsu_sync import parse_doc
     from .validators import validate_access_key
     from apps.users.models import CompanySettings
 
@@ -50,15 +45,8 @@ def import_by_key(self, company_id: int, user_id: int, access_key: str):
         return
 
     try:
-        pfx_data = config.cert_pfx_encrypted
-        pfx_bytes = bytes(pfx_data) if pfx_data is not None else b''
-        pass_data = config.cert_password_encrypted
-        if isinstance(pass_data, str):
-            pass_data = pass_data.encode('utf-8')
-        elif pass_data is not None:
-            pass_data = bytes(pass_data)
-        pfx = fiscal_crypto.decrypt(pfx_bytes)
-        password = fiscal_crypto.decrypt_str(pass_data or b'')
+        # Certificado descriptografado uma vez por processo (client_cache)
+        client = client_cache.get_client(config)
     except Exception as e:
         logger.warning('Falha ao descriptografar certificado: %s', str(e), exc_info=True)
         _mark_error(company_id, access_key, 'Certificado inválido ou chave de criptografia incorreta. Reenvie o certificado em Configuração SEFAZ.')
@@ -80,13 +68,6 @@ def import_by_key(self, company_id: int, user_id: int, access_key: str):
     nfe.save(update_fields=['status', 'imported_by', 'updated_at'])
 
     try:
-        client = SefazDistribuicaoClient(
-            pfx_bytes=pfx,
-            password=password,
-            cnpj=config.cnpj,
-            uf=config.uf,
-            tp_amb=1,
-        )
         result = client.distribuicao_por_chave(key)
     except SoftTimeLimitExceeded:
         nfe.status = NFeImportStatus.PENDING
@@ -113,58 +94,34 @@ def import_by_key(self, company_id: int, user_id: int, access_key: str):
         nfe.save(update_fields=['status', 'sefaz_cstat', 'sefaz_xmotivo', 'nsu', 'updated_at'])
         return
 
-    doc_zips = result.get('docZip_list', [])
-    for doc in doc_zips:
-        schema = doc.get('schema', '')
-        value = doc.get('value', '')
-        if not value:
-            continue
-        try:
-            xml_bytes, detected_schema = decode_doc_zip(value)
-            schema = schema or detected_schema
-        except Exception as e:
-            logger.warning('Erro ao decodificar docZip', extra={'error': str(e)})
+    # Cada docZip é descompactado e parseado uma única vez
+    for doc in filter(None, map(parse_doc, result.get('docZip_list', []))):
+        if doc.error:
+            logger.warning('Erro ao processar docZip', extra={'error': doc.error})
             continue
-
-        with transaction.atomic():
-            if 'resNFe' in schema or schema == 'resNFe':
-                try:
-                    resumo = parse_res_nfe_xml(xml_bytes)
-                    nfe.resumo_json = resumo
-                    nfe.schema = 'resNFe'
-                except Exception as e:
-                    logger.warning('Erro parse resNFe', extra={'error': str(e)})
-
-            if 'procNFe' in schema or 'nfeProc' in schema or 'NFe' in schema:
-                try:
-                    parsed = parse_nfe_xml_fiscal(xml_bytes)
-                    nfe.resumo_json = {
-                        'chave': parsed['chave'],
-                        'emitente': parsed['emitente'],
-                        'destinatario': parsed['destinatario'],
-                        'data_emissao': parsed['data_emissao'],
-                        'valor_total': parsed['valor_total'],
-                        'situacao': parsed.get('situacao', '1'),
-                    }
-                    nfe.schema = schema
-                    xml_enc = fiscal_crypto.encrypt(xml_bytes)
-                    xml_hash = fiscal_crypto.hash_xml(xml_bytes)
-                    nfe.xml_encrypted = xml_enc
-                    nfe.xml_hash = xml_hash
-                    NFeItem.objects.filter(nfe_import=nfe).delete()
-                    for item in parsed.get('items', []):
-                        NFeItem.objects.create(
-                            nfe_import=nfe,
-                            item_number=item['item_number'],
-                            description=item['description'],
-                            ncm=item.get('ncm', ''),
-                            cfop=item.get('cfop', ''),
-                            qty=item['qty'],
-                            unit_price=item['unit_price'],
-                            total=item['total'],
-                        )
-                except Exception as e:
-                    logger.warning('Erro parse procNFe', extra={'error': str(e)})
+        if not doc.is_full and nfe.has_xml:
+            continue  # resumo não substitui a NF-e completa
+        nfe.resumo_json = doc.resumo
+        nfe.schema = doc.schema
+        if doc.is_full:
+            with transaction.atomic():
+                xml_store.save_many([(doc.xml_hash, doc.xml_blob, doc.xml_size)])
+                nfe.xml_hash = doc.xml_hash
+                nfe.xml_encrypted = None  # XML fica em NFeXmlBlob
+                NFeItem.objects.filter(nfe_import=nfe).delete()
+                NFeItem.objects.bulk_create([
+                    NFeItem(
+                        nfe_import=nfe,
+                        item_number=item['item_number'],
+                        description=item['description'],
+                        ncm=item.get('ncm', ''),
+                        cfop=item.get('cfop', ''),
+                        qty=item['qty'],
+                        unit_price=item['unit_price'],
+                        total=item['total'],
+                    )
+                    for item in doc.items
+                ])
 
     nfe.status = NFeImportStatus.IMPORTED
     nfe.imported_at = timezone.now()
@@ -172,7 +129,7 @@ def import_by_key(self, company_id: int, user_id: int, access_key: str):
         'status', 'resumo_json', 'schema', 'xml_encrypted', 'xml_hash',
         'sefaz_cstat', 'sefaz_xmotivo', 'nsu', 'imported_at', 'updated_at',
     ])
-    logger.info('NF-e importada', extra={'access_key': key[:20], 'has_xml': bool(nfe.xml_encrypted)})
+    logger.info('NF-e importada', extra={'access_key': key[:20], 'has_xml': nfe.has_xml})
 
 
 def _mark_error(company_id: int, access_key: str, message: str):
@@ -191,174 +148,39 @@ def _mark_error(company_id: int, access_key: str, message: str):
 
 @shared_task(
     bind=True,
-    autoretry_for=(Exception,),
-    retry_backoff=True,
-    retry_backoff_max=60,
-    retry_kwargs={'max_retries': 3},
-    soft_time_limit=120,
-    time_limit=150,
+    soft_time_limit=300,
+    time_limit=330,
 )
 def sync_by_nsu(self, company_id: int, user_id=None, max_docs: int = 50):
     """
-    Sincroniza NF-es por ultNSU (job diário ou botão "Sincronizar agora").
+    Sincroniza NF-es por ultNSU (agendador ou botão "Sincronizar agora").
+    Sem retry automático: falhas e cStat 656 respeitam a janela da SEFAZ
+    (services/nsu_sync.py); o agendador tenta de novo quando ela expirar.
     """
-    from .models import NFeImport, NFeItem, NFeImportStatus, CompanyFiscalConfig
-    from .services.crypto import fiscal_crypto
-    from .services.sefaz_client import SefazDistribuicaoClient
-    from .services.xml_parser import decode_doc_zip, parse_res_nfe_xml, parse_nfe_xml_fiscal
-    from apps.users.models import CompanySettings
-
-    company = CompanySettings.objects.filter(pk=company_id).first()
-    if not company:
-        return
-
-    config = CompanyFiscalConfig.objects.filter(company=company, is_active=True).first()
-    if not config or not config.cert_pfx_encrypted or not config.cert_password_encrypted:
-        logger.warning('Config fiscal não encontrada', extra={'company_id': company_id})
-        return
-
-    try:
-        pfx = fiscal_crypto.decrypt(bytes(config.cert_pfx_encrypted))
-        password = fiscal_crypto.decrypt_str(bytes(config.cert_password_encrypted))
-    except Exception:
-        return
-
-    client = SefazDistribuicaoClient(
-        pfx_bytes=pfx,
-        password=password,
-        cnpj=config.cnpj,
-        uf=config.uf,
-        tp_amb=1,
-    )
-
-    last_nsu = config.last_nsu or '0'
-    docs_processed = 0
-
-    while docs_processed < max_docs:
-        try:
-            result = client.distribuicao_por_ult_nsu(last_nsu)
-        except Exception as e:
-            logger.warning('SEFAZ sync error', extra={'error': str(e)})
-            break
-
-        c_stat = result.get('cStat', '')
-        new_ult = result.get('ultNSU')
-        cons_max = result.get('consMaxNSU')
-        doc_zips = result.get('docZip_list', [])
-
-        if new_ult:
-            config.last_nsu = new_ult.lstrip('0') or '0'
-            config.save(update_fields=['last_nsu', 'updated_at'])
-
-        if c_stat not in ('137', '138', '656'):
-            break
-
-        if c_stat == '656':
-            break
-
-        for doc in doc_zips:
-            if docs_processed >= max_docs:
-                break
-            value = doc.get('value', '')
-            schema = doc.get('schema', '')
-            if not value:
-                continue
-            try:
-                xml_bytes, detected_schema = decode_doc_zip(value)
-                schema = schema or detected_schema
-            except Exception:
-                continue
+    from .services.nsu_sync import sync_company
 
-            access_key = None
-            if 'resNFe' in schema or schema == 'resNFe':
-                try:
-                    resumo = parse_res_nfe_xml(xml_bytes)
-                    access_key = resumo.get('chave', '')
-                except Exception:
-                    continue
-
-            if ('procNFe' in schema or 'nfeProc' in schema or 'NFe' in schema) and not access_key:
-                try:
-                    parsed = parse_nfe_xml_fiscal(xml_bytes)
-                    access_key = parsed.get('chave', '')
-                except Exception:
-                    continue
-
-            if not access_key or len(access_key) != 44:
-                continue
-
-            nfe, created = NFeImport.objects.get_or_create(
-                company=company,
-                access_key=access_key,
-                defaults={'status': NFeImportStatus.PENDING},
-            )
-            if created:
-                docs_processed += 1
-
-            with transaction.atomic():
-                if 'resNFe' in schema or schema == 'resNFe':
-                    try:
-                        resumo = parse_res_nfe_xml(xml_bytes)
-                        nfe.resumo_json = resumo
-                        nfe.schema = 'resNFe'
-                        nfe.status = NFeImportStatus.IMPORTED
-                        nfe.imported_at = timezone.now()
-                        nfe.nsu = result.get('ultNSU')
-                        nfe.sefaz_cstat = c_stat
-                        nfe.sefaz_xmotivo = result.get('xMotivo', '')
-                        nfe.save()
-                    except Exception:
-                        pass
-
-                if 'procNFe' in schema or 'nfeProc' in schema or 'NFe' in schema:
-                    try:
-                        parsed = parse_nfe_xml_fiscal(xml_bytes)
-                        nfe.resumo_json = {
-                            'chave': parsed['chave'],
-                            'emitente': parsed['emitente'],
-                            'destinatario': parsed['destinatario'],
-                            'data_emissao': parsed['data_emissao'],
-                            'valor_total': parsed['valor_total'],
-                            'situacao': parsed.get('situacao', '1'),
-                        }
-                        nfe.schema = schema
-                        xml_enc = fiscal_crypto.encrypt(xml_bytes)
-                        nfe.xml_encrypted = xml_enc
-                        nfe.xml_hash = fiscal_crypto.hash_xml(xml_bytes)
-                        nfe.status = NFeImportStatus.IMPORTED
-                        nfe.imported_at = timezone.now()
-                        nfe.nsu = result.get('ultNSU')
-                        nfe.sefaz_cstat = c_stat
-                        nfe.sefaz_xmotivo = result.get('xMotivo', '')
-                        nfe.save()
-                        NFeItem.objects.filter(nfe_import=nfe).delete()
-                        for item in parsed.get('items', []):
-                            NFeItem.objects.create(
-                                nfe_import=nfe,
-                                item_number=item['item_number'],
-                                description=item['description'],
-                                ncm=item.get('ncm', ''),
-                                cfop=item.get('cfop', ''),
-                                qty=item['qty'],
-                                unit_price=item['unit_price'],
-                                total=item['total'],
-                            )
-                    except Exception:
-                        pass
-
-        if not doc_zips or (new_ult and cons_max and new_ult == cons_max):
-            break
-        last_nsu = config.last_nsu or new_ult or last_nsu
-
-    logger.info('Sync NSU concluído', extra={'company_id': company_id, 'docs': docs_processed})
+    run = sync_company(company_id, max_docs=max_docs)
+    if run is None:
+        return None
+    return {'run': run.pk, 'status': run.status, 'docs': run.docs_persisted}
 
 
 @shared_task
 def sync_all_companies_by_nsu(max_docs: int = 100):
     """
-    Job diário: sincroniza NSU para todas as empresas com config fiscal ativa.
+    Agendador: uma tarefa por empresa com config fiscal ativa e fora da janela
+    de bloqueio da SEFAZ, escalonadas (FISCAL_NSU_DISPATCH_SPACING segundos).
     """
-    from .models import CompanyFiscalConfig
-
-    for config in CompanyFiscalConfig.objects.filter(is_active=True).select_related('company'):
-        sync_by_nsu.delay(config.company_id, user_id=None, max_docs=max_docs)
+    from django.conf import settings
+    from .services.nsu_sync import due_configs
+
+    spacing = getattr(settings, 'FISCAL_NSU_DISPATCH_SPACING', 5)
+    dispatched = 0
+    for config in due_configs():
+        sync_by_nsu.apply_async(
+            (config.company_id,),
+            {'user_id': None, 'max_docs': max_docs},
+            countdown=dispatched * spacing,
+        )
+        dispatched += 1
+    return dispatched
@@ -3,6 +3,8 @@ Testes do módulo fiscal.
 """
 import base64
 import gzip
+import os
+from io import StringIO
 from unittest.mock import patch, MagicMock
 from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
@@ -78,3 +80,227 @@ class TestDecodeDocZip(TestCase):
         out_xml, schema = decode_doc_zip(encoded)
         self.assertEqual(out_xml, xml)
         self.assertIn('resNFe', schema)
+
+
+class TestNsuSync(TestCase):
+    """Sincronização por NSU contra a SEFAZ local (services/fake_sefaz.py)."""
+
+    password = 'teste123'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from .services.fake_sefaz import self_signed_pfx
+        cls.pfx = self_signed_pfx(cls.password)
+
+    def setUp(self):
+        from .models import CompanyFiscalConfig
+        from .services import client_cache
+        from .services.crypto import fiscal_crypto
+        self.addCleanup(client_cache.invalidate)
+        self.company = CompanySettings.objects.create(name='Pet NSU')
+        self.config = CompanyFiscalConfig.objects.create(
+            company=self.company, cnpj='98765432000110', uf='SP',
+            cert_pfx_encrypted=fiscal_crypto.encrypt(self.pfx),
+            cert_password_encrypted=fiscal_crypto.encrypt_str(self.password).decode('utf-8'),
+        )
+
+    def _sync(self, server, **kwargs):
+        from django.test.utils import override_settings
+        from .services.nsu_sync import sync_company
+        server.start()
+        self.addCleanup(server.stop)
+        with override_settings(FISCAL_SEFAZ_DIST_URL=server.url):
+            return sync_company(self.company.id, min_interval=0, **kwargs)
+
+    def test_full_sync_pipelines_pages_and_records_metrics(self):
+        from .models import FiscalSyncRunStatus, NFeImport, NFeItem
+        from .services.fake_sefaz import FakeSefazServer
+        run = self._sync(FakeSefazServer(total_docs=120, full_every=2), max_docs=500, workers=3)
+
+        self.assertEqual(run.status, FiscalSyncRunStatus.SUCCESS)
+        self.assertEqual((run.pages, run.docs_received, run.docs_persisted), (3, 120, 120))
+        self.assertEqual([b['saved'] for b in run.batches], [50, 50, 20])
+        self.assertEqual(NFeImport.objects.filter(company=self.company).count(), 120)
+        self.assertEqual(NFeImport.objects.filter(company=self.company, xml_hash__isnull=False).count(), 60)
+        self.assertEqual(NFeItem.objects.filter(nfe_import__company=self.company).count(), 180)
+        self.config.refresh_from_db()
+        self.assertEqual((self.config.last_nsu, self.config.max_nsu), ('120', '120'))
+        # Em dia com a SEFAZ: próxima consulta só após a janela de 1 hora
+        self.assertIsNotNone(self.config.nsu_blocked_until)
+
+    def test_max_docs_stops_partial_and_resumes_from_last_nsu(self):
+        from .models import FiscalSyncRunStatus
+        from .services.fake_sefaz import FakeSefazServer
+        server = FakeSefazServer(total_docs=200)
+        run = self._sync(server, max_docs=60)
+        self.assertEqual(run.status, FiscalSyncRunStatus.PARTIAL)
+        self.assertEqual(server.requests, [0, 50])
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.last_nsu, '100')
+        self.assertIsNone(self.config.nsu_blocked_until)
+
+    def test_cstat_656_blocks_company(self):
+        from .models import FiscalSyncRunStatus, NFeImport
+        from .services.fake_sefaz import FakeSefazServer
+        from .services.nsu_sync import sync_company
+        server = FakeSefazServer(total_docs=200, block_after_pages=1)
+        run = self._sync(server, max_docs=500)
+
+        self.assertEqual(run.status, FiscalSyncRunStatus.BLOCKED)
+        self.assertEqual(run.last_cstat, '656')
+        self.assertEqual(NFeImport.objects.filter(company=self.company).count(), 50)
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.last_nsu, '50')
+        self.assertIsNotNone(self.config.nsu_blocked_until)
+        # Dentro da janela não há nova consulta
+        self.assertIsNone(sync_company(self.company.id, min_interval=0))
+        self.assertEqual(len(server.requests), 2)
+
+    def test_sync_skipped_while_company_lock_is_held(self):
+        from .services.fake_sefaz import FakeSefazServer
+        from .services.nsu_sync import company_sync_lock
+        server = FakeSefazServer(total_docs=10)
+        with company_sync_lock(self.company.id) as acquired:
+            self.assertTrue(acquired)
+            self.assertIsNone(self._sync(server))
+        self.assertEqual(server.requests, [])
+        self.assertIsNotNone(self._sync(server))
+
+    def test_scheduler_skips_blocked_companies(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import CompanyFiscalConfig
+        from .tasks import sync_all_companies_by_nsu
+        other = CompanySettings.objects.create(name='Pet bloqueado')
+        CompanyFiscalConfig.objects.create(
+            company=other, cnpj='11222333000144', uf='SP',
+            cert_pfx_encrypted=b'x', cert_password_encrypted='x',
+            nsu_blocked_until=timezone.now() + timedelta(minutes=30),
+        )
+        with patch('apps.fiscal.tasks.sync_by_nsu.apply_async') as apply_async:
+            self.assertEqual(sync_all_companies_by_nsu(), 1)
+        self.assertEqual(apply_async.call_args[0][0], (self.company.id,))
+
+    def test_sync_view_returns_429_while_blocked(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        self.config.nsu_blocked_until = timezone.now() + timedelta(minutes=10)
+        self.config.save(update_fields=['nsu_blocked_until'])
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='nsu', password='x'))
+        with patch('apps.fiscal.views.sync_by_nsu.delay') as delay:
+            resp = client.post('/api/fiscal/nfe/sync/')
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreater(int(resp['Retry-After']), 500)
+        delay.assert_not_called()
+
+    def test_persist_page_constant_queries_and_single_parse(self):
+        from .models import NFeImport, NFeItem
+        from .services import nsu_sync, xml_parser
+        from .services.fake_sefaz import doc_zip_dict
+
+        with patch.object(nsu_sync, 'parse_res_nfe_xml', wraps=xml_parser.parse_res_nfe_xml) as res, \
+                patch.object(nsu_sync, 'parse_nfe_xml_fiscal', wraps=xml_parser.parse_nfe_xml_fiscal) as full:
+            resumos = [nsu_sync.parse_doc(doc_zip_dict(n, False)) for n in range(1, 51)]
+            completas = [nsu_sync.parse_doc(doc_zip_dict(n, True)) for n in range(1, 26)]
+        self.assertEqual((res.call_count, full.call_count), (50, 25))
+
+        with self.assertNumQueries(4):
+            self.assertEqual(nsu_sync.persist_docs(self.company, resumos, '138', 'ok'), 50)
+        # 25 resumos viram NF-e completas: blobs + update + troca de itens, mesmas poucas queries
+        with self.assertNumQueries(9):
+            self.assertEqual(nsu_sync.persist_docs(self.company, completas + resumos[25:], '138', 'ok'), 50)
+        # Resumo repetido não sobrescreve XML completo
+        self.assertEqual(nsu_sync.persist_docs(self.company, resumos[:25], '138', 'ok'), 0)
+        self.assertEqual(NFeImport.objects.filter(company=self.company).count(), 50)
+        self.assertEqual(NFeImport.objects.filter(company=self.company, xml_hash__isnull=False).count(), 25)
+        self.assertEqual(NFeItem.objects.filter(nfe_import__company=self.company).count(), 75)
+        nsu_sync.persist_docs(self.company, completas[:1], '138', 'ok')
+        self.assertEqual(NFeItem.objects.filter(nfe_import__company=self.company).count(), 75)
+
+    def test_client_cached_per_config_and_connection_reused(self):
+        from .services import client_cache, sefaz_client
+        from .services.fake_sefaz import FakeSefazServer
+        server = FakeSefazServer(total_docs=150)
+        with patch.object(sefaz_client, '_extract_pem_from_pfx', wraps=sefaz_client._extract_pem_from_pfx) as extract:
+            run = self._sync(server, max_docs=500)
+            self.config.refresh_from_db()
+            client = client_cache.get_client(self.config)
+            self.assertIs(client_cache.get_client(self.config), client)
+        # Uma descriptografia e uma conexão TLS para a sincronização inteira
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(run.pages, 3)
+        self.assertEqual(len(server.connections), 1)
+        pem_path = client._cert_file
+        self.assertTrue(os.path.exists(pem_path))
+        self.assertEqual(os.stat(pem_path).st_mode & 0o777, 0o600)
+
+        # Novo certificado (updated_at muda): client recriado e PEM antigo removido
+        self.config.save()
+        self.assertIsNot(client_cache.get_client(self.config), client)
+        self.assertFalse(os.path.exists(pem_path))
+
+
+class TestNFeXmlStore(TestCase):
+    """XML completo em NFeXmlBlob (gzip + Fernet, endereçado por hash)."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import NFeImport
+        self.company = CompanySettings.objects.create(name='Pet XML')
+        self.admin = User.objects.create_user(username='xml_admin', password='x', role='admin')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(self.admin)
+        self.nfe = NFeImport.objects.create(company=self.company, access_key='3' * 44, status='imported')
+
+    def test_blob_compressed_and_deduplicated(self):
+        from .models import NFeXmlBlob
+        from .services import xml_store
+        from .services.fake_sefaz import proc_nfe_xml
+        xml = proc_nfe_xml(7, items=40)
+        h1 = xml_store.save(xml)
+        h2 = xml_store.save(xml)
+        self.assertEqual(h1, h2)
+        blob = NFeXmlBlob.objects.get()
+        self.assertEqual(blob.size, len(xml))
+        self.assertLess(blob.stored_size, len(xml))
+        self.assertEqual(xml_store.unpack(blob.data), xml)
+
+    def test_download_reads_blob_and_legacy_inline(self):
+        from .services import xml_store
+        from .services.crypto import fiscal_crypto
+        self.nfe.xml_hash = xml_store.save(b'<nfeProc>blob</nfeProc>')
+        self.nfe.save()
+        resp = self.client_api.get(f'/api/fiscal/nfe/{self.nfe.pk}/xml/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b'<nfeProc>blob</nfeProc>')
+
+        legacy_xml = b'<nfeProc>inline</nfeProc>'
+        self.nfe.xml_hash = fiscal_crypto.hash_xml(legacy_xml)
+        self.nfe.xml_encrypted = fiscal_crypto.encrypt(legacy_xml)
+        self.nfe.save()
+        resp = self.client_api.get(f'/api/fiscal/nfe/{self.nfe.pk}/xml/')
+        self.assertEqual(resp.content, legacy_xml)
+
+        listed = self.client_api.get('/api/fiscal/nfe/?tem_xml=true').json()
+        rows = listed['results'] if isinstance(listed, dict) else listed
+        self.assertEqual([r['tem_xml'] for r in rows], [True])
+
+    def test_move_inline_to_store(self):
+        from django.core.management import call_command
+        from .models import NFeImport, NFeXmlBlob
+        from .services import xml_store
+        from .services.crypto import fiscal_crypto
+        xml = b'<nfeProc>' + b'<det>item</det>' * 200 + b'</nfeProc>'
+        other = NFeImport.objects.create(company=self.company, access_key='4' * 44, status='imported')
+        for nfe in (self.nfe, other):
+            nfe.xml_encrypted = fiscal_crypto.encrypt(xml)
+            nfe.xml_hash = fiscal_crypto.hash_xml(xml)
+            nfe.save()
+        call_command('move_nfe_xml_to_store', batch=1, stdout=StringIO())
+
+        self.assertFalse(NFeImport.objects.filter(xml_encrypted__isnull=False).exists())
+        self.assertEqual(NFeXmlBlob.objects.count(), 1)
+        self.assertEqual(xml_store.load(NFeImport.objects.get(pk=other.pk)), xml)
@@ -12,6 +12,7 @@ urlpatterns = [
     path('config/', views.FiscalConfigView.as_view(), name='fiscal-config'),
     path('nfe/import-by-key/', views.NFeImportByKeyView.as_view(), name='fiscal-nfe-import-by-key'),
     path('nfe/sync/', views.NFeSyncView.as_view(), name='fiscal-nfe-sync'),
+    path('nfe/sync/runs/', views.NFeSyncRunListView.as_view(), name='fiscal-nfe-sync-runs'),
     path('nfe/<int:pk>/xml/', views.NFeXmlDownloadView.as_view(), name='fiscal-nfe-xml'),
     path('', include(router.urls)),
 ]
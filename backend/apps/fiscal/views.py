@@ -10,19 +10,22 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
+from django.utils import timezone
 
 from apps.users.models import CompanySettings
 from apps.users.permissions import IsAdmin
 
-from .models import CompanyFiscalConfig, NFeImport
+from .models import CompanyFiscalConfig, FiscalSyncRun, NFeImport
 from .serializers import (
     CompanyFiscalConfigSerializer,
     CompanyFiscalConfigCreateUpdateSerializer,
     NFeImportListSerializer,
     NFeImportDetailSerializer,
+    FiscalSyncRunSerializer,
 )
 from .tasks import import_by_key, sync_by_nsu
 from .validators import validate_access_key
+from .services import xml_store
 from .services.crypto import fiscal_crypto
 
 
@@ -189,6 +192,20 @@ class NFeSyncView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        blocked_until = config.nsu_blocked_until
+        if blocked_until and blocked_until > timezone.now():
+            retry_after = int((blocked_until - timezone.now()).total_seconds()) + 1
+            resp = Response(
+                {
+                    'error': 'SEFAZ sem novos documentos ou consumo limitado. Aguarde para sincronizar novamente.',
+                    'blocked_until': blocked_until,
+                    'retry_after': retry_after,
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            resp['Retry-After'] = str(retry_after)
+            return resp
+
         sync_by_nsu.delay(company.id, request.user.id)
         return Response(
             {'message': 'Sincronização iniciada em segundo plano.'},
@@ -196,6 +213,22 @@ class NFeSyncView(APIView):
         )
 
 
+class NFeSyncRunListView(APIView):
+    """GET /api/fiscal/nfe/sync/runs/ - últimas execuções da sincronização por NSU."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        company = _get_company(request)
+        if not company:
+            return Response({'detail': 'Empresa não configurada.'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except (TypeError, ValueError):
+            limit = 20
+        runs = FiscalSyncRun.objects.filter(company=company)[:limit]
+        return Response(FiscalSyncRunSerializer(runs, many=True).data)
+
+
 class NFeImportViewSet(ReadOnlyModelViewSet):
     """GET /api/fiscal/nfe/ - lista | GET /api/fiscal/nfe/{id}/ - detalhe."""
     permission_classes = [IsAuthenticated]
@@ -204,13 +237,14 @@ class NFeImportViewSet(ReadOnlyModelViewSet):
         company = _get_company(self.request)
         if not company:
             return NFeImport.objects.none()
-        qs = NFeImport.objects.filter(company=company)
+        # XML completo (legado inline) nunca é carregado nas listagens
+        qs = NFeImport.objects.filter(company=company).defer('xml_encrypted')
         status_param = self.request.query_params.get('status')
         if status_param:
             qs = qs.filter(status=status_param)
         tem_xml = self.request.query_params.get('tem_xml')
         if tem_xml is not None and str(tem_xml).lower() in ('true', '1', 'yes'):
-            qs = qs.exclude(xml_encrypted__isnull=True).exclude(xml_encrypted=b'')
+            qs = qs.exclude(xml_hash__isnull=True).exclude(xml_hash='')
         return qs
 
     def get_serializer_class(self):
@@ -238,20 +272,19 @@ class NFeXmlDownloadView(APIView):
         if not company:
             return Response({'detail': 'Empresa não configurada.'}, status=status.HTTP_404_NOT_FOUND)
 
-        nfe = get_object_or_404(NFeImport, pk=pk, company=company)
-        if not nfe.xml_encrypted:
-            return Response(
-                {'detail': 'XML não disponível para esta NF-e.'},
-                status=status.HTTP_404_NOT_FOUND,
-            )
-
+        nfe = get_object_or_404(NFeImport.objects.defer('xml_encrypted'), pk=pk, company=company)
         try:
-            xml_bytes = fiscal_crypto.decrypt(bytes(nfe.xml_encrypted))
+            xml_bytes = xml_store.load(nfe)
         except Exception:
             return Response(
                 {'detail': 'Erro ao descriptografar XML.'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        if not xml_bytes:
+            return Response(
+                {'detail': 'XML não disponível para esta NF-e.'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
 
         resp = HttpResponse(xml_bytes, content_type='application/xml')
         resp['Content-Disposition'] = f'attachment; filename="nfe_{nfe.access_key}.xml"'
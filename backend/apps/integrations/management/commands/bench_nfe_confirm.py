@@ -0,0 +1,74 @@
+"""
+Benchmark da confirmação de NF-e (confirm_nfe_import) para notas de 10/100/1000 linhas.
+Roda dentro de uma transação desfeita ao final (não deixa dados no banco).
+
+    python manage.py bench_nfe_confirm --lines 10 100 1000 --runs 3
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.integrations.nfe.models import NFeImport, NFeImportItem
+from apps.integrations.nfe.services.confirm import confirm_nfe_import
+from apps.products.models import Category, Product
+from apps.users.models import User
+from core.bench import percentile, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo e o número de queries da confirmação de NF-e por tamanho de nota.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000], help='Linhas por nota.')
+        parser.add_argument('--runs', type=int, default=3, help='Notas confirmadas por tamanho.')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(options['lines'], max(options['runs'], 1))
+
+    def _run(self, sizes, runs):
+        user = User.objects.create_user(username='__bench_nfe__', password='x')
+        category = Category.objects.create(name='__bench__')
+        largest = max(sizes)
+        Product.objects.bulk_create([
+            Product(
+                name=f'Produto {i}', category=category, sku=f'NB{i:07d}', gtin=f'79{i:011d}',
+                cost_price=Decimal('10'), sale_price=Decimal('15'), price_manually_set=True,
+            )
+            for i in range(largest)
+        ], batch_size=2000)
+        products = list(Product.objects.filter(category=category).order_by('pk').values_list('pk', 'gtin'))
+
+        self.stdout.write(f'{connection.vendor}, {runs} nota(s) por tamanho')
+        self.stdout.write(f'{"linhas":>7} {"média ms":>10} {"p95 ms":>10} {"queries":>8}')
+        sequence = 0
+        for size in sizes:
+            timings, queries = [], 0
+            for _ in range(runs):
+                sequence += 1
+                nfe_import = NFeImport.objects.create(
+                    access_key=f'{sequence:044d}', status='pending', supplier_name='Bench', imported_by=user,
+                )
+                items = NFeImportItem.objects.bulk_create([
+                    NFeImportItem(
+                        nfe_import=nfe_import, product_name=f'Item {i}', quantity=Decimal('3'),
+                        unit_cost=Decimal('11.50'), total_cost=Decimal('34.50'),
+                        # 1/2 vinculados, 1/4 por GTIN existente, 1/4 produtos novos
+                        gtin=products[i][1] if i % 4 == 2 else (f'78{sequence:04d}{i:07d}' if i % 4 == 3 else None),
+                    )
+                    for i in range(size)
+                ])
+                payload = [
+                    {'id': item.pk, 'product_id': products[i][0] if i % 2 == 0 else None, 'profit_margin': 30}
+                    for i, item in enumerate(items)
+                ]
+                with CaptureQueriesContext(connection) as ctx:
+                    t0 = time.perf_counter()
+                    confirm_nfe_import(nfe_import.pk, payload, user)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                queries = len(ctx.captured_queries)
+            self.stdout.write(f'{size:>7} {statistics.mean(timings):>10.1f} {percentile(timings, 0.95):>10.1f} {queries:>8}')
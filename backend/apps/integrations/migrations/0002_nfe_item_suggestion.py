@@ -0,0 +1,30 @@
+# Migration: automatic product suggestion (GTIN / name) on NF-e import items
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_stock_snapshot'),
+        ('integrations', '0001_nfe_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nfeimportitem',
+            name='suggested_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='nfe_suggestions', to='products.product', verbose_name='Produto sugerido'),
+        ),
+        migrations.AddField(
+            model_name='nfeimportitem',
+            name='match_score',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=4, null=True, verbose_name='Confiança da sugestão (0-1)'),
+        ),
+        migrations.AddField(
+            model_name='nfeimportitem',
+            name='match_method',
+            field=models.CharField(blank=True, choices=[('gtin', 'GTIN'), ('name', 'Nome')], max_length=10, verbose_name='Critério da sugestão'),
+        ),
+    ]
@@ -79,6 +79,32 @@ class NFeImportItem(models.Model):
         related_name='nfe_import_items',
         verbose_name='Produto vinculado'
     )
+    # Sugestão automática (services/matcher.py), calculada na importação
+    MATCH_METHOD_CHOICES = [
+        ('gtin', 'GTIN'),
+        ('name', 'Nome'),
+    ]
+    suggested_product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='nfe_suggestions',
+        verbose_name='Produto sugerido'
+    )
+    match_score = models.DecimalField(
+        max_digits=4,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        verbose_name='Confiança da sugestão (0-1)'
+    )
+    match_method = models.CharField(
+        max_length=10,
+        choices=MATCH_METHOD_CHOICES,
+        blank=True,
+        verbose_name='Critério da sugestão'
+    )
 
     class Meta:
         verbose_name = 'Item da Importação NF-e'
@@ -11,14 +11,16 @@ from apps.products.services import calculate_sale_price
 class NFeImportItemSerializer(serializers.ModelSerializer):
     """Item from NF-e (parsed or DB)."""
     calculated_sale_price = serializers.SerializerMethodField()
+    suggested_product_name = serializers.CharField(source='suggested_product.name', read_only=True, default=None)
 
     class Meta:
         model = NFeImportItem
         fields = [
             'id', 'product_name', 'quantity', 'unit', 'unit_cost', 'total_cost', 'gtin',
-            'product', 'calculated_sale_price'
+            'product', 'calculated_sale_price',
+            'suggested_product', 'suggested_product_name', 'match_score', 'match_method',
         ]
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'suggested_product', 'match_score', 'match_method']
 
     def get_calculated_sale_price(self, obj):
         margin = self.context.get('profit_margins', {}).get(obj.id) or Decimal('0')
@@ -0,0 +1,222 @@
+"""
+Confirmação de NF-e de entrada em lote (Purchase + PurchaseItem + StockMovement).
+
+Número fixo de queries independente da quantidade de linhas:
+- produtos informados travados com uma query (select_for_update em ordem de id);
+- itens sem produto vinculados por GTIN a produtos existentes numa única busca
+  (linhas com o mesmo GTIN sem cadastro geram um só produto novo);
+- produtos novos, itens da compra, movimentações e itens da NF-e gravados com
+  bulk_create/bulk_update; estoque somado com um UPDATE com F().
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from apps.products.models import Category, Product, PurchaseItem, Purchase, StockMovement
+from apps.products.services import code_cache
+from apps.products.services.search import build_search_text
+
+from ..models import NFeImport, NFeImportItem
+
+BATCH_SIZE = 1000
+
+
+class NFeConfirmError(ValueError):
+    """Confirmação rejeitada (mensagem para o campo error da resposta)."""
+
+
+def _margin(cfg):
+    try:
+        return Decimal(str(cfg.get('profit_margin', 0) or 0))
+    except (ArithmeticError, ValueError):
+        raise NFeConfirmError(f'profit_margin inválido: {cfg.get("profit_margin")!r}.')
+
+
+def _product_id(cfg):
+    value = cfg.get('product_id')
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise NFeConfirmError(f'product_id inválido: {value!r}.')
+
+
+def _new_product(nfe_item, category, margin):
+    product = Product(
+        name=nfe_item.product_name[:200],
+        category=category,
+        cost_price=nfe_item.unit_cost,
+        profit_margin=margin,
+        price_manually_set=False,
+        unit=nfe_item.unit or 'UN',
+        gtin=nfe_item.gtin or None,
+        stock_quantity=0,
+        min_stock=0,
+    )
+    product.recalculate_sale_price()
+    product.search_text = build_search_text(product, category.name)
+    return product
+
+
+def _create_products(new_products):
+    """bulk_create + SKU sequencial P{id:06d} (mesma regra de Product.save)."""
+    if not new_products:
+        return
+    Product.objects.bulk_create(new_products, batch_size=BATCH_SIZE)
+    for product in new_products:
+        product.sku = f'P{product.pk:06d}'
+        product.search_text = build_search_text(product, product.category.name)
+    Product.objects.bulk_update(new_products, ['sku', 'search_text'], batch_size=BATCH_SIZE)
+
+
+def _apply_cost(product, unit_cost, margin):
+    """Novo custo e preço/margem (mesma regra de Product.save)."""
+    product.cost_price = unit_cost
+    if product.price_manually_set:
+        product.recalculate_margin_from_price()
+    else:
+        product.profit_margin = margin
+        product.recalculate_sale_price()
+
+
+def confirm_nfe_import(import_id, items_payload, user):
+    """
+    Confirma a importação: items_payload = [{'id', 'product_id' (ou None), 'profit_margin'}].
+    Item sem a chave product_id (ou ausente do payload) só é vinculado
+    automaticamente a uma sugestão por GTIN; sugestões por nome precisam vir
+    explícitas em product_id (senão o item cria um produto novo, como antes).
+    Retorna o NFeImport confirmado ou levanta NFeConfirmError (nada é gravado).
+    """
+    if not isinstance(items_payload, list) or not items_payload:
+        raise NFeConfirmError(
+            'A lista "items" não pode estar vazia. Cada item deve ter "id" (do item da NF-e), '
+            '"product_id" (número ou null para criar novo produto) e opcionalmente "profit_margin".'
+        )
+    item_map = {}
+    for it in items_payload:
+        if isinstance(it, dict) and it.get('id') is not None:
+            try:
+                item_map[int(it['id'])] = it
+            except (TypeError, ValueError):
+                raise NFeConfirmError(f'id de item inválido: {it.get("id")!r}.')
+
+    default_category = Category.objects.first()
+    if not default_category:
+        raise NFeConfirmError('Cadastre ao menos uma categoria de produtos antes de confirmar.')
+
+    with transaction.atomic():
+        nfe_import = NFeImport.objects.select_for_update().get(id=import_id)
+        if nfe_import.status != 'pending':
+            raise NFeConfirmError('Importação já foi confirmada ou cancelada.')
+        nfe_items = list(nfe_import.items.order_by('id'))
+        if not nfe_items:
+            raise NFeConfirmError('Nenhum item na importação.')
+
+        plan = []  # (nfe_item, margin, product_id)
+        for nfe_item in nfe_items:
+            cfg = item_map.get(nfe_item.id, {})
+            if 'product_id' in cfg:
+                pid = _product_id(cfg)
+            else:  # sem a chave: aceita só a sugestão exata (GTIN) do matcher
+                pid = nfe_item.suggested_product_id if nfe_item.match_method == 'gtin' else None
+            plan.append((nfe_item, _margin(cfg), pid))
+
+        linked_ids = sorted({pid for _i, _m, pid in plan if pid})
+        products = Product.objects.select_for_update().order_by('pk').in_bulk(linked_ids)
+        missing = [pid for pid in linked_ids if pid not in products]
+        if missing:
+            raise NFeConfirmError(f'Produto(s) não encontrado(s): {", ".join(map(str, missing))}.')
+
+        # Itens sem produto: vincula pelo GTIN a um cadastro existente (uma query)
+        gtins = sorted({i.gtin for i, _m, pid in plan if not pid and i.gtin})
+        by_gtin = {}
+        if gtins:
+            for product in (
+                Product.objects.select_for_update().filter(gtin__in=gtins).order_by('-is_active', 'pk')
+            ):
+                by_gtin.setdefault(product.gtin, product)
+                products.setdefault(product.pk, product)
+
+        new_products = []
+        resolved = []  # (nfe_item, margin, product)
+        for nfe_item, margin, pid in plan:
+            if pid:
+                product = products[pid]
+            elif nfe_item.gtin and nfe_item.gtin in by_gtin:
+                product = by_gtin[nfe_item.gtin]
+            else:
+                product = _new_product(nfe_item, default_category, margin)
+                new_products.append(product)
+                if nfe_item.gtin:
+                    by_gtin[nfe_item.gtin] = product
+            resolved.append((nfe_item, margin, product))
+        _create_products(new_products)
+
+        purchase = Purchase.objects.create(
+            supplier_name=nfe_import.supplier_name or 'Fornecedor NF-e',
+            nfe_key=nfe_import.access_key,
+            nfe_number=nfe_import.nfe_number or '',
+            total_value=Decimal('0.00'),
+            created_by=user,
+        )
+        total_purchase = Decimal('0.00')
+        running_stock = {}
+        increments = {}
+        purchase_items, movements, touched_items, changed = [], [], [], {}
+        for nfe_item, margin, product in resolved:
+            qty_int = int(nfe_item.quantity)
+            if qty_int < 1:
+                continue
+            previous_stock = running_stock.get(product.pk, product.stock_quantity)
+            running_stock[product.pk] = previous_stock + qty_int
+            increments[product.pk] = increments.get(product.pk, 0) + qty_int
+            _apply_cost(product, nfe_item.unit_cost, margin)
+            changed[product.pk] = product
+
+            total_cost = nfe_item.quantity * nfe_item.unit_cost
+            total_purchase += total_cost
+            purchase_items.append(PurchaseItem(
+                purchase=purchase,
+                product=product,
+                quantity=nfe_item.quantity,
+                unit_cost=nfe_item.unit_cost,
+                total_cost=total_cost,
+            ))
+            movements.append(StockMovement(
+                product=product,
+                movement_type='entry',
+                quantity=qty_int,
+                cost_price=nfe_item.unit_cost,
+                reference=nfe_import.access_key,
+                previous_stock=previous_stock,
+                new_stock=previous_stock + qty_int,
+                created_by=user,
+            ))
+            nfe_item.product = product
+            touched_items.append(nfe_item)
+
+        if changed:
+            Product.objects.bulk_update(
+                list(changed.values()), ['cost_price', 'profit_margin', 'sale_price'], batch_size=BATCH_SIZE,
+            )
+            Product.objects.filter(pk__in=list(increments)).update(
+                stock_quantity=F('stock_quantity') + Case(
+                    *[When(pk=pk, then=Value(qty)) for pk, qty in increments.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+            # bulk_update/UPDATE não disparam signals: invalida o cache de código do PDV
+            code_cache.invalidate(changed)
+        PurchaseItem.objects.bulk_create(purchase_items, batch_size=BATCH_SIZE)
+        StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+        if touched_items:
+            NFeImportItem.objects.bulk_update(touched_items, ['product'], batch_size=BATCH_SIZE)
+
+        purchase.total_value = total_purchase
+        purchase.save(update_fields=['total_value'])
+        nfe_import.status = 'confirmed'
+        nfe_import.save(update_fields=['status'])
+    return nfe_import
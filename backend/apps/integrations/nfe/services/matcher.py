@@ -0,0 +1,132 @@
+"""
+Sugestão automática de produto para itens de NF-e.
+
+- GTIN: uma query (gtin/código de barras IN (...)) para todas as linhas; confiança 1.
+- Nome: índice invertido token -> produtos ativos, com peso IDF por token,
+  montado uma vez por processo e reconstruído só quando o catálogo muda
+  (contagem, maior id ou updated_at). Confiança = Dice ponderado entre os
+  tokens da linha e do produto; abaixo de MIN_NAME_SCORE não há sugestão.
+
+suggest() faz uma única passada pelas linhas da nota.
+"""
+import math
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Max, Q
+
+from apps.products.models import Product
+from apps.products.services.search import normalize
+
+MIN_NAME_SCORE = 0.5
+NAME_SCORE_CAP = 0.95
+COMMON_TOKEN_FRACTION = 0.2
+
+STOPWORDS = {'de', 'da', 'do', 'das', 'dos', 'para', 'com', 'sem', 'e', 'c', 'p', 'un', 'und', 'cx', 'pct'}
+_TOKEN = re.compile(r'\d+(?:\.\d+)?[a-z]*|[a-z0-9]+')
+_DECIMAL_COMMA = re.compile(r'(\d),(\d)')
+_NUMBER_UNIT = re.compile(r'(\d+(?:\.\d+)?)\s+(kg|g|gr|mg|ml|l|lt|cm|mm|m)\b')
+
+_cache = {'stamp': None, 'index': None}
+
+
+def tokenize(name):
+    """'Ração Premium 15 kg' -> {'racao', 'premium', '15kg'} (sem acentos, unidade junto ao número)."""
+    text = _NUMBER_UNIT.sub(r'\1\2', _DECIMAL_COMMA.sub(r'\1.\2', normalize(name)))
+    return frozenset(t for t in _TOKEN.findall(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit()))
+
+
+class CatalogIndex:
+    """Índice invertido de nomes normalizados dos produtos ativos."""
+
+    def __init__(self, rows):
+        self.tokens = {}
+        self.postings = defaultdict(list)
+        for pk, name in rows:
+            tokens = tokenize(name)
+            if not tokens:
+                continue
+            self.tokens[pk] = tokens
+            for token in tokens:
+                self.postings[token].append(pk)
+        size = max(len(self.tokens), 1)
+        self.idf = {t: math.log(1 + size / len(ids)) for t, ids in self.postings.items()}
+        self.unknown_weight = math.log(1 + size)
+        self.common_limit = max(int(size * COMMON_TOKEN_FRACTION), 50)
+
+    def _weight(self, tokens):
+        return sum(self.idf.get(t, self.unknown_weight) for t in tokens)
+
+    def best(self, name):
+        """(product_id, score) do produto mais parecido, ou (None, 0)."""
+        tokens = tokenize(name)
+        if not tokens:
+            return None, 0.0
+        known = [t for t in tokens if t in self.postings]
+        # Tokens muito frequentes só geram candidatos se não houver outro
+        selective = [t for t in known if len(self.postings[t]) <= self.common_limit] or known
+        candidates = set()
+        for token in selective:
+            candidates.update(self.postings[token])
+        if not candidates:
+            return None, 0.0
+        line_weight = self._weight(tokens)
+        best_pk, best_score = None, 0.0
+        for pk in candidates:
+            product_tokens = self.tokens[pk]
+            shared = self._weight(tokens & product_tokens)
+            score = 2 * shared / (line_weight + self._weight(product_tokens))
+            if score > best_score or (score == best_score and best_pk is not None and pk < best_pk):
+                best_pk, best_score = pk, score
+        return best_pk, best_score
+
+
+def catalog_index():
+    """Índice do catálogo, reconstruído quando produtos ativos mudam."""
+    active = Product.objects.filter(is_active=True)
+    stamp = tuple(active.aggregate(n=Count('id'), last=Max('id'), updated=Max('updated_at')).values())
+    if _cache['stamp'] != stamp:
+        _cache['index'] = CatalogIndex(active.values_list('pk', 'name').iterator(chunk_size=5000))
+        _cache['stamp'] = stamp
+    return _cache['index']
+
+
+def reset():
+    """Descarta o índice em memória (testes)."""
+    _cache['stamp'] = _cache['index'] = None
+
+
+def suggest(items):
+    """
+    items: dicts com 'product_name' e 'gtin' (parse_nfe_xml).
+    Retorna [(product_id ou None, score Decimal ou None, método 'gtin'|'name'|''), ...] na mesma ordem.
+    """
+    items = list(items)
+    gtins = {i['gtin'] for i in items if i.get('gtin')}
+    by_code = {}
+    if gtins:
+        for pk, gtin, barcode in (
+            Product.objects.filter(Q(gtin__in=gtins) | Q(barcode__in=gtins))
+            .order_by('-is_active', 'pk').values_list('pk', 'gtin', 'barcode')
+        ):
+            for code in (gtin, barcode):
+                if code in gtins:
+                    by_code.setdefault(code, pk)
+
+    index = None
+    result = []
+    for item in items:
+        pk = by_code.get(item.get('gtin'))
+        if pk is not None:
+            result.append((pk, Decimal('1.000'), 'gtin'))
+            continue
+        if index is None:
+            index = catalog_index()
+        pk, score = index.best(item.get('product_name') or '')
+        if pk is None or score < MIN_NAME_SCORE:
+            result.append((None, None, ''))
+        else:
+            score = Decimal(str(round(min(score, NAME_SCORE_CAP), 3)))
+            result.append((pk, score, 'name'))
+    return result
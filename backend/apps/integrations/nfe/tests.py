@@ -113,3 +113,143 @@ class NFeDuplicateImportTest(TestCase):
             'duplicate' in str(response.data).lower() or response.data.get('code') == 'duplicate',
             msg=response.data
         )
+
+
+class NFeConfirmTest(TestCase):
+    """POST /api/nfe/{id}/confirm/: gravação em lote, vínculo por GTIN e estoque."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from apps.products.models import Category, Product
+        self.user = User.objects.create_user(username='compras', password='x')
+        category = Category.objects.create(name='Rações')
+        self.linked = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('4'), sale_price=Decimal('10'),
+            price_manually_set=True, stock_quantity=5,
+        )
+        self.by_gtin = Product.objects.create(
+            name='Racao Premium', category=category, gtin='7891234567890', cost_price=Decimal('40'),
+            profit_margin=Decimal('50'), stock_quantity=2,
+        )
+        self.nfe = NFeImport.objects.create(
+            access_key='35210112345678000190550010000000011234567890', status='pending',
+            supplier_name='Fornecedor', imported_by=self.user,
+        )
+        make = lambda name, qty, cost, gtin=None: NFeImportItem.objects.create(
+            nfe_import=self.nfe, product_name=name, quantity=Decimal(qty), unit_cost=Decimal(cost),
+            total_cost=Decimal(qty) * Decimal(cost), gtin=gtin,
+        )
+        self.items = [
+            make('Petisco', '3', '5.00'),
+            make('Racao Premium 15kg', '10', '45.00', gtin='7891234567890'),
+            make('Shampoo Pet', '24', '12.50', gtin='7890000000001'),
+            make('Shampoo Pet', '2', '12.50', gtin='7890000000001'),
+            make('Petisco', '1', '5.00'),
+        ]
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def _confirm(self, items):
+        return self.api.post(f'/api/nfe/{self.nfe.pk}/confirm/', {'items': items}, format='json')
+
+    def test_confirm_in_bulk(self):
+        from apps.products.models import Product, Purchase, StockMovement
+        payload = [
+            {'id': self.items[0].pk, 'product_id': self.linked.pk},
+            {'id': self.items[1].pk, 'product_id': None, 'profit_margin': 20},
+            {'id': self.items[2].pk, 'product_id': None, 'profit_margin': 100},
+            {'id': self.items[4].pk, 'product_id': self.linked.pk},
+        ]
+        from apps.subscription import state_cache
+        state_cache.state()  # SubscriptionMiddleware lê do cache: fora da contagem
+        with self.assertNumQueries(20):
+            response = self._confirm(payload)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['status'], 'confirmed')
+
+        self.linked.refresh_from_db()
+        self.assertEqual(self.linked.stock_quantity, 9)
+        self.assertEqual(self.linked.cost_price, Decimal('5.00'))
+        self.assertEqual(self.linked.sale_price, Decimal('10.00'))
+        self.by_gtin.refresh_from_db()
+        self.assertEqual(self.by_gtin.stock_quantity, 12)
+        self.assertEqual(self.by_gtin.sale_price, Decimal('54.00'))
+
+        shampoo = Product.objects.get(gtin='7890000000001')
+        self.assertEqual(shampoo.stock_quantity, 26)
+        self.assertEqual(shampoo.sku, f'P{shampoo.pk:06d}')
+        self.assertIn('shampoo', shampoo.search_text)
+        self.assertEqual(shampoo.sale_price, Decimal('12.50'))  # último item sem profit_margin
+
+        movements = list(StockMovement.objects.filter(product=self.linked).order_by('id').values_list('previous_stock', 'new_stock'))
+        self.assertEqual(movements, [(5, 8), (8, 9)])
+        purchase = Purchase.objects.get(nfe_key=self.nfe.access_key)
+        self.assertEqual(purchase.items.count(), 5)
+        self.assertEqual(purchase.total_value, Decimal('795.00'))
+        self.assertEqual(set(self.nfe.items.values_list('product_id', flat=True)),
+                         {self.linked.pk, self.by_gtin.pk, shampoo.pk})
+
+    def test_unknown_product_rolls_back(self):
+        from apps.products.models import Purchase
+        response = self._confirm([{'id': self.items[0].pk, 'product_id': 999999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', response.json()['error'])
+        self.assertFalse(Purchase.objects.exists())
+        self.nfe.refresh_from_db()
+        self.assertEqual(self.nfe.status, 'pending')
+        self.assertEqual(self._confirm([{'id': self.items[0].pk, 'product_id': self.linked.pk}]).status_code, 200)
+        self.assertEqual(self._confirm([{'id': self.items[0].pk, 'product_id': self.linked.pk}]).status_code, 400)
+
+
+class NFeMatcherTest(TestCase):
+    """Sugestão de produto por GTIN e por nome na importação."""
+
+    def setUp(self):
+        from apps.products.models import Category, Product
+        from .services import matcher
+        matcher.reset()
+        self.user = User.objects.create_user(username='compras', password='x')
+        category = Category.objects.create(name='Geral')
+        make = lambda name, **kw: Product.objects.create(name=name, category=category, sale_price=Decimal('10'), price_manually_set=True, **kw)
+        self.racao = make('Ração Premium Cães Adultos 15 kg', gtin='7891234567890')
+        self.racao_3kg = make('Ração Premium Cães Adultos 3 kg')
+        self.shampoo = make('Shampoo Pet Neutro 500ml')
+        make('Coleira Antipulgas G')
+
+    def test_suggest_by_gtin_and_name(self):
+        from .services.matcher import suggest
+        result = suggest([
+            {'product_name': 'QUALQUER NOME', 'gtin': '7891234567890'},
+            {'product_name': 'RACAO PREMIUM CAES AD 3KG', 'gtin': None},
+            {'product_name': 'SHAMPOO PET NEUTRO 500 ML', 'gtin': None},
+            {'product_name': 'Arranhador Torre', 'gtin': None},
+        ])
+        self.assertEqual(result[0], (self.racao.pk, Decimal('1.000'), 'gtin'))
+        self.assertEqual(result[1][0], self.racao_3kg.pk)
+        self.assertEqual(result[2][:1], (self.shampoo.pk,))
+        self.assertEqual(result[2][1], Decimal('0.950'))
+        self.assertEqual(result[3], (None, None, ''))
+
+    def test_import_stores_suggestions_and_confirm_accepts_them(self):
+        from rest_framework.test import APIClient
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        api = APIClient()
+        api.force_authenticate(self.user)
+        upload = SimpleUploadedFile('nota.xml', SAMPLE_NFE_XML, content_type='application/xml')
+        response = api.post('/api/nfe/import-xml/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        items = response.json()['items']
+        self.assertEqual(
+            [(i['suggested_product'], i['match_method']) for i in items],
+            [(self.racao.pk, 'gtin'), (self.shampoo.pk, 'name')],
+        )
+        self.assertEqual(items[1]['suggested_product_name'], 'Shampoo Pet Neutro 500ml')
+
+        # Sem product_id: vincula só a sugestão por GTIN; a sugestão por nome vira produto novo
+        confirm = api.post(f'/api/nfe/{response.json()["id"]}/confirm/', {'items': [{'id': items[0]['id']}]}, format='json')
+        self.assertEqual(confirm.status_code, 200, confirm.content)
+        self.racao.refresh_from_db()
+        self.shampoo.refresh_from_db()
+        self.assertEqual((self.racao.stock_quantity, self.shampoo.stock_quantity), (10, 0))
+        from apps.products.models import Product
+        self.assertTrue(Product.objects.filter(stock_quantity=24).exclude(pk=self.shampoo.pk).exists())
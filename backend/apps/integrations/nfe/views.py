@@ -9,19 +9,27 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db import transaction
 from django.conf import settings
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
 
 from .models import NFeImport, NFeImportItem
 from .services.xml_parser import parse_nfe_xml
 from .services.fetch_by_key import fetch_nfe_xml_by_key, normalize_access_key
+from .services.confirm import NFeConfirmError, confirm_nfe_import
+from .services.matcher import suggest
 from .serializers import NFeImportSerializer, NFeImportItemSerializer
-from apps.products.models import Product, Category, StockMovement, Purchase, PurchaseItem
+
+
+def _imports_with_items():
+    """Importações com itens e produto sugerido em 2 queries (sem N+1 no serializer)."""
+    return NFeImport.objects.prefetch_related(
+        Prefetch('items', queryset=NFeImportItem.objects.select_related('suggested_product'))
+    )
 
 
 class NFeImportViewSet(ReadOnlyModelViewSet):
     """List and retrieve NFe imports."""
-    queryset = NFeImport.objects.all()
+    queryset = _imports_with_items()
     serializer_class = NFeImportSerializer
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status']
@@ -58,45 +66,23 @@ class NFeImportXMLView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        access_key = data['access_key']
-        if NFeImport.objects.filter(access_key=access_key).exists():
-            return Response(
-                {
-                    'error': 'Esta NF-e já foi importada.',
-                    'access_key': access_key,
-                    'code': 'duplicate'
-                },
-                status=status.HTTP_409_CONFLICT
-            )
-
-        with transaction.atomic():
-            nfe_import = NFeImport.objects.create(
-                access_key=access_key,
-                supplier_name=data.get('supplier_name', ''),
-                nfe_number=data.get('nfe_number', ''),
-                status='pending',
-                imported_by=request.user
-            )
-            for item in data['items']:
-                NFeImportItem.objects.create(
-                    nfe_import=nfe_import,
-                    product_name=item['product_name'],
-                    quantity=item['quantity'],
-                    unit=item.get('unit', 'UN'),
-                    unit_cost=item['unit_cost'],
-                    total_cost=item['total_cost'],
-                    gtin=item.get('gtin'),
-                )
+        nfe_import, err, err_code = _create_nfe_import_from_parsed(request, data)
+        if err is not None:
+            return Response(err, status=err_code)
 
-        serializer = NFeImportSerializer(nfe_import)
+        serializer = NFeImportSerializer(_imports_with_items().get(pk=nfe_import.pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def _create_nfe_import_from_parsed(request, data):
-    """Cria NFeImport + itens a partir do dict retornado por parse_nfe_xml (evita duplicar lógica)."""
+    """
+    Cria NFeImport + itens a partir do dict retornado por parse_nfe_xml (evita duplicar lógica).
+    Cada item recebe a sugestão de produto do matcher (GTIN ou nome) em uma única passada.
+    """
     access_key = data['access_key']
     if NFeImport.objects.filter(access_key=access_key).exists():
         return None, {'error': 'Esta NF-e já foi importada.', 'access_key': access_key, 'code': 'duplicate'}, 409
+    suggestions = suggest(data['items'])
     with transaction.atomic():
         nfe_import = NFeImport.objects.create(
             access_key=access_key,
@@ -105,8 +91,8 @@ def _create_nfe_import_from_parsed(request, data):
             status='pending',
             imported_by=request.user
         )
-        for item in data['items']:
-            NFeImportItem.objects.create(
+        NFeImportItem.objects.bulk_create([
+            NFeImportItem(
                 nfe_import=nfe_import,
                 product_name=item['product_name'],
                 quantity=item['quantity'],
@@ -114,7 +100,12 @@ def _create_nfe_import_from_parsed(request, data):
                 unit_cost=item['unit_cost'],
                 total_cost=item['total_cost'],
                 gtin=item.get('gtin'),
+                suggested_product_id=product_id,
+                match_score=score,
+                match_method=method,
             )
+            for item, (product_id, score, method) in zip(data['items'], suggestions)
+        ])
     return nfe_import, None, None
 
 
@@ -164,7 +155,7 @@ class NFeImportByKeyView(APIView):
         if err is not None:
             return Response(err, status=err_code)
 
-        serializer = NFeImportSerializer(nfe_import)
+        serializer = NFeImportSerializer(_imports_with_items().get(pk=nfe_import.pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -173,122 +164,24 @@ class NFeConfirmView(APIView):
     POST /api/nfe/{import_id}/confirm/
     Body: { "items": [ { "id": <NFeImportItem.id>, "product_id": <Product.id>, "profit_margin": 30 } ] }
     Creates Purchase, PurchaseItem, StockMovement (ENTRADA), updates product cost_price and sale_price.
+    Item sem a chave product_id usa o produto sugerido na importação (suggested_product);
+    product_id null vincula pelo GTIN a um produto existente ou cria um novo
+    (services/confirm.py, gravação em lote).
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request, import_id):
-        nfe_import = get_object_or_404(NFeImport, id=import_id)
-        if nfe_import.status != 'pending':
-            return Response(
-                {'error': 'Importação já foi confirmada ou cancelada.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
+        get_object_or_404(NFeImport, id=import_id)
         items_payload = request.data.get('items')
         if items_payload is None:
             return Response(
                 {'error': 'Envie o corpo da requisição com "items": lista de { "id", "product_id" (ou null para criar novo), "profit_margin" (opcional) }.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if not isinstance(items_payload, list) or len(items_payload) == 0:
-            return Response(
-                {'error': 'A lista "items" não pode estar vazia. Cada item deve ter "id" (do item da NF-e), "product_id" (número ou null para criar novo produto) e opcionalmente "profit_margin".'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Build map: nfe_item_id -> { product_id, profit_margin }
-        item_map = {int(it.get('id')): it for it in items_payload if it.get('id') is not None}
-        nfe_items = list(nfe_import.items.select_related('product').all())
-        if not nfe_items:
-            return Response({'error': 'Nenhum item na importação.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Validate: every item must have product_id (create or link)
-        default_category = Category.objects.first()
-        if not default_category:
-            return Response(
-                {'error': 'Cadastre ao menos uma categoria de produtos antes de confirmar.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        with transaction.atomic():
-            purchase = Purchase.objects.create(
-                supplier_name=nfe_import.supplier_name or 'Fornecedor NF-e',
-                nfe_key=nfe_import.access_key,
-                nfe_number=nfe_import.nfe_number or '',
-                total_value=Decimal('0.00'),
-                created_by=request.user
-            )
-            total_purchase = Decimal('0.00')
-
-            for nfe_item in nfe_items:
-                cfg = item_map.get(nfe_item.id, {})
-                product_id = cfg.get('product_id')
-                profit_margin = Decimal(str(cfg.get('profit_margin', 0)))
-
-                if product_id:
-                    product = Product.objects.get(id=product_id)
-                else:
-                    # Create new product from NFe item
-                    product = Product.objects.create(
-                        name=nfe_item.product_name[:200],
-                        category=default_category,
-                        cost_price=nfe_item.unit_cost,
-                        profit_margin=profit_margin,
-                        price_manually_set=False,
-                        unit=nfe_item.unit or 'UN',
-                        gtin=nfe_item.gtin or None,
-                        stock_quantity=0,
-                        min_stock=0,
-                    )
-                    product.recalculate_sale_price()
-                    product.save()
-
-                qty_int = int(nfe_item.quantity)
-                if qty_int < 1:
-                    continue
-
-                previous_stock = product.stock_quantity
-                new_stock = previous_stock + qty_int
-
-                # Update product cost and recalc sale if not manually set
-                product.cost_price = nfe_item.unit_cost
-                if not product.price_manually_set:
-                    product.profit_margin = profit_margin
-                    product.recalculate_sale_price()
-                product.stock_quantity = new_stock
-                product.save(update_fields=['cost_price', 'profit_margin', 'sale_price', 'stock_quantity'])
-
-                # PurchaseItem
-                total_cost = nfe_item.quantity * nfe_item.unit_cost
-                PurchaseItem.objects.create(
-                    purchase=purchase,
-                    product=product,
-                    quantity=nfe_item.quantity,
-                    unit_cost=nfe_item.unit_cost,
-                    total_cost=total_cost
-                )
-                total_purchase += total_cost
-
-                # StockMovement ENTRADA
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type='entry',
-                    quantity=qty_int,
-                    cost_price=nfe_item.unit_cost,
-                    reference=nfe_import.access_key,
-                    previous_stock=previous_stock,
-                    new_stock=new_stock,
-                    created_by=request.user
-                )
-
-                nfe_item.product = product
-                nfe_item.save(update_fields=['product'])
-
-            purchase.total_value = total_purchase
-            purchase.save(update_fields=['total_value'])
-
-            nfe_import.status = 'confirmed'
-            nfe_import.save(update_fields=['status'])
+        try:
+            nfe_import = confirm_nfe_import(import_id, items_payload, request.user)
+        except NFeConfirmError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = NFeImportSerializer(nfe_import)
+        serializer = NFeImportSerializer(_imports_with_items().get(pk=nfe_import.pk))
         return Response(serializer.data)
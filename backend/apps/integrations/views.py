@@ -1,12 +1,14 @@
 """
 Integration views
 """
+from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .services import MercadoPagoService, WhatsAppService, EmailService
 from apps.sales.models import Sale, Receipt, Invoice
+from apps.reports.services import rollup
 from apps.scheduling.models import Appointment
 
 
@@ -32,8 +34,11 @@ class IntegrationViewSet(viewsets.ViewSet):
             )
             
             if result['status'] == 'approved':
-                sale.status = 'paid'
-                sale.save()
+                with transaction.atomic():
+                    old_status = sale.status
+                    sale.status = 'paid'
+                    sale.save()
+                    rollup.record_status_change(sale, old_status, 'paid')
             
             return Response(result)
         except Sale.DoesNotExist:
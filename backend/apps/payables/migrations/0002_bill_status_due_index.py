@@ -0,0 +1,17 @@
+# Migration: índice (status, due_date) para aging e projeção de caixa
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payables', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='billpayable',
+            index=models.Index(fields=['status', 'due_date'], name='payables_bill_status_due_idx'),
+        ),
+    ]
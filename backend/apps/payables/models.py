@@ -44,14 +44,25 @@ class BillPayable(models.Model):
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['due_date']),
+            models.Index(fields=['status', 'due_date'], name='payables_bill_status_due_idx'),
         ]
 
     def __str__(self):
         return f"{self.description} - R$ {self.amount}"
 
+    def _status_on(self, today):
+        if self.status in ('pending', 'overdue'):
+            return 'overdue' if self.due_date < today else 'pending'
+        return self.status
+
+    @property
+    def effective_status(self):
+        """Status considerando a data de hoje (usa current_status anotado, se houver)."""
+        from django.utils import timezone
+        return getattr(self, 'current_status', None) or self._status_on(timezone.localdate())
+
     def save(self, *args, **kwargs):
         from django.utils import timezone
-        today = timezone.localdate()
-        if self.status == 'pending' and self.due_date < today:
-            self.status = 'overdue'
+        # Conta em aberto: vencida fica 'overdue'; reagendada para o futuro volta a 'pending'
+        self.status = self._status_on(timezone.localdate())
         super().save(*args, **kwargs)
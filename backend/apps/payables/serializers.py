@@ -3,7 +3,7 @@ from .models import BillPayable
 
 
 class BillPayableSerializer(serializers.ModelSerializer):
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    status_display = serializers.SerializerMethodField()
 
     class Meta:
         model = BillPayable
@@ -13,3 +13,12 @@ class BillPayableSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+
+    def get_status_display(self, obj):
+        return dict(BillPayable.STATUS_CHOICES).get(obj.effective_status, obj.status)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Status efetivo: pendente vencida sai como 'overdue' sem gravar na leitura
+        data['status'] = instance.effective_status
+        return data
@@ -0,0 +1,3 @@
+"""
+Services de contas a pagar.
+"""
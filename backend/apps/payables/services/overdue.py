@@ -0,0 +1,35 @@
+"""
+Status "em atraso" das contas a pagar.
+
+Leituras calculam o status efetivo no SQL (current_status) e nunca gravam;
+a marcação persistida roda uma vez por dia no Celery Beat (mark_overdue_bills).
+"""
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+
+from ..models import BillPayable
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+
+def current_status(today=None):
+    """Conta em aberto: 'overdue' se venceu antes de hoje, senão 'pending'; demais mantêm o status."""
+    today = today or timezone.localdate()
+    return Case(
+        When(status__in=OPEN_STATUSES, due_date__lt=today, then=Value('overdue')),
+        When(status__in=OPEN_STATUSES, then=Value('pending')),
+        default=F('status'),
+        output_field=CharField(),
+    )
+
+
+def with_current_status(queryset, today=None):
+    return queryset.annotate(current_status=current_status(today))
+
+
+def mark_overdue_bills():
+    """Grava status='overdue' nas contas pendentes vencidas. Retorna quantas mudaram."""
+    return BillPayable.objects.filter(
+        status='pending',
+        due_date__lt=timezone.localdate(),
+    ).update(status='overdue')
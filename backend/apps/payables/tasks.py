@@ -0,0 +1,17 @@
+"""
+Tasks Celery de contas a pagar.
+"""
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def mark_overdue_bills():
+    """Marca contas a pagar vencidas (agendada à meia-noite, fuso da loja)."""
+    from apps.payables.services.overdue import mark_overdue_bills as mark
+    updated = mark()
+    if updated:
+        logger.info('Contas a pagar marcadas como em atraso: %s', updated)
+    return updated
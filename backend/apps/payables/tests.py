@@ -0,0 +1,44 @@
+"""
+Contas a pagar - testes do status em atraso.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from .models import BillPayable
+from .tasks import mark_overdue_bills
+
+
+class BillOverdueTest(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.late = BillPayable.objects.create(description='Aluguel', amount=Decimal('100'), due_date=today + timedelta(days=3))
+        self.today = BillPayable.objects.create(description='Luz', amount=Decimal('50'), due_date=today)
+        # Venceu depois de gravada: continua 'pending' no banco até o Beat
+        BillPayable.objects.filter(pk=self.late.pk).update(due_date=today - timedelta(days=2))
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user(username='fin', password='x'))
+
+    def test_reads_compute_overdue_without_writing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            alerts = self.api.get('/api/payables/alerts/').json()
+            overdue = self.api.get('/api/payables/?status=overdue').json()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('UPDATE')])
+        self.assertEqual((alerts['overdue_count'], alerts['due_today_count']), (1, 1))
+        rows = overdue['results'] if isinstance(overdue, dict) else overdue
+        self.assertEqual([(r['id'], r['status'], r['status_display']) for r in rows], [(self.late.pk, 'overdue', 'Em atraso')])
+        self.assertEqual(BillPayable.objects.get(pk=self.late.pk).status, 'pending')
+
+    def test_beat_task_and_reschedule(self):
+        self.assertEqual(mark_overdue_bills(), 1)
+        bill = BillPayable.objects.get(pk=self.late.pk)
+        self.assertEqual(bill.status, 'overdue')
+        bill.due_date = timezone.localdate() + timedelta(days=10)
+        bill.save()
+        self.assertEqual(BillPayable.objects.get(pk=bill.pk).status, 'pending')
@@ -8,6 +8,7 @@ from django.utils import timezone
 
 from .models import BillPayable
 from .serializers import BillPayableSerializer
+from .services.overdue import OPEN_STATUSES, with_current_status
 
 
 class BillPayableViewSet(viewsets.ModelViewSet):
@@ -17,10 +18,11 @@ class BillPayableViewSet(viewsets.ModelViewSet):
     search_fields = ['description', 'provider']
 
     def get_queryset(self):
-        queryset = BillPayable.objects.all()
+        # current_status: status efetivo calculado no SQL (filtro e resposta)
+        queryset = with_current_status(BillPayable.objects.all())
         status_filter = self.request.query_params.get('status')
         if status_filter:
-            queryset = queryset.filter(status=status_filter)
+            queryset = queryset.filter(current_status=status_filter)
         return queryset.order_by('due_date', '-created_at')
 
     @action(detail=False, methods=['get'], url_path='alerts')
@@ -29,7 +31,7 @@ class BillPayableViewSet(viewsets.ModelViewSet):
         Retorna contas que vencem hoje e contas em atraso, para exibir no sino.
         """
         today = timezone.localdate()
-        base_qs = BillPayable.objects.filter(status__in=['pending', 'overdue'])
+        base_qs = with_current_status(BillPayable.objects.filter(status__in=OPEN_STATUSES), today)
 
         overdue_qs = base_qs.filter(due_date__lt=today).order_by('due_date')
         due_today_qs = base_qs.filter(due_date=today).order_by('due_date')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, StockMovement
+from .models import Category, Product, StockMovement, StockSnapshot
 
 
 @admin.register(Category)
@@ -22,3 +22,16 @@ class StockMovementAdmin(admin.ModelAdmin):
     list_display = ('product', 'movement_type', 'quantity', 'new_stock', 'created_at', 'created_by')
     list_filter = ('movement_type', 'created_at')
     readonly_fields = ('previous_stock', 'new_stock', 'created_at', 'created_by')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'through_movement_id', 'balance', 'movements_count', 'created_at')
+    search_fields = ('product__name',)
+    readonly_fields = ('product', 'through_movement_id', 'balance', 'movements_count', 'created_at')
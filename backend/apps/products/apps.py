@@ -5,3 +5,6 @@ class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.products'
     verbose_name = 'Produtos'
+
+    def ready(self):
+        import apps.products.signals  # noqa: F401
@@ -0,0 +1,80 @@
+"""
+Benchmark da busca de produtos do PDV (search_products) sobre um catálogo sintético.
+Roda dentro de uma transação desfeita ao final (não deixa dados no banco).
+No PostgreSQL rode após aplicar a migração 0007 (índice pg_trgm).
+
+    python manage.py bench_product_search --count 100000 --runs 200
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.products.models import Category, Product
+from apps.products.services.search import build_search_text, search_products
+from core.bench import percentile, rolled_back
+
+BRANDS = ['Premier', 'Golden', 'Pedigree', 'Whiskas', 'Royal', 'Guabi', 'Magnus', 'Special', 'Hills', 'Fórmula']
+KINDS = ['Ração', 'Petisco', 'Areia', 'Shampoo', 'Coleira', 'Brinquedo', 'Bifinho', 'Sachê', 'Antipulgas', 'Comedouro']
+TARGETS = ['Cães', 'Gatos', 'Filhotes', 'Adultos', 'Sênior', 'Raças Pequenas', 'Castrados', 'Pássaros']
+SIZES = ['100g', '500g', '1kg', '3kg', '10kg', '15kg', 'P', 'M', 'G', '300ml']
+
+
+class Command(BaseCommand):
+    help = 'Mede a latência (média/p95) de search_products sobre N produtos sintéticos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Produtos sintéticos.')
+        parser.add_argument('--runs', type=int, default=200, help='Buscas por tipo de consulta.')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(max(options['count'], 1), max(options['runs'], 1))
+
+    def _run(self, count, runs):
+        rng = random.Random(42)
+        categories = [Category.objects.create(name=f'__bench__ {kind}') for kind in KINDS]
+        self.stdout.write(f'Criando {count} produtos...')
+        batch = []
+        for i in range(count):
+            category = rng.choice(categories)
+            product = Product(
+                name=f'{category.name[10:]} {rng.choice(BRANDS)} {rng.choice(TARGETS)} {rng.choice(SIZES)}',
+                category=category,
+                sku=f'B{i:07d}',
+                barcode=f'789{i:010d}',
+                sale_price=Decimal('9.90'),
+                price_manually_set=True,
+            )
+            product.search_text = build_search_text(product, category.name)
+            batch.append(product)
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_create(batch)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE products_product')
+
+        queries = {
+            'palavras': lambda: f'{rng.choice(KINDS)} {rng.choice(TARGETS).split()[0]}',
+            'prefixo': lambda: f'{rng.choice(BRANDS)[:4]}',
+            'código': lambda: f'789{rng.randrange(count):010d}',
+            'prefixo cód.': lambda: f'B{rng.randrange(count):07d}'[:6],
+        }
+        base = Product.objects.filter(is_active=True)
+        self.stdout.write(f'{connection.vendor}, {count} produtos, {runs} buscas por tipo')
+        self.stdout.write(f'{"consulta":<14} {"média ms":>10} {"p95 ms":>10}')
+        for label, make_query in queries.items():
+            timings = []
+            for _ in range(runs):
+                q = make_query()
+                t0 = time.perf_counter()
+                list(search_products(base, q)[:20])
+                timings.append((time.perf_counter() - t0) * 1000)
+            p95 = percentile(timings, 0.95)
+            self.stdout.write(f'{label:<14} {statistics.mean(timings):>10.2f} {p95:>10.2f}')
@@ -0,0 +1,38 @@
+"""
+Reconcilia Product.stock_quantity com o razão de estoque (StockMovement) e,
+opcionalmente, grava snapshots dos produtos com muitas movimentações novas.
+
+    python manage.py reconcile_stock --snapshot --min-movements 50
+    python manage.py reconcile_stock --product 12 --product 15
+"""
+from django.core.management.base import BaseCommand
+
+from apps.products.services.ledger import SNAPSHOT_MIN_MOVEMENTS, reconcile, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Lista divergências entre o estoque dos produtos e o razão de movimentações.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='products', help='Restringe a produto(s).')
+        parser.add_argument('--snapshot', action='store_true', help='Grava snapshots antes de reconciliar.')
+        parser.add_argument('--min-movements', type=int, default=SNAPSHOT_MIN_MOVEMENTS,
+                            help='Movimentações novas para gerar snapshot.')
+        parser.add_argument('--limit', type=int, default=50, help='Divergências exibidas.')
+
+    def handle(self, *args, **options):
+        products = options['products']
+        if options['snapshot']:
+            created = take_snapshots(options['min_movements'], product_ids=products)
+            self.stdout.write(f'Snapshots gravados: {created}')
+        drift = reconcile(product_ids=products, only_with_movements=not products)
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Estoque conciliado com o razão.'))
+            return
+        self.stdout.write(self.style.WARNING(f'{len(drift)} produto(s) com divergência:'))
+        self.stdout.write(f'{"id":>8} {"estoque":>10} {"razão":>10} {"diferença":>10}  produto')
+        for row in drift[:options['limit']]:
+            self.stdout.write(
+                f'{row["product_id"]:>8} {row["stock_quantity"]:>10} {row["ledger_balance"]:>10} '
+                f'{row["drift"]:>10}  {row["name"]}'
+            )
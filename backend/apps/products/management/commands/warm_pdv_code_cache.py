@@ -0,0 +1,15 @@
+"""
+Pré-carrega o cache de leitura por código do PDV (SKU/GTIN/código de barras).
+Rodado no entrypoint do container, após as migrações.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.products.services.code_cache import warm
+
+
+class Command(BaseCommand):
+    help = 'Pré-carrega o cache de produtos por código usado em /products/by-code/.'
+
+    def handle(self, *args, **options):
+        count = warm()
+        self.stdout.write(self.style.SUCCESS(f'Cache de códigos do PDV: {count} produto(s) carregado(s).'))
@@ -0,0 +1,58 @@
+# Migration: normalised product search column, trigram index (PostgreSQL) and GTIN index
+
+from django.db import migrations, models
+
+TRGM_INDEX = 'products_search_trgm_idx'
+
+
+def backfill_search_text(apps, schema_editor):
+    from apps.products.services.search import normalize
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.select_related('category').iterator(chunk_size=1000):
+        parts = (product.name, product.sku, product.barcode, product.gtin,
+                 product.category.name if product.category_id else None, product.description)
+        product.search_text = normalize(' '.join(p for p in parts if p))
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['search_text'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON products_product USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_package_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Nome, códigos, categoria e descrição normalizados (ver services/search.py).', verbose_name='Texto de busca'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='gtin',
+            field=models.CharField(blank=True, db_index=True, max_length=14, null=True, verbose_name='GTIN/EAN'),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
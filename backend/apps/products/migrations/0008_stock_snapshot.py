@@ -0,0 +1,35 @@
+# Migration: stock ledger snapshots and (product, id) movement index
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'id'], name='products_mov_product_id_idx'),
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through_movement_id', models.BigIntegerField(verbose_name='Até a movimentação (id)')),
+                ('balance', models.IntegerField(verbose_name='Saldo')),
+                ('movements_count', models.PositiveIntegerField(default=0, verbose_name='Movimentações desde o anterior')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estoque',
+                'verbose_name_plural': 'Snapshots de Estoque',
+                'ordering': ['-through_movement_id'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'through_movement_id'), name='products_snapshot_product_mov')],
+            },
+        ),
+    ]
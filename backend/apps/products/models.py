@@ -23,6 +23,13 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        renamed = bool(self.pk) and not Category.objects.filter(pk=self.pk, name=self.name).exists()
+        super().save(*args, **kwargs)
+        if renamed:
+            from .services.search import refresh_search_text
+            refresh_search_text(self.products.all())
+
 
 class Product(models.Model):
     """
@@ -39,7 +46,7 @@ class Product(models.Model):
     )
     sku = models.CharField(max_length=50, blank=True, unique=True, null=True, verbose_name='SKU')
     barcode = models.CharField(max_length=50, blank=True, unique=True, null=True, verbose_name='Código de Barras')
-    gtin = models.CharField(max_length=14, blank=True, null=True, verbose_name='GTIN/EAN')
+    gtin = models.CharField(max_length=14, blank=True, null=True, db_index=True, verbose_name='GTIN/EAN')
 
     UNIT_CHOICES = [
         ('UN', 'Unidade'),
@@ -115,6 +122,13 @@ class Product(models.Model):
     )
 
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
+    search_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Texto de busca',
+        help_text='Nome, códigos, categoria e descrição normalizados (ver services/search.py).'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
@@ -166,11 +180,19 @@ class Product(models.Model):
         else:
             self.recalculate_sale_price()
 
+        from .services.search import SEARCH_FIELDS, build_search_text
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or any(f in SEARCH_FIELDS or f == 'category_id' for f in update_fields):
+            self.search_text = build_search_text(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_text'}
+
         # Código (SKU) sequencial automático quando não informado na criação
         if not self.pk and (not self.sku or not str(self.sku).strip()):
             super().save(*args, **kwargs)
             self.sku = f'P{self.id:06d}'
-            super().save(update_fields=['sku'])
+            self.search_text = build_search_text(self)
+            super().save(update_fields=['sku', 'search_text'])
             return
 
         super().save(*args, **kwargs)
@@ -231,6 +253,7 @@ class StockMovement(models.Model):
             models.Index(fields=['product']),
             models.Index(fields=['movement_type']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['product', 'id'], name='products_mov_product_id_idx'),
         ]
 
     def __str__(self):
@@ -245,22 +268,48 @@ class StockMovement(models.Model):
             return -self.quantity
         return self.new_stock - self.previous_stock
 
+    def save(self, *args, **kwargs):
+        """Movimentações são append-only: correções entram como nova movimentação (ajuste)."""
+        if not self._state.adding:
+            raise ValueError('Movimentações de estoque não podem ser alteradas.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Movimentações de estoque não podem ser excluídas.')
+
     @classmethod
     def get_stock_balance(cls, product_id):
-        """Current stock balance = sum of all movement deltas for product."""
-        from django.db.models import Sum, Case, When, IntegerField, F
-        agg = cls.objects.filter(product_id=product_id).aggregate(
-            total=Sum(
-                Case(
-                    When(movement_type='entry', then=F('quantity')),
-                    When(movement_type='exit', then=-F('quantity')),
-                    When(movement_type='adjustment', then=F('new_stock') - F('previous_stock')),
-                    default=0,
-                    output_field=IntegerField(),
-                )
-            )
-        )
-        return agg['total'] or 0
+        """Current stock balance: last snapshot + deltas of the movements after it."""
+        from .services.ledger import balance
+        return balance(product_id)
+
+
+class StockSnapshot(models.Model):
+    """
+    Checkpoint do razão de estoque: saldo do produto somando todas as
+    movimentações até through_movement_id (inclusive).
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshots',
+        verbose_name='Produto'
+    )
+    through_movement_id = models.BigIntegerField(verbose_name='Até a movimentação (id)')
+    balance = models.IntegerField(verbose_name='Saldo')
+    movements_count = models.PositiveIntegerField(default=0, verbose_name='Movimentações desde o anterior')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+
+    class Meta:
+        verbose_name = 'Snapshot de Estoque'
+        verbose_name_plural = 'Snapshots de Estoque'
+        ordering = ['-through_movement_id']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'through_movement_id'], name='products_snapshot_product_mov'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.through_movement_id}: {self.balance}"
 
 
 class Purchase(models.Model):
@@ -1,6 +1,7 @@
 """
 Product serializers
 """
+from django.db import transaction
 from rest_framework import serializers
 from .models import Category, Product, StockMovement, Purchase, PurchaseItem
 from .services import calculate_sale_price
@@ -117,8 +118,11 @@ class StockMovementSerializer(serializers.ModelSerializer):
             'id', 'previous_stock', 'new_stock', 'created_at', 'created_by'
         ]
 
+    @transaction.atomic
     def create(self, validated_data):
-        product = validated_data['product']
+        # Trava a linha do produto: previous_stock/new_stock compõem o razão
+        product = Product.objects.select_for_update().get(pk=validated_data['product'].pk)
+        validated_data['product'] = product
         movement_type = validated_data['movement_type']
         quantity = validated_data['quantity']
 
@@ -0,0 +1,2 @@
+# Product services
+from .pricing import calculate_sale_price  # noqa: F401
@@ -0,0 +1,176 @@
+"""
+Cache de leitura por código (SKU, GTIN, código de barras) do PDV.
+
+- Payload do ProductPdvSerializer por produto no cache do Django
+  (Redis quando CACHE_URL está definido, compartilhado entre workers);
+- mapa código -> id do produto no cache e num dicionário local do processo.
+  Uma entrada do mapa só vale se o código ainda consta no payload do produto,
+  então códigos alterados ou removidos caem no banco naturalmente.
+
+Invalidação: signals de Product (save/delete) e bulk_adjust_stock (UPDATE com F()
+do PDV), sempre após o commit. Sem cache compartilhado (LocMem), cada worker
+invalida só a própria cópia: use Redis em produção.
+
+Cada produto tem uma versão no cache, trocada a cada invalidação. Num erro de
+cache a versão é lida antes do produto e gravada junto com o payload, que só
+vale enquanto ela for a atual: um payload montado com dados anteriores a um
+commit concorrente nunca volta a ser servido, mesmo que o cache.set aconteça
+depois da invalidação.
+"""
+import os
+import uuid
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+PAYLOAD_PREFIX = 'pdv-product'
+VERSION_PREFIX = 'pdv-product-v'
+CODE_PREFIX = 'pdv-code'
+LOCAL_MAX_CODES = 50000
+
+_local_codes = {}
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _ttl():
+    return getattr(settings, 'PDV_CODE_CACHE_TTL', 60 * 60 * 12)
+
+
+def _payload_key(product_id):
+    return f'{PAYLOAD_PREFIX}:{product_id}'
+
+
+def _version_key(product_id):
+    return f'{VERSION_PREFIX}:{product_id}'
+
+
+def _current_version(product_id):
+    """Versão atual do payload do produto (cria uma se não houver ou se foi despejada)."""
+    key = _version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _code_key(code):
+    return f'{CODE_PREFIX}:{code}'
+
+
+def _codes(product):
+    return [c for c in (product.sku, product.gtin, product.barcode) if c]
+
+
+def _remember_codes(codes, product_id):
+    if len(_local_codes) >= LOCAL_MAX_CODES:
+        _local_codes.clear()
+    for code in codes:
+        _local_codes[code] = product_id
+
+
+def _store(product, version):
+    """
+    Serializa e grava o produto (payload + códigos). version deve ter sido lida
+    (_current_version) antes de o produto ser lido do banco. Retorna o payload.
+    """
+    from ..serializers import ProductPdvSerializer
+    codes = _codes(product)
+    entry = {'codes': codes, 'version': version, 'data': dict(ProductPdvSerializer(product).data)}
+    ttl = _ttl()
+    cache.set(_payload_key(product.pk), entry, ttl)
+    cache.set_many({_code_key(c): product.pk for c in codes}, ttl)
+    _remember_codes(codes, product.pk)
+    return entry['data']
+
+
+def _cached(code) -> Optional[dict]:
+    product_id = _local_codes.get(code)
+    if product_id is None:
+        product_id = cache.get(_code_key(code))
+        if product_id is None:
+            return None
+    payload_key, version_key = _payload_key(product_id), _version_key(product_id)
+    found = cache.get_many([payload_key, version_key])
+    entry, version = found.get(payload_key), found.get(version_key)
+    if not entry or version is None or entry.get('version') != version or code not in entry['codes']:
+        return None
+    _remember_codes([code], product_id)
+    return entry['data']
+
+
+def lookup(code, request=None) -> Optional[dict]:
+    """
+    Payload do ProductPdvSerializer do produto ativo com sku/gtin/barcode igual
+    a code, ou None. Acerto no cache não consulta o banco; um erro faz duas
+    queries (id, versão e só então o produto).
+    """
+    data = _cached(code)
+    if data is not None:
+        _stats['hits'] += 1
+    else:
+        _stats['misses'] += 1
+        from ..models import Product
+        active = Product.objects.filter(is_active=True)
+        product_id = active.filter(
+            Q(sku=code) | Q(gtin=code) | Q(barcode=code)
+        ).values_list('pk', flat=True).first()
+        if product_id is None:
+            return None
+        version = _current_version(product_id)
+        product = active.filter(pk=product_id).first()
+        if product is None:
+            return None
+        data = _store(product, version)
+    data = dict(data)
+    if data.get('image_url') and request is not None:
+        data['image_url'] = request.build_absolute_uri(data['image_url'])
+    return data
+
+
+def invalidate(product_ids: Iterable[int]):
+    """Troca a versão e remove os payloads dos produtos após o commit da transação corrente."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    def _clear():
+        cache.set_many({_version_key(pk): uuid.uuid4().hex for pk in product_ids}, None)
+        cache.delete_many([_payload_key(pk) for pk in product_ids])
+    transaction.on_commit(_clear)
+
+
+def warm(batch_size=2000):
+    """Pré-carrega todos os produtos ativos com código. Retorna quantos."""
+    from ..models import Product
+    qs = Product.objects.filter(is_active=True).filter(
+        Q(sku__gt='') | Q(gtin__gt='') | Q(barcode__gt='')
+    )
+    ids = list(qs.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        versions = {pk: _current_version(pk) for pk in chunk}  # antes de ler os produtos
+        for product in qs.filter(pk__in=chunk):
+            _store(product, versions[product.pk])
+    return len(ids)
+
+
+def stats() -> dict:
+    """Contadores de acerto/erro deste processo."""
+    total = _stats['hits'] + _stats['misses']
+    return {
+        'pid': os.getpid(),
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'hit_rate': round(_stats['hits'] / total, 4) if total else None,
+        'local_codes': len(_local_codes),
+    }
+
+
+def reset():
+    """Zera o mapa local e os contadores (testes)."""
+    _local_codes.clear()
+    _stats['hits'] = _stats['misses'] = 0
@@ -0,0 +1,237 @@
+"""
+Importação de contagem de inventário (ajustes de estoque em lote).
+
+Entrada: linhas {'code' ou 'product_id', 'quantity'} vindas de JSON, CSV ou
+XLSX. A quantidade contada está na unidade de estoque do produto, exceto KG,
+contado em kg (gravado em gramas). O mesmo produto em mais de uma linha
+(contado em mais de um local) tem as quantidades somadas.
+
+Aplicação: produtos travados em lotes (select_for_update em ordem de id),
+estoque gravado com um UPDATE por lote e movimentações de ajuste com
+bulk_create. Qualquer linha inválida cancela a importação inteira.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from ..models import Product, StockMovement
+from . import code_cache
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 100
+
+CODE_COLUMNS = {'code', 'codigo', 'código', 'sku', 'gtin', 'ean', 'barcode', 'codigo_barras', 'código de barras'}
+ID_COLUMNS = {'product_id', 'produto_id', 'id'}
+QUANTITY_COLUMNS = {'quantity', 'quantidade', 'qtd', 'contagem', 'counted', 'estoque'}
+
+
+class InventoryCountError(ValueError):
+    """Importação rejeitada; errors lista as mensagens por linha."""
+
+    def __init__(self, errors):
+        super().__init__(errors[0] if errors else 'Importação inválida.')
+        self.errors = errors[:MAX_ERRORS]
+
+
+def _column(header, names):
+    for i, name in enumerate(header):
+        if str(name or '').strip().lower() in names:
+            return i
+    return None
+
+
+def _rows_from_table(table):
+    """Converte linhas (cabeçalho + dados) em dicts {'code', 'product_id', 'quantity'}."""
+    table = iter(table)
+    header = next(table, None)
+    if header is None:
+        raise InventoryCountError(['Arquivo vazio.'])
+    code_col = _column(header, CODE_COLUMNS)
+    id_col = _column(header, ID_COLUMNS)
+    qty_col = _column(header, QUANTITY_COLUMNS)
+    if qty_col is None or (code_col is None and id_col is None):
+        raise InventoryCountError(['Cabeçalho deve ter as colunas código (ou product_id) e quantidade.'])
+    rows = []
+    for values in table:
+        if not values or all(v in (None, '') for v in values):
+            continue
+
+        def cell(col):
+            if col is None or col >= len(values) or values[col] is None:
+                return ''
+            return values[col]
+        rows.append({'code': cell(code_col), 'product_id': cell(id_col), 'quantity': cell(qty_col)})
+    return rows
+
+
+def read_upload(upload):
+    """Linhas de um arquivo .csv (vírgula ou ponto e vírgula) ou .xlsx (primeira planilha)."""
+    name = (upload.name or '').lower()
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        try:
+            workbook = load_workbook(upload, read_only=True, data_only=True)
+        except Exception:
+            raise InventoryCountError(['Arquivo XLSX inválido.'])
+        try:
+            return _rows_from_table(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    try:
+        text = upload.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise InventoryCountError(['CSV deve estar em UTF-8.'])
+    first_line = text.split('\n', 1)[0]
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    return _rows_from_table(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+def _to_stock_units(product, quantity):
+    if product.unit == 'KG':
+        return int((quantity * 1000).to_integral_value())
+    return int(quantity)
+
+
+def _parse_quantity(raw, line, errors):
+    try:
+        quantity = Decimal(str(raw).strip().replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        errors.append((line, f'quantidade inválida ({raw!r}).'))
+        return None
+    if not quantity.is_finite():  # NaN/Infinity: comparar NaN levanta InvalidOperation
+        errors.append((line, f'quantidade inválida ({raw!r}).'))
+        return None
+    if quantity < 0:
+        errors.append((line, 'quantidade não pode ser negativa.'))
+        return None
+    return quantity
+
+
+def _resolve_products(codes, ids):
+    """{code: product} e {id: product} com uma query por lote de códigos/ids."""
+    by_code, by_id = {}, {}
+    fields = ('id', 'name', 'unit', 'sku', 'gtin', 'barcode')
+    codes = sorted(codes)
+    for i in range(0, len(codes), BATCH_SIZE):
+        chunk = codes[i:i + BATCH_SIZE]
+        for product in Product.objects.filter(
+            Q(sku__in=chunk) | Q(barcode__in=chunk) | Q(gtin__in=chunk)
+        ).only(*fields).order_by('-is_active', 'id'):
+            for code in (product.sku, product.barcode, product.gtin):
+                if code in chunk:
+                    by_code.setdefault(code, product)
+    ids = sorted(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        for product in Product.objects.filter(pk__in=ids[i:i + BATCH_SIZE]).only(*fields):
+            by_id[product.pk] = product
+    return by_code, by_id
+
+
+def _counted_per_product(rows):
+    """Valida as linhas e soma a contagem por produto: {product_id: (product, stock_units)}."""
+    errors = []
+    parsed = []
+    for line, row in enumerate(rows, start=1):
+        code = str(row.get('code') or '').strip()
+        raw_id = str(row.get('product_id') or '').strip()
+        if raw_id.endswith('.0'):
+            raw_id = raw_id[:-2]  # XLSX lê números como float
+        if code.endswith('.0') and code[:-2].isdigit():
+            code = code[:-2]
+        if not code and not raw_id:
+            errors.append((line, 'informe o código ou product_id.'))
+            continue
+        if not code and not raw_id.isdigit():
+            errors.append((line, f'product_id inválido ({raw_id!r}).'))
+            continue
+        quantity = _parse_quantity(row.get('quantity'), line, errors)
+        if quantity is not None:
+            parsed.append((line, code, int(raw_id) if not code else None, quantity))
+
+    by_code, by_id = _resolve_products(
+        {code for _l, code, _i, _q in parsed if code},
+        {pid for _l, code, pid, _q in parsed if not code},
+    )
+    counted = {}
+    for line, code, pid, quantity in parsed:
+        product = by_code.get(code) if code else by_id.get(pid)
+        if product is None:
+            errors.append((line, f'produto {code or pid} não encontrado.'))
+            continue
+        if product.unit != 'KG' and quantity != quantity.to_integral_value():
+            errors.append((line, f'{product.name} aceita apenas quantidade inteira.'))
+            continue
+        units = _to_stock_units(product, quantity)
+        previous = counted.get(product.pk, (product, 0))[1]
+        counted[product.pk] = (product, previous + units)
+    if errors:
+        raise InventoryCountError([f'Linha {line}: {message}' for line, message in sorted(errors)])
+    if not counted:
+        raise InventoryCountError(['Nenhuma linha para importar.'])
+    return counted
+
+
+def apply_inventory_count(rows, user=None, reference='', dry_run=False):
+    """
+    Aplica a contagem: estoque := quantidade contada, com uma movimentação de
+    ajuste por produto alterado. Levanta InventoryCountError se houver linha inválida.
+
+    Retorna {'lines', 'products', 'adjusted', 'unchanged', 'increase', 'decrease',
+    'dry_run', 'diff': [{'product_id', 'name', 'previous', 'counted', 'delta'}, ...]}.
+    """
+    counted = _counted_per_product(rows)
+    reference = reference or 'Inventário'
+    diff = []
+    with transaction.atomic():
+        ids = sorted(counted)
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            current = Product.objects.filter(pk__in=chunk).order_by('pk')
+            if not dry_run:
+                current = current.select_for_update()
+            changed = {}
+            for pk, previous in current.values_list('pk', 'stock_quantity'):
+                product, new = counted[pk]
+                if new != previous:
+                    changed[pk] = (previous, new)
+                    diff.append({
+                        'product_id': pk, 'name': product.name,
+                        'previous': previous, 'counted': new, 'delta': new - previous,
+                    })
+            if dry_run or not changed:
+                continue
+            Product.objects.filter(pk__in=list(changed)).update(
+                stock_quantity=Case(
+                    *[When(pk=pk, then=Value(new)) for pk, (_prev, new) in changed.items()],
+                    output_field=IntegerField(),
+                )
+            )
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=pk,
+                    movement_type='adjustment',
+                    quantity=abs(new - previous),
+                    previous_stock=previous,
+                    new_stock=new,
+                    reference=reference[:200],
+                    observation='Ajuste por contagem de inventário',
+                    created_by=user,
+                )
+                for pk, (previous, new) in changed.items()
+            ], batch_size=BATCH_SIZE)
+            # UPDATE em lote não dispara signals: invalida o cache de código do PDV
+            code_cache.invalidate(changed)
+
+    return {
+        'lines': len(rows),
+        'products': len(counted),
+        'adjusted': len(diff),
+        'unchanged': len(counted) - len(diff),
+        'increase': sum(d['delta'] for d in diff if d['delta'] > 0),
+        'decrease': -sum(d['delta'] for d in diff if d['delta'] < 0),
+        'dry_run': dry_run,
+        'diff': diff,
+    }
@@ -0,0 +1,156 @@
+"""
+Razão de estoque (StockMovement, append-only) com snapshots por produto.
+
+saldo = snapshot mais recente + soma dos deltas das movimentações posteriores
+(índice products_mov_product_id_idx), então o custo de uma consulta é
+proporcional às movimentações desde o último snapshot, não ao histórico.
+
+- take_snapshots(): grava snapshots dos produtos com muitas movimentações novas,
+  com o produto travado (ver a docstring);
+- reconcile(): compara Product.stock_quantity com o razão para todos os
+  produtos em uma única query e devolve as divergências.
+"""
+from django.db import transaction
+from django.db.models import (
+    Case, Count, Exists, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from ..models import Product, StockMovement, StockSnapshot
+
+# Delta de uma movimentação no saldo (mesma regra de StockMovement.quantity_delta)
+MOVEMENT_DELTA = Case(
+    When(movement_type='entry', then=F('quantity')),
+    When(movement_type='exit', then=-F('quantity')),
+    When(movement_type='adjustment', then=F('new_stock') - F('previous_stock')),
+    default=0,
+    output_field=IntegerField(),
+)
+
+SNAPSHOT_MIN_MOVEMENTS = 50
+SNAPSHOT_LOCK_BATCH = 500
+
+
+def _latest_snapshot(product_ref):
+    return StockSnapshot.objects.filter(product=product_ref).order_by('-through_movement_id')
+
+
+def _movements_after(product_ref, through_ref):
+    """Movimentações do produto posteriores ao snapshot, agregadas (delta, quantidade, último id)."""
+    return (
+        StockMovement.objects
+        .filter(product=product_ref, id__gt=through_ref)
+        .order_by()
+        .values('product')
+    )
+
+
+def ledger_queryset(queryset=None):
+    """
+    Produtos anotados com ledger_balance (saldo pelo razão), pending_movements
+    (movimentações desde o último snapshot) e last_movement_id.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    snapshot = _latest_snapshot(OuterRef('pk'))
+    queryset = queryset.annotate(
+        snapshot_through=Coalesce(Subquery(snapshot.values('through_movement_id')[:1]), Value(0)),
+        snapshot_balance=Coalesce(Subquery(snapshot.values('balance')[:1]), Value(0)),
+    )
+    after = _movements_after(OuterRef('pk'), OuterRef('snapshot_through'))
+    return queryset.annotate(
+        pending_delta=Coalesce(
+            Subquery(after.annotate(s=Sum(MOVEMENT_DELTA)).values('s')[:1]), Value(0),
+        ),
+        pending_movements=Coalesce(
+            Subquery(after.annotate(c=Count('id')).values('c')[:1]), Value(0),
+        ),
+        last_movement_id=Coalesce(
+            Subquery(after.annotate(m=Max('id')).values('m')[:1]), F('snapshot_through'),
+        ),
+    ).annotate(
+        ledger_balance=F('snapshot_balance') + F('pending_delta'),
+    )
+
+
+def balance(product_id):
+    """Saldo do produto pelo razão (snapshot + movimentações posteriores)."""
+    snapshot = _latest_snapshot(product_id).values('through_movement_id', 'balance').first()
+    through = snapshot['through_movement_id'] if snapshot else 0
+    base = snapshot['balance'] if snapshot else 0
+    pending = StockMovement.objects.filter(product_id=product_id, id__gt=through).aggregate(
+        total=Sum(MOVEMENT_DELTA),
+    )['total'] or 0
+    return base + pending
+
+
+def take_snapshots(min_movements=SNAPSHOT_MIN_MOVEMENTS, product_ids=None):
+    """
+    Grava um snapshot para cada produto com pelo menos min_movements
+    movimentações desde o último. Retorna quantos snapshots foram criados.
+
+    O id das movimentações não segue a ordem de commit: uma transação ainda
+    aberta pode gravar um id menor que o último visível e, se ficasse abaixo de
+    through_movement_id, nunca entraria no saldo. Por isso cada lote de
+    produtos é travado (select_for_update, o lock que todo escritor de estoque
+    pega antes de gravar movimentações) e só depois o razão é lido.
+    """
+    min_movements = max(min_movements, 1)
+    qs = Product.objects.all()
+    if product_ids is not None:
+        qs = qs.filter(pk__in=product_ids)
+    candidates = list(
+        ledger_queryset(qs)
+        .filter(pending_movements__gte=min_movements)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    created = 0
+    for start in range(0, len(candidates), SNAPSHOT_LOCK_BATCH):
+        batch = candidates[start:start + SNAPSHOT_LOCK_BATCH]
+        with transaction.atomic():
+            locked = list(
+                Product.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk', flat=True)
+            )
+            rows = (
+                ledger_queryset(Product.objects.filter(pk__in=locked))
+                .filter(pending_movements__gte=min_movements)
+                .values_list('pk', 'last_movement_id', 'ledger_balance', 'pending_movements')
+            )
+            snapshots = [
+                StockSnapshot(product_id=pk, through_movement_id=last_id, balance=bal, movements_count=count)
+                for pk, last_id, bal, count in rows
+            ]
+            StockSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+        created += len(snapshots)
+    return created
+
+
+def reconcile(product_ids=None, only_with_movements=False):
+    """
+    Divergências entre Product.stock_quantity e o razão:
+    [{'product_id', 'name', 'stock_quantity', 'ledger_balance', 'drift'}, ...],
+    maior divergência absoluta primeiro. drift = stock_quantity - ledger_balance.
+    """
+    qs = Product.objects.all()
+    if product_ids is not None:
+        qs = qs.filter(pk__in=product_ids)
+    if only_with_movements:
+        qs = qs.filter(Exists(StockMovement.objects.filter(product=OuterRef('pk'))))
+    rows = (
+        ledger_queryset(qs)
+        .exclude(stock_quantity=F('ledger_balance'))
+        .annotate(drift=F('stock_quantity') - F('ledger_balance'))
+        .values('pk', 'name', 'stock_quantity', 'ledger_balance', 'drift')
+    )
+    result = [
+        {
+            'product_id': r['pk'],
+            'name': r['name'],
+            'stock_quantity': r['stock_quantity'],
+            'ledger_balance': r['ledger_balance'],
+            'drift': r['drift'],
+        }
+        for r in rows.iterator(chunk_size=2000)
+    ]
+    result.sort(key=lambda r: abs(r['drift']), reverse=True)
+    return result
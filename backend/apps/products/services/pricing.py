@@ -1,5 +1,5 @@
 """
-Product services: pricing and stock balance.
+Product pricing: sale price from cost and margin.
 """
 from decimal import Decimal, ROUND_HALF_UP
 
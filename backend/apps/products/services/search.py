@@ -0,0 +1,101 @@
+"""
+Busca de produtos (PDV e listagem).
+
+Product.search_text guarda nome, códigos, categoria e descrição normalizados
+(minúsculas, sem acentos). No PostgreSQL a coluna tem índice GIN pg_trgm
+(migração 0007): o filtro `contains` por termo usa o índice e o resultado é
+ordenado por similaridade de trigramas. Códigos (SKU, código de barras, GTIN)
+são buscados por prefixo, usando os índices btree *_like.
+"""
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+SEARCH_FIELDS = ('name', 'sku', 'barcode', 'gtin', 'description', 'category')
+
+_WS = re.compile(r'\s+')
+_CODE = re.compile(r'^[0-9A-Za-z\-./]+$')
+_PRICE = re.compile(r'^\d+[.,]\d{1,2}$')
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e com espaços simples: 'Ração  Cães' -> 'racao caes'."""
+    if not text:
+        return ''
+    folded = unicodedata.normalize('NFKD', str(text))
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return _WS.sub(' ', folded).strip().lower()
+
+
+def build_search_text(product, category_name=None):
+    """Conteúdo de Product.search_text."""
+    if category_name is None and product.category_id:
+        category_name = product.category.name
+    parts = (product.name, product.sku, product.barcode, product.gtin, category_name, product.description)
+    return normalize(' '.join(p for p in parts if p))
+
+
+def refresh_search_text(queryset):
+    """Recalcula search_text (ex.: após renomear a categoria)."""
+    from ..models import Product
+    products = list(queryset.select_related('category'))
+    for product in products:
+        product.search_text = build_search_text(product)
+    Product.objects.bulk_update(products, ['search_text'], batch_size=500)
+
+
+def _code_filter(raw):
+    variants = {raw, raw.upper()}
+    q = Q()
+    for v in variants:
+        q |= Q(sku__startswith=v) | Q(barcode__startswith=v) | Q(gtin__startswith=v)
+    return q
+
+
+def search_products(queryset, raw_query):
+    """
+    Filtra e ordena queryset pela busca raw_query.
+
+    - cada palavra precisa aparecer em search_text (ordem livre);
+    - entradas com cara de código também casam por prefixo de SKU/código de barras/GTIN;
+    - entradas com cara de preço (ex.: 19,90) também casam preço de venda/custo exato.
+    Ordem: código exato, código por prefixo, nome começando pelo termo,
+    similaridade (PostgreSQL) e nome.
+    """
+    raw = (raw_query or '').strip()
+    term = normalize(raw)
+    if not term:
+        return queryset.none()
+
+    text_q = Q()
+    for token in term.split(' '):
+        text_q &= Q(search_text__contains=token)
+    match = text_q
+    is_code = bool(_CODE.match(raw)) and any(c.isdigit() for c in raw)
+    if is_code:
+        match |= _code_filter(raw)
+    if _PRICE.match(raw):
+        try:
+            price = Decimal(raw.replace(',', '.'))
+            match |= Q(sale_price=price) | Q(cost_price=price)
+        except InvalidOperation:
+            pass
+
+    whens = []
+    if is_code:
+        whens += [
+            When(Q(sku=raw) | Q(barcode=raw) | Q(gtin=raw), then=Value(0)),
+            When(_code_filter(raw), then=Value(1)),
+        ]
+    whens.append(When(search_text__startswith=term, then=Value(2)))
+    queryset = queryset.filter(match).annotate(
+        search_rank=Case(*whens, default=Value(3), output_field=IntegerField()),
+    )
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        queryset = queryset.annotate(search_similarity=TrigramSimilarity('search_text', term))
+        return queryset.order_by('search_rank', '-search_similarity', 'name')
+    return queryset.order_by('search_rank', 'name')
@@ -0,0 +1,14 @@
+"""
+Signals que invalidam o cache de código do PDV (services/code_cache.py).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product
+from .services import code_cache
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_code_cache(sender, instance, **kwargs):
+    code_cache.invalidate([instance.pk])
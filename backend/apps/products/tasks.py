@@ -0,0 +1,21 @@
+"""
+Tasks Celery de produtos.
+"""
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def snapshot_and_reconcile_stock():
+    """Grava snapshots do razão de estoque e registra divergências (agendada no Celery Beat)."""
+    from apps.products.services.ledger import reconcile, take_snapshots
+    created = take_snapshots()
+    drift = reconcile(only_with_movements=True)
+    if drift:
+        logger.warning(
+            'Divergência de estoque em %s produto(s); maiores: %s',
+            len(drift), [(r['product_id'], r['drift']) for r in drift[:10]],
+        )
+    return {'snapshots': created, 'drift': len(drift)}
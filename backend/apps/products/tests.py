@@ -1,10 +1,15 @@
 """
 Product and pricing tests.
 """
+import io
 from decimal import Decimal
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
-from .models import Category, Product
+from rest_framework.test import APIClient
+from .models import Category, Product, StockMovement, StockSnapshot
 from .services import calculate_sale_price
+from .services import ledger
 
 
 class PricingServiceTest(TestCase):
@@ -67,3 +72,219 @@ class ProductPricingTest(TestCase):
             min_stock=0,
         )
         self.assertEqual(p.sale_price, Decimal('200'))
+
+
+class ProductSearchTest(TestCase):
+    """search_products: texto normalizado sem acentos e códigos por prefixo."""
+
+    def setUp(self):
+        from .services.search import search_products
+        self.search = lambda q: list(search_products(Product.objects.all(), q))
+        self.category = Category.objects.create(name='Rações')
+        self.adult = Product.objects.create(
+            name='Ração Cães Adultos 15kg', category=self.category, barcode='7891000100103',
+            sale_price=Decimal('199.90'), price_manually_set=True,
+        )
+        self.puppy = Product.objects.create(
+            name='Petisco para cães filhotes', category=self.category, barcode='7891000555501',
+            sale_price=Decimal('19.90'), price_manually_set=True,
+        )
+
+    def test_search_text_is_accent_folded(self):
+        self.assertEqual(self.adult.search_text, f'racao caes adultos 15kg {self.adult.sku.lower()} 7891000100103 racoes')
+
+    def test_words_match_in_any_order_without_accents(self):
+        self.assertEqual(self.search('CAES racao'), [self.adult])
+        self.assertEqual(self.search('cães'), [self.puppy, self.adult])
+        self.assertEqual(self.search('rac'), [self.adult, self.puppy])  # nome começando pelo termo primeiro
+
+    def test_code_prefix_and_exact_rank_first(self):
+        self.assertEqual(self.search('7891000'), [self.puppy, self.adult])
+        self.assertEqual(self.search('7891000555501'), [self.puppy])
+        self.assertEqual(self.search(self.puppy.sku.lower()), [self.puppy])
+
+    def test_price_input_matches_exact_price(self):
+        self.assertEqual(self.search('19,90'), [self.puppy])
+
+    def test_category_rename_refreshes_products(self):
+        self.category.name = 'Alimentos'
+        self.category.save()
+        self.assertEqual(self.search('alimentos'), [self.puppy, self.adult])
+
+
+class CodeCacheTest(TestCase):
+    """by-code servido do cache; invalidado por save e pelo ajuste de estoque do PDV."""
+
+    def setUp(self):
+        from .services import code_cache
+        self.code_cache = code_cache
+        cache.clear()
+        code_cache.reset()
+        category = Category.objects.create(name='Petiscos')
+        self.product = Product.objects.create(
+            name='Bifinho', category=category, barcode='7890000000017', gtin='7890000000017',
+            sale_price=Decimal('5.00'), price_manually_set=True, stock_quantity=10,
+        )
+
+    def test_hit_does_not_query_database(self):
+        self.assertEqual(self.code_cache.lookup('7890000000017')['stock_balance'], 10)
+        with self.assertNumQueries(0):
+            data = self.code_cache.lookup('7890000000017')
+        self.assertEqual(data['id'], self.product.id)
+        self.assertEqual(self.code_cache.stats()['hits'], 1)
+        self.assertEqual(self.code_cache.stats()['misses'], 1)
+
+    def test_save_and_stock_adjust_invalidate(self):
+        from apps.sales.services.pdv import bulk_adjust_stock
+        self.code_cache.lookup(self.product.sku)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_adjust_stock({self.product.pk: -3})
+        self.assertEqual(self.code_cache.lookup(self.product.sku)['stock_balance'], 7)
+
+        old_sku = self.product.sku
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.sku = 'BIF-01'
+            self.product.save()
+        self.assertIsNone(self.code_cache.lookup(old_sku))
+        self.assertEqual(self.code_cache.lookup('BIF-01')['sku'], 'BIF-01')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_active = False
+            self.product.save()
+        self.assertIsNone(self.code_cache.lookup('BIF-01'))
+
+    def test_store_racing_invalidation_is_not_served(self):
+        # Erro de cache lê versão e produto; um save faz commit antes do cache.set
+        version = self.code_cache._current_version(self.product.pk)
+        stale = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.sale_price = Decimal('6.50')
+            self.product.save()
+        self.code_cache._store(stale, version)
+        self.assertEqual(Decimal(self.code_cache.lookup('7890000000017')['sale_price']), Decimal('6.50'))
+
+
+class StockLedgerTest(TestCase):
+    """Razão de estoque: saldo via snapshot, reconciliação e movimentações append-only."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Geral')
+        self.product = Product.objects.create(
+            name='Petisco', category=category, sale_price=Decimal('10'), price_manually_set=True,
+        )
+
+    def _move(self, movement_type, quantity, previous=0, new=0):
+        return StockMovement.objects.create(
+            product=self.product, movement_type=movement_type, quantity=quantity,
+            previous_stock=previous, new_stock=new,
+        )
+
+    def test_balance_uses_latest_snapshot(self):
+        self._move('entry', 10)
+        self._move('exit', 3)
+        self.assertEqual(ledger.take_snapshots(min_movements=2), 1)
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual((snapshot.balance, snapshot.movements_count), (7, 2))
+        self._move('adjustment', 5, previous=7, new=5)
+        self._move('entry', 4)
+        with self.assertNumQueries(2):
+            self.assertEqual(StockMovement.get_stock_balance(self.product.pk), 9)
+        self.assertEqual(ledger.take_snapshots(min_movements=3), 0)
+        self.assertEqual(ledger.take_snapshots(min_movements=2), 1)
+        self.assertEqual(self.product.stock_snapshots.first().balance, 9)
+
+    def test_reconcile_reports_drift(self):
+        self._move('entry', 10)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=12)
+        other = Product.objects.create(name='Ração', category=self.product.category, stock_quantity=4)
+        StockMovement.objects.create(product=other, movement_type='entry', quantity=4, previous_stock=0, new_stock=4)
+        drift = ledger.reconcile()
+        self.assertEqual(drift, [{
+            'product_id': self.product.pk, 'name': 'Petisco',
+            'stock_quantity': 12, 'ledger_balance': 10, 'drift': 2,
+        }])
+
+    def test_movements_are_append_only(self):
+        movement = self._move('entry', 1)
+        movement.quantity = 2
+        with self.assertRaises(ValueError):
+            movement.save()
+        with self.assertRaises(ValueError):
+            movement.delete()
+
+
+class InventoryCountTest(TestCase):
+    """POST /api/products/stock-movements/inventory-count/: JSON, CSV, XLSX e rejeição em bloco."""
+
+    url = '/api/products/stock-movements/inventory-count/'
+
+    def setUp(self):
+        from apps.users.models import User
+        category = Category.objects.create(name='Geral')
+        self.petisco = Product.objects.create(
+            name='Petisco', category=category, sku='PET1', stock_quantity=10,
+            sale_price=Decimal('10'), price_manually_set=True,
+        )
+        self.racao = Product.objects.create(
+            name='Ração granel', category=category, barcode='7890001', unit='KG', stock_quantity=5000,
+            sale_price=Decimal('20'), price_manually_set=True,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user(username='estoque', password='x'))
+
+    def test_json_count_adjusts_stock_and_ledger(self):
+        body = {'reference': 'Inventário jan', 'items': [
+            {'code': 'PET1', 'quantity': 4},
+            {'product_id': self.petisco.pk, 'quantity': 3},
+            {'code': '7890001', 'quantity': '5,000'},
+        ]}
+        response = self.api.post(self.url, body, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['products'], data['adjusted'], data['unchanged']), (2, 1, 1))
+        self.assertEqual(data['diff'], [
+            {'product_id': self.petisco.pk, 'name': 'Petisco', 'previous': 10, 'counted': 7, 'delta': -3},
+        ])
+        self.petisco.refresh_from_db()
+        self.assertEqual(self.petisco.stock_quantity, 7)
+        movement = StockMovement.objects.get(product=self.petisco)
+        self.assertEqual((movement.movement_type, movement.previous_stock, movement.new_stock), ('adjustment', 10, 7))
+        self.assertEqual(movement.reference, 'Inventário jan')
+
+    def test_csv_upload_and_dry_run(self):
+        csv_file = SimpleUploadedFile('contagem.csv', 'codigo;quantidade\nPET1;12\n7890001;4,5\n'.encode())
+        response = self.api.post(self.url + '?dry_run=true', {'file': csv_file}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d['delta'] for d in response.json()['diff']], [2, -500])
+        self.assertFalse(StockMovement.objects.exists())
+        self.racao.refresh_from_db()
+        self.assertEqual(self.racao.stock_quantity, 5000)
+
+    def test_xlsx_upload(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.append(['SKU', 'Quantidade'])
+        workbook.active.append(['PET1', 0])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        upload = SimpleUploadedFile('contagem.xlsx', buffer.getvalue())
+        response = self.api.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.petisco.refresh_from_db()
+        self.assertEqual(self.petisco.stock_quantity, 0)
+
+    def test_invalid_line_rejects_whole_import(self):
+        body = [
+            {'code': 'PET1', 'quantity': 1}, {'code': 'NAOEXISTE', 'quantity': 2}, {'code': 'PET1', 'quantity': 'x'},
+            {'code': 'PET1', 'quantity': 'NaN'}, {'code': 'PET1', 'quantity': '-Infinity'},
+        ]
+        response = self.api.post(self.url, body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            'Linha 2: produto NAOEXISTE não encontrado.',
+            "Linha 3: quantidade inválida ('x').",
+            "Linha 4: quantidade inválida ('NaN').",
+            "Linha 5: quantidade inválida ('-Infinity').",
+        ])
+        self.petisco.refresh_from_db()
+        self.assertEqual(self.petisco.stock_quantity, 10)
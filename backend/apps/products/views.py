@@ -5,9 +5,13 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db import models
 from django.db.models.deletion import ProtectedError
 from .models import Category, Product, StockMovement, Purchase
+from .services import code_cache
+from .services.inventory import InventoryCountError, apply_inventory_count, read_upload
+from .services.search import search_products
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -45,34 +49,12 @@ class ProductViewSet(viewsets.ModelViewSet):
         q = (self.request.query_params.get('search') or self.request.query_params.get('q') or '').strip()
         if not q:
             return queryset
-        from django.db.models import Q
-        from django.db.models.functions import Cast
-        from django.db.models import CharField
         q_lower = q.lower()
-        base_q = (
-            Q(name__icontains=q) |
-            Q(sku__icontains=q) |
-            Q(barcode__icontains=q) |
-            Q(gtin__icontains=q) |
-            Q(description__icontains=q) |
-            Q(category__name__icontains=q)
-        )
         if q_lower == 'ativo':
             return queryset.filter(is_active=True)
         if q_lower == 'inativo':
             return queryset.filter(is_active=False)
-        try:
-            from decimal import Decimal
-            _ = Decimal(q.replace(',', '.'))
-            queryset = queryset.annotate(
-                cost_str=Cast('cost_price', CharField()),
-                price_str=Cast('sale_price', CharField()),
-                stock_str=Cast('stock_quantity', CharField()),
-            )
-            base_q = base_q | Q(cost_str__icontains=q.replace(',', '.')) | Q(price_str__icontains=q.replace(',', '.')) | Q(stock_str__icontains=q)
-        except Exception:
-            pass
-        return queryset.filter(base_q)
+        return search_products(queryset, q)
 
     @action(detail=True, methods=['patch'], url_path='pricing')
     def pricing(self, request, pk=None):
@@ -103,31 +85,29 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='search')
     def search(self, request):
-        """PDV: search by name (icontains), SKU or GTIN. Returns id, name, sku, gtin, sale_price, stock_balance."""
+        """PDV: search by name/category words or SKU/GTIN/barcode prefix. Returns id, name, sku, gtin, sale_price, stock_balance."""
         q = (request.query_params.get('q') or '').strip()
         if not q:
             return Response([])
-        from django.db.models import Q
-        products = Product.objects.filter(is_active=True).filter(
-            Q(name__icontains=q) | Q(sku__icontains=q) | Q(gtin__icontains=q) | Q(barcode__icontains=q)
-        )[:20]
+        products = search_products(Product.objects.filter(is_active=True), q)[:20]
         serializer = ProductPdvSerializer(products, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='by-code')
     def by_code(self, request):
-        """PDV: get product by code (SKU or GTIN). Returns 404 if not found."""
+        """PDV: get product by code (SKU, GTIN or barcode), served from the code cache. Returns 404 if not found."""
         code = (request.query_params.get('code') or '').strip()
         if not code:
             return Response({'detail': 'Parâmetro code é obrigatório'}, status=status.HTTP_400_BAD_REQUEST)
-        from django.db.models import Q
-        product = Product.objects.filter(is_active=True).filter(
-            Q(sku=code) | Q(gtin=code) | Q(barcode=code)
-        ).first()
-        if not product:
+        data = code_cache.lookup(code, request=request)
+        if data is None:
             return Response({'detail': 'Produto não encontrado'}, status=status.HTTP_404_NOT_FOUND)
-        serializer = ProductPdvSerializer(product)
-        return Response(serializer.data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='by-code/stats')
+    def by_code_stats(self, request):
+        """Contadores de acerto/erro do cache de código (por processo)."""
+        return Response(code_cache.stats())
 
     def destroy(self, request, *args, **kwargs):
         """Excluir produto; retorna mensagem clara se houver vendas/compras vinculadas."""
@@ -148,10 +128,11 @@ class ProductViewSet(viewsets.ModelViewSet):
 
 
 class StockMovementViewSet(viewsets.ModelViewSet):
-    """ViewSet for Stock Movement management."""
+    """ViewSet for Stock Movement management (append-only: list, detail, create)."""
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
     filterset_fields = ['product', 'movement_type']
+    http_method_names = ['get', 'post', 'head', 'options']
 
     def get_queryset(self):
         queryset = StockMovement.objects.all()
@@ -160,6 +141,39 @@ class StockMovementViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(product_id=product_id)
         return queryset.order_by('-created_at')
 
+    @action(detail=False, methods=['post'], url_path='inventory-count',
+            parser_classes=[MultiPartParser, FormParser, JSONParser])
+    def inventory_count(self, request):
+        """
+        Contagem de inventário em lote: arquivo CSV/XLSX (campo file) com colunas
+        código (ou product_id) e quantidade, ou JSON [{code|product_id, quantity}, ...]
+        / {"items": [...], "reference": "..."}. ?dry_run=true apenas calcula o diff.
+        """
+        data = request.data
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                rows = read_upload(upload)
+            else:
+                rows = data if isinstance(data, list) else data.get('items')
+                if not isinstance(rows, list):
+                    return Response(
+                        {'error': 'Envie um arquivo (file) ou uma lista de itens.'},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                if not all(isinstance(r, dict) for r in rows):
+                    return Response({'error': 'Itens devem ser objetos.'}, status=status.HTTP_400_BAD_REQUEST)
+            options = data if not isinstance(data, list) else {}
+            dry_run = str(
+                request.query_params.get('dry_run') or options.get('dry_run') or ''
+            ).lower() in ('1', 'true', 'yes')
+            summary = apply_inventory_count(
+                rows, user=request.user, reference=str(options.get('reference') or ''), dry_run=dry_run,
+            )
+        except InventoryCountError as e:
+            return Response({'error': str(e), 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
 
 class PurchaseViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Purchase (read-only list/detail)."""
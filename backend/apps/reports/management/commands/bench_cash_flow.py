@@ -0,0 +1,90 @@
+"""
+Benchmark da projeção de caixa (aging + curva semanal) sobre uma carteira de
+crediário de N anos. Roda dentro de uma transação desfeita ao final.
+
+    python manage.py bench_cash_flow --accounts 5000 --years 3 --weeks 156 --runs 5
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.payables.models import BillPayable
+from apps.reports.services.cashflow import cash_flow
+from apps.sales.models import CreditAccount, CreditInstallment, Sale
+from apps.users.models import User
+from core.bench import percentile, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo e o número de queries da projeção de caixa para uma carteira de N anos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=5000, help='Crediários (12 parcelas cada).')
+        parser.add_argument('--bills', type=int, default=3000, help='Contas a pagar.')
+        parser.add_argument('--years', type=int, default=3, help='Anos cobertos pela carteira.')
+        parser.add_argument('--weeks', type=int, default=156, help='Semanas projetadas.')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(options)
+
+    def _run(self, options):
+        rnd = random.Random(42)
+        today = timezone.localdate()
+        span = 365 * options['years']
+        start = today - timedelta(days=span // 2)
+        user = User.objects.create_user(username='__bench_cash__', password='x')
+        client = Client.objects.create(name='Bench', document_type='cpf', document='00000000191', phone='0')
+        sales = Sale.objects.bulk_create([
+            Sale(client=client, payment_method='crediario', status='paid', created_by=user)
+            for _ in range(options['accounts'])
+        ], batch_size=2000)
+        accounts = CreditAccount.objects.bulk_create([
+            CreditAccount(
+                sale=sale, client=client, total_amount=Decimal('1200'), financed_amount=Decimal('1200'),
+                installments_count=12, created_by=user,
+            )
+            for sale in sales
+        ], batch_size=2000)
+        installments = []
+        for account in accounts:
+            first = start + timedelta(days=rnd.randrange(span - 330))
+            for n in range(12):
+                due = first + timedelta(days=30 * n)
+                status = 'paid' if due < today and rnd.random() < 0.85 else 'pending'
+                installments.append(CreditInstallment(
+                    credit_account=account, number=n + 1, due_date=due, amount=Decimal('100'), status=status,
+                ))
+        CreditInstallment.objects.bulk_create(installments, batch_size=5000)
+        BillPayable.objects.bulk_create([
+            BillPayable(
+                description=f'Conta {i}', amount=Decimal('350'),
+                due_date=start + timedelta(days=rnd.randrange(span)),
+                status='paid' if rnd.random() < 0.5 else 'pending',
+            )
+            for i in range(options['bills'])
+        ], batch_size=5000)
+
+        self.stdout.write(
+            f'{connection.vendor}: {len(installments)} parcelas, {options["bills"]} contas, '
+            f'{options["weeks"]} semanas'
+        )
+        timings, queries = [], 0
+        for _ in range(max(options['runs'], 1)):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                cash_flow(today, options['weeks'])
+                timings.append((time.perf_counter() - t0) * 1000)
+            queries = len(ctx.captured_queries)
+        self.stdout.write((
+            f'média {statistics.mean(timings):.1f} ms, p95 {percentile(timings, 0.95):.1f} ms, {queries} queries'
+        ))
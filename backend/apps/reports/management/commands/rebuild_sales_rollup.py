@@ -0,0 +1,33 @@
+"""
+Reconstrói o rollup diário de vendas usado pelo dashboard e rankings.
+Rode uma vez após aplicar a migração do app reports e sempre que quiser
+corrigir divergências (ex.: vendas importadas direto no banco).
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.services.rollup import rebuild_all, rebuild_range
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o rollup diário de vendas (todo o histórico ou --start/--end).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Data inicial (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Data final (YYYY-MM-DD), inclusive.')
+
+    def handle(self, *args, **options):
+        start, end = options.get('start'), options.get('end')
+        if not start and not end:
+            rows = rebuild_all()
+        else:
+            try:
+                start = date.fromisoformat(start) if start else None
+                end = date.fromisoformat(end) if end else date.today()
+            except ValueError:
+                raise CommandError('Datas devem estar no formato YYYY-MM-DD.')
+            if start is None or start > end:
+                raise CommandError('Informe --start menor ou igual a --end.')
+            rows = rebuild_range(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rollup reconstruído: {rows} linha(s) de fato.'))
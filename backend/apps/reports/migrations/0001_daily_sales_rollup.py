@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:21
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0006_product_package_unit'),
+        ('clients', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Forma de Pagamento')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('quantity', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=16, verbose_name='Quantidade')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Receita')),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Lucro estimado')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Produto')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Venda diária por produto',
+                'verbose_name_plural': 'Vendas diárias por produto',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyClientSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Forma de Pagamento')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='Quantidade de vendas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Receita')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clients.client', verbose_name='Cliente')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Venda diária por cliente',
+                'verbose_name_plural': 'Vendas diárias por cliente',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Forma de Pagamento')),
+                ('status', models.CharField(max_length=20, verbose_name='Status')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='Quantidade de vendas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Receita')),
+                ('items_qty', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=16, verbose_name='Itens vendidos')),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Lucro estimado')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Fato diário de vendas',
+                'verbose_name_plural': 'Fatos diários de vendas',
+                'indexes': [models.Index(fields=['day', 'status'], name='reports_dsf_day_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesfact',
+            constraint=models.UniqueConstraint(fields=('day', 'seller', 'payment_method', 'status'), name='reports_daily_sales_fact_key'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['day', 'status'], name='reports_dps_day_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'seller', 'payment_method', 'status'), name='reports_daily_product_key'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyclientsales',
+            index=models.Index(fields=['day', 'status'], name='reports_dcs_day_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyclientsales',
+            constraint=models.UniqueConstraint(fields=('day', 'client', 'seller', 'payment_method', 'status'), name='reports_daily_client_key'),
+        ),
+    ]
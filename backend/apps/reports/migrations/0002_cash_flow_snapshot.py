@@ -0,0 +1,28 @@
+# Migration: snapshot diário da projeção de caixa (crediário x contas a pagar)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Dia')),
+                ('weeks', models.PositiveSmallIntegerField(verbose_name='Semanas projetadas')),
+                ('data', models.JSONField(verbose_name='Projeção')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Gerado em')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de fluxo de caixa',
+                'verbose_name_plural': 'Snapshots de fluxo de caixa',
+                'ordering': ['-day'],
+            },
+        ),
+    ]
@@ -0,0 +1,143 @@
+"""
+Reports models — tabelas de fatos diárias (rollup) mantidas incrementalmente
+a partir das vendas. Ver apps.reports.services.rollup.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+
+
+class DailySalesFact(models.Model):
+    """
+    Fato diário de vendas por (dia, vendedor, forma de pagamento, status).
+    """
+    day = models.DateField(verbose_name='Dia')
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Vendedor'
+    )
+    payment_method = models.CharField(max_length=20, verbose_name='Forma de Pagamento')
+    status = models.CharField(max_length=20, verbose_name='Status')
+    sales_count = models.IntegerField(default=0, verbose_name='Quantidade de vendas')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita')
+    items_qty = models.DecimalField(max_digits=16, decimal_places=4, default=Decimal('0'), verbose_name='Itens vendidos')
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Lucro estimado')
+
+    class Meta:
+        verbose_name = 'Fato diário de vendas'
+        verbose_name_plural = 'Fatos diários de vendas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'seller', 'payment_method', 'status'],
+                name='reports_daily_sales_fact_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status'], name='reports_dsf_day_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.payment_method}/{self.status}: {self.sales_count}"
+
+
+class DailyProductSales(models.Model):
+    """
+    Rollup diário por produto. Mantém vendedor e forma de pagamento na chave
+    para que os filtros do dashboard continuem valendo para o top de produtos.
+    """
+    day = models.DateField(verbose_name='Dia')
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Produto'
+    )
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Vendedor'
+    )
+    payment_method = models.CharField(max_length=20, verbose_name='Forma de Pagamento')
+    status = models.CharField(max_length=20, verbose_name='Status')
+    quantity = models.DecimalField(max_digits=16, decimal_places=4, default=Decimal('0'), verbose_name='Quantidade')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita')
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Lucro estimado')
+
+    class Meta:
+        verbose_name = 'Venda diária por produto'
+        verbose_name_plural = 'Vendas diárias por produto'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product', 'seller', 'payment_method', 'status'],
+                name='reports_daily_product_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status'], name='reports_dps_day_status_idx'),
+        ]
+
+
+class DailyClientSales(models.Model):
+    """
+    Rollup diário por cliente (somente vendas com cliente identificado).
+    """
+    day = models.DateField(verbose_name='Dia')
+    client = models.ForeignKey(
+        'clients.Client',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Cliente'
+    )
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Vendedor'
+    )
+    payment_method = models.CharField(max_length=20, verbose_name='Forma de Pagamento')
+    status = models.CharField(max_length=20, verbose_name='Status')
+    sales_count = models.IntegerField(default=0, verbose_name='Quantidade de vendas')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita')
+
+    class Meta:
+        verbose_name = 'Venda diária por cliente'
+        verbose_name_plural = 'Vendas diárias por cliente'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'client', 'seller', 'payment_method', 'status'],
+                name='reports_daily_client_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status'], name='reports_dcs_day_status_idx'),
+        ]
+
+
+class CashFlowSnapshot(models.Model):
+    """
+    Snapshot diário da projeção de caixa (aging + curva semanal) gerado pelo
+    Celery Beat; guarda o histórico e serve a leitura sem recalcular.
+    Ver apps.reports.services.cashflow.
+    """
+    day = models.DateField(unique=True, verbose_name='Dia')
+    weeks = models.PositiveSmallIntegerField(verbose_name='Semanas projetadas')
+    data = models.JSONField(verbose_name='Projeção')
+    created_at = models.DateTimeField(auto_now=True, verbose_name='Gerado em')
+
+    class Meta:
+        verbose_name = 'Snapshot de fluxo de caixa'
+        verbose_name_plural = 'Snapshots de fluxo de caixa'
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"Fluxo de caixa {self.day} ({self.weeks} semanas)"
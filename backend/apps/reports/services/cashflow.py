@@ -0,0 +1,149 @@
+"""
+Recebíveis do crediário x contas a pagar: aging e projeção semanal de caixa.
+
+Uma query agrupada por dia de vencimento para cada lado (parcelas e contas a
+pagar), servida pelo índice (status, due_date[, amount]): o resultado tem no
+máximo uma linha por dia, independente do tamanho da carteira, e aging e curva
+semanal são dobrados a partir dela em Python.
+
+- aging: valor e quantidade em aberto por faixa de atraso (a vencer, 0-30,
+  31-60, 61-90, 90+ dias), usando a data de hoje (não depende da marcação
+  'overdue' do Celery Beat);
+- curva: entradas (parcelas) e saídas (contas) por semana (segunda-feira) a
+  partir da semana atual, com saldo líquido e acumulado. Valores já vencidos
+  ficam fora da curva e aparecem em 'overdue'.
+
+CashFlowSnapshot guarda o resultado do dia (take_snapshot, no Celery Beat).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from apps.payables.models import BillPayable
+from apps.sales.models import CreditInstallment
+from apps.reports.models import CashFlowSnapshot
+
+OPEN_STATUSES = ('pending', 'overdue')
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 156  # 3 anos
+# (rótulo, menor atraso em dias, maior atraso em dias ou None)
+AGING_BUCKETS = (
+    ('0-30', 1, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+ZERO = Decimal('0.00')
+
+
+def _money(value):
+    return float(value or ZERO)
+
+
+def open_by_day(queryset):
+    """[(due_date, soma, quantidade)] das contas em aberto do queryset: uma linha por dia de vencimento."""
+    return list(
+        queryset.filter(status__in=OPEN_STATUSES)
+        .values('due_date')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .values_list('due_date', 'total', 'count')
+        .order_by()
+    )
+
+
+def _bucket(days_late):
+    if days_late <= 0:
+        return 'current'
+    for label, low, high in AGING_BUCKETS:
+        if high is None or days_late <= high:
+            return label
+
+
+def aging(rows, today):
+    """
+    Valor/quantidade em aberto por faixa de atraso a partir de open_by_day().
+    Retorna {'open_total', 'open_count', 'buckets': {'current': {...}, '0-30': {...}, ...}}.
+    """
+    totals = {label: [ZERO, 0] for label in ('current',) + tuple(b[0] for b in AGING_BUCKETS)}
+    for day, total, count in rows:
+        bucket = totals[_bucket((today - day).days)]
+        bucket[0] += total
+        bucket[1] += count
+    return {
+        'open_total': _money(sum(t for t, _c in totals.values())),
+        'open_count': sum(c for _t, c in totals.values()),
+        'buckets': {label: {'total': _money(t), 'count': c} for label, (t, c) in totals.items()},
+    }
+
+
+def _weekly(rows, start, end):
+    """{segunda-feira: soma} dos vencimentos em [start, end)."""
+    totals = {}
+    for day, total, _count in rows:
+        if start <= day < end:
+            week = day - timedelta(days=day.weekday())
+            totals[week] = totals.get(week, ZERO) + total
+    return totals
+
+
+def weekly_curve(receivable_rows, payable_rows, today, weeks=DEFAULT_WEEKS):
+    """
+    Entradas x saídas por semana a partir da semana de today (somente vencimentos >= today).
+    [{'week_start', 'inflow', 'outflow', 'net', 'cumulative'}, ...] com uma linha por semana.
+    """
+    first_week = today - timedelta(days=today.weekday())
+    end = first_week + timedelta(weeks=weeks)
+    inflow = _weekly(receivable_rows, today, end)
+    outflow = _weekly(payable_rows, today, end)
+    curve, cumulative = [], ZERO
+    for n in range(weeks):
+        week = first_week + timedelta(weeks=n)
+        week_in, week_out = inflow.get(week, ZERO), outflow.get(week, ZERO)
+        cumulative += week_in - week_out
+        curve.append({
+            'week_start': week.isoformat(),
+            'inflow': _money(week_in),
+            'outflow': _money(week_out),
+            'net': _money(week_in - week_out),
+            'cumulative': _money(cumulative),
+        })
+    return curve
+
+
+def cash_flow(today=None, weeks=DEFAULT_WEEKS):
+    """Aging de recebíveis e de contas a pagar + curva semanal líquida (2 queries)."""
+    today = today or timezone.localdate()
+    weeks = max(1, min(int(weeks), MAX_WEEKS))
+    receivable_rows = open_by_day(CreditInstallment.objects.all())
+    payable_rows = open_by_day(BillPayable.objects.all())
+    receivables = aging(receivable_rows, today)
+    payables = aging(payable_rows, today)
+    curve = weekly_curve(receivable_rows, payable_rows, today, weeks)
+    inflow = round(sum(w['inflow'] for w in curve), 2)
+    outflow = round(sum(w['outflow'] for w in curve), 2)
+    overdue_in = receivables['open_total'] - receivables['buckets']['current']['total']
+    overdue_out = payables['open_total'] - payables['buckets']['current']['total']
+    return {
+        'as_of': today.isoformat(),
+        'weeks': weeks,
+        'receivables': receivables,
+        'payables': payables,
+        'overdue': {'inflow': round(overdue_in, 2), 'outflow': round(overdue_out, 2)},
+        'curve': curve,
+        'totals': {'inflow': inflow, 'outflow': outflow, 'net': round(inflow - outflow, 2)},
+    }
+
+
+def take_snapshot(today=None, weeks=DEFAULT_WEEKS):
+    """Grava (ou substitui) o snapshot do dia. Retorna o CashFlowSnapshot."""
+    today = today or timezone.localdate()
+    snapshot, _created = CashFlowSnapshot.objects.update_or_create(
+        day=today, defaults={'weeks': weeks, 'data': cash_flow(today, weeks)},
+    )
+    return snapshot
+
+
+def latest_snapshot():
+    return CashFlowSnapshot.objects.order_by('-day').first()
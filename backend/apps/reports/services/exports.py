@@ -0,0 +1,90 @@
+"""
+Exportações CSV em streaming.
+
+As linhas saem de um cursor do servidor (.iterator(chunk_size)) com projeção
+via values_list, são escritas em CSV uma a uma e, opcionalmente, comprimidas
+em gzip à medida que são geradas: memória constante, sem limite de linhas.
+"""
+import csv
+import zlib
+
+from apps.sales.models import Sale
+from .queries import format_products_sold_row, products_sold_queryset
+
+EXPORT_CHUNK_SIZE = 2000
+
+SALES_HEADER = ['ID', 'Data', 'Vendedor', 'Cliente', 'Total', 'Forma Pagamento', 'Status']
+PRODUCTS_SOLD_HEADER = [
+    'ID Produto', 'Nome', 'Categoria', 'Qtd Vendida', 'Receita', 'Preço Médio', 'Lucro Est.', 'Participação %'
+]
+
+
+class _Echo:
+    """Pseudo-arquivo: csv.writer devolve a linha formatada em vez de acumulá-la."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(header, rows):
+    """Gera o CSV (bytes UTF-8) linha a linha."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header).encode('utf-8')
+    for row in rows:
+        yield writer.writerow(row).encode('utf-8')
+
+
+def gzip_stream(chunks, level=6, flush_bytes=64 * 1024):
+    """Comprime um fluxo de bytes em gzip, emitindo blocos de ~flush_bytes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+    pending = []
+    size = 0
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            pending.append(out)
+            size += len(out)
+        if size >= flush_bytes:
+            yield b''.join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def sales_rows(qs):
+    """Linhas do CSV de vendas a partir de sales_report_queryset (sem fatiar)."""
+    payment_labels = dict(Sale.PAYMENT_METHOD_CHOICES)
+    status_labels = dict(Sale.STATUS_CHOICES)
+    projection = qs.values_list(
+        'id', 'sale_date', 'created_by__username', 'client__name', 'is_walk_in',
+        'total', 'payment_method', 'status',
+    )
+    for sale_id, sale_date, seller, client_name, is_walk_in, total, payment_method, status in (
+        projection.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    ):
+        yield [
+            sale_id,
+            sale_date.strftime('%Y-%m-%d %H:%M') if sale_date else '',
+            seller or '',
+            client_name or ('Avulsa' if is_walk_in else '-'),
+            str(total),
+            payment_labels.get(payment_method, payment_method),
+            status_labels.get(status, status),
+        ]
+
+
+def products_sold_rows(start=None, end=None, category_id=None, order='revenue'):
+    """Linhas do CSV de produtos vendidos (todos os produtos do período)."""
+    agg, total_revenue = products_sold_queryset(start=start, end=end, category_id=category_id, order=order)
+    for row in agg.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        r = format_products_sold_row(row, total_revenue)
+        yield [
+            r['product_id'],
+            r['name'],
+            r['category_name'],
+            r['quantity_total'],
+            r['revenue_total'],
+            r['avg_price'],
+            r['estimated_profit'],
+            r['share_percent'],
+        ]
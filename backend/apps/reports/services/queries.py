@@ -1,15 +1,18 @@
 """
 Aggregated queries for reports. All date filters use sale_date (timezone-aware).
 Default: only paid sales; optional include/exclude cancelled.
+Dashboard, ranking de vendedores e top clientes leem do rollup diário
+(apps.reports.models, mantido por apps.reports.services.rollup).
 """
+import time
 from datetime import date, timedelta
 from decimal import Decimal
 
 from django.db.models import (
     Sum, Count, Avg, Q, F, Value, IntegerField, DecimalField,
-    Case, When, ExpressionWrapper,
+    Case, When, ExpressionWrapper, Max, OuterRef, Subquery, DateTimeField,
 )
-from django.db.models.functions import Coalesce, TruncDate, TruncDay
+from django.db.models.functions import Coalesce, Greatest, TruncDate
 from django.utils import timezone
 
 from apps.sales.models import Sale, SaleItem, CreditAccount, CreditInstallment
@@ -18,6 +21,7 @@ from apps.services.models import Service
 from apps.clients.models import Client
 from apps.users.models import User
 from apps.scheduling.models import Appointment
+from apps.reports.models import DailySalesFact, DailyProductSales, DailyClientSales
 
 
 def get_sellers():
@@ -75,75 +79,69 @@ def _sales_queryset(start=None, end=None, user_id=None, client_id=None,
 
 
 # ---------- Dashboard ----------
+def _rollup_queryset(model, start, end, user_id=None, payment_method=None,
+                     status=None, exclude_cancelled=True):
+    """Filtra uma tabela de rollup diário com a mesma semântica de _sales_queryset."""
+    qs = model.objects.filter(day__gte=start, day__lte=end)
+    if user_id:
+        qs = qs.filter(seller_id=user_id)
+    if payment_method:
+        qs = qs.filter(payment_method=payment_method)
+    if status:
+        qs = qs.filter(status=status)
+    elif exclude_cancelled:
+        qs = qs.exclude(status='cancelled')
+    return qs
+
+
 def dashboard_data(start, end, user_id=None, payment_method=None, status='paid'):
+    """KPIs do período lidos do rollup diário (apps.reports.models)."""
     end = _parse_date(end, timezone.now().date())
     start = _parse_date(start, end - timedelta(days=30))
-    sales_qs = _sales_queryset(
+    filters = dict(
         start=start, end=end,
         user_id=user_id,
         payment_method=payment_method,
         status=status if status else None,
         exclude_cancelled=(status != 'cancelled' and not status),
     )
-    agg = sales_qs.aggregate(
-        total_count=Count('id'),
-        total_revenue=Coalesce(Sum('total'), Decimal('0')),
-        items_sold=Coalesce(
-            Sum('items__quantity'),
-            Value(0),
-            output_field=IntegerField()
-        ),
+    facts = _rollup_queryset(DailySalesFact, **filters).filter(sales_count__gt=0)
+    agg = facts.aggregate(
+        total_count=Coalesce(Sum('sales_count'), 0),
+        total_revenue=Coalesce(Sum('revenue'), Decimal('0')),
+        total_items=Coalesce(Sum('items_qty'), Decimal('0')),
+        total_profit=Sum('profit'),
     )
-    total_items = SaleItem.objects.filter(sale__in=sales_qs).aggregate(
-        s=Coalesce(Sum('quantity'), Value(0), output_field=IntegerField())
-    )['s'] or 0
     total_revenue = agg['total_revenue'] or Decimal('0')
     total_count = agg['total_count'] or 0
+    total_items = agg['total_items'] or 0
     ticket_avg = (total_revenue / total_count) if total_count else Decimal('0')
-
     # Lucro estimado: soma (quantity * (unit_price - cost)) para itens produto
-    profit_agg = SaleItem.objects.filter(
-        sale__in=sales_qs,
-        item_type='product',
-        product__isnull=False,
-    ).annotate(
-        cost=Coalesce(F('product__cost_price'), Decimal('0')),
-        line_profit=F('unit_price') - F('cost'),
-    ).aggregate(
-        total_profit=Sum(F('line_profit') * F('quantity')),
-    )
-    estimated_profit = profit_agg['total_profit']
+    estimated_profit = agg['total_profit']
 
     # Vendas por dia (time series)
-    daily = list(
-        sales_qs.annotate(day=TruncDay('sale_date'))
-        .values('day')
-        .annotate(count=Count('id'), total=Coalesce(Sum('total'), Decimal('0')))
+    daily = [
+        {'date': d['day'].isoformat(), 'count': d['count'], 'total': d['total']}
+        for d in facts.values('day')
+        .annotate(count=Sum('sales_count'), total=Coalesce(Sum('revenue'), Decimal('0')))
         .order_by('day')
-    )
-    for d in daily:
-        d['date'] = d['day'].date().isoformat() if d.get('day') else None
-        if 'day' in d:
-            del d['day']
+    ]
 
     # Por forma de pagamento
     by_payment = list(
-        sales_qs.values('payment_method')
-        .annotate(count=Count('id'), total=Coalesce(Sum('total'), Decimal('0')))
+        facts.values('payment_method')
+        .annotate(count=Sum('sales_count'), total=Coalesce(Sum('revenue'), Decimal('0')))
         .order_by('-total')
     )
 
     # Top 5 produtos (por receita)
     top_products = list(
-        SaleItem.objects.filter(
-            sale__in=sales_qs,
-            item_type='product',
-            product__isnull=False,
-        )
+        _rollup_queryset(DailyProductSales, **filters)
+        .filter(quantity__gt=0)
         .values('product_id', 'product__name')
         .annotate(
-            qty=Coalesce(Sum('quantity'), 0),
-            revenue=Coalesce(Sum('total'), Decimal('0')),
+            qty=Coalesce(Sum('quantity'), Decimal('0')),
+            revenue=Coalesce(Sum('revenue'), Decimal('0')),
         )
         .order_by('-revenue')[:5]
     )
@@ -152,11 +150,12 @@ def dashboard_data(start, end, user_id=None, payment_method=None, status='paid')
 
     # Top 5 clientes (por receita; client not null)
     top_clients = list(
-        sales_qs.filter(client__isnull=False)
+        _rollup_queryset(DailyClientSales, **filters)
+        .filter(sales_count__gt=0)
         .values('client_id', 'client__name')
         .annotate(
-            count=Count('id'),
-            total=Coalesce(Sum('total'), Decimal('0')),
+            count=Sum('sales_count'),
+            total=Coalesce(Sum('revenue'), Decimal('0')),
         )
         .order_by('-total')[:5]
     )
@@ -178,113 +177,55 @@ def dashboard_data(start, end, user_id=None, payment_method=None, status='paid')
 
 
 # ---------- Dashboard resumido (único endpoint agregado) ----------
-def get_dashboard_summary(target_date=None):
-    """
-    Retorna todos os dados do dashboard em uma única chamada.
-    GET /api/reports/dashboard-summary/?date=YYYY-MM-DD
-    """
-    today = _parse_date(target_date, timezone.now().date())
-    yesterday = today - timedelta(days=1)
-    month_start = today.replace(day=1)
-    seven_days_ago = today - timedelta(days=7)
-    inactive_days = 60  # clientes inativos: sem compra/agendamento há 60 dias
-    low_stock_threshold = 5
-
-    tz = timezone.get_current_timezone()
-
-    # --- KPIs ---
-    sales_paid_qs = Sale.objects.filter(
-        status__in=['paid', 'credit_open'],
-    ).exclude(status='cancelled')
-
-    # Vendas hoje
-    from datetime import datetime
-    today_start = timezone.make_aware(datetime.combine(today, datetime.min.time()), tz)
-    today_end = timezone.make_aware(datetime.combine(today, datetime.max.time().replace(microsecond=0)), tz)
-    yesterday_start = timezone.make_aware(datetime.combine(yesterday, datetime.min.time()), tz)
-    yesterday_end = timezone.make_aware(datetime.combine(yesterday, datetime.max.time().replace(microsecond=0)), tz)
+SUMMARY_SALE_STATUSES = ('paid', 'credit_open')
 
-    sales_today_agg = sales_paid_qs.filter(sale_date__gte=today_start, sale_date__lte=today_end).aggregate(
-        total=Coalesce(Sum('total'), Decimal('0'))
-    )
-    sales_yesterday_agg = sales_paid_qs.filter(sale_date__gte=yesterday_start, sale_date__lte=yesterday_end).aggregate(
-        total=Coalesce(Sum('total'), Decimal('0'))
-    )
-    sales_today = sales_today_agg['total'] or Decimal('0')
-    sales_yesterday = sales_yesterday_agg['total'] or Decimal('0')
-
-    sales_today_change_pct = 0
-    if sales_yesterday and sales_yesterday > 0:
-        sales_today_change_pct = float((sales_today - sales_yesterday) / sales_yesterday * 100)
 
-    # Vendas no mês
-    month_end = timezone.make_aware(datetime.combine(today, datetime.max.time().replace(microsecond=0)), tz)
-    sales_month_agg = sales_paid_qs.filter(
-        sale_date__gte=timezone.make_aware(datetime.combine(month_start, datetime.min.time()), tz),
-        sale_date__lte=month_end,
-    ).aggregate(total=Coalesce(Sum('total'), Decimal('0')))
-    sales_month = sales_month_agg['total'] or Decimal('0')
-    sales_month_goal = None  # opcional, pode vir de config
-
-    # Atendimentos hoje
-    today_appts = Appointment.objects.filter(
-        start_at__date=today,
-    ).exclude(status__in=['cancelled', 'no_show'])
-    appts_total = today_appts.count()
-    appts_done = today_appts.filter(status__in=['completed', 'done']).count()
+def _timed(timings, name, func):
+    """Executa uma seção do resumo registrando a duração (ms) em timings[name]."""
+    t0 = time.perf_counter()
+    result = func()
+    timings[name] = round((time.perf_counter() - t0) * 1000, 2)
+    return result
 
-    # Crediário em aberto (valor total de parcelas pendentes/overdue)
-    credit_open_total = CreditInstallment.objects.filter(
-        credit_account__status='open',
-        status__in=['pending', 'overdue'],
-    ).aggregate(t=Coalesce(Sum('amount'), Decimal('0')))['t'] or Decimal('0')
-    credit_overdue_count = CreditInstallment.objects.filter(
-        credit_account__status='open',
-        status__in=['pending', 'overdue'],
-        due_date__lt=today,
-    ).count()
 
-    kpis = {
-        'sales_today': float(sales_today),
-        'sales_yesterday': float(sales_yesterday),
-        'sales_today_change_pct': round(sales_today_change_pct, 1),
-        'sales_month': float(sales_month),
-        'sales_month_goal': float(sales_month_goal) if sales_month_goal else None,
-        'appointments_today_total': appts_total,
-        'appointments_today_done': appts_done,
-        'credit_open_total': float(credit_open_total),
-        'credit_overdue_count': credit_overdue_count,
+def _summary_sales(today, window_start):
+    """Receita por dia (rollup) de window_start até today: alimenta KPIs e gráfico de 7 dias."""
+    return {
+        r['day']: r['value']
+        for r in DailySalesFact.objects.filter(
+            day__gte=window_start, day__lte=today, status__in=SUMMARY_SALE_STATUSES,
+        ).values('day').annotate(value=Coalesce(Sum('revenue'), Decimal('0')))
     }
 
-    # --- Agenda do dia ---
+
+def _summary_schedule(today):
     schedule_qs = Appointment.objects.filter(
         start_at__date=today,
     ).exclude(status__in=['cancelled', 'no_show']).select_related('client', 'pet', 'service').order_by('start_at')
-    today_schedule = []
-    for apt in schedule_qs:
-        start_at = apt.start_at
-        time_str = start_at.strftime('%H:%M') if start_at else ''
-        today_schedule.append({
+    return [
+        {
             'id': apt.id,
-            'time': time_str,
+            'time': apt.start_at.strftime('%H:%M') if apt.start_at else '',
             'client': apt.client.name if apt.client else '-',
             'pet': apt.pet.name if apt.pet else '-',
             'service': apt.service.name if apt.service else '-',
             'status': apt.status,
             'status_display': apt.get_status_display(),
-        })
-
-    # --- Alertas ---
-    low_stock_products = Product.objects.filter(
-        is_active=True,
-        stock_quantity__lte=low_stock_threshold,
-    ).order_by('stock_quantity')[:10].values('id', 'name', 'stock_quantity')
-    low_stock_list = [
-        {'product_id': p['id'], 'name': p['name'], 'balance': p['stock_quantity']}
-        for p in low_stock_products
+        }
+        for apt in schedule_qs
     ]
 
-    credit_due_list = []
+
+def _summary_credit(today):
+    """Crediário em aberto: total e parcelas vencidas em um único agregado."""
+    agg = CreditInstallment.objects.filter(
+        credit_account__status='open',
+        status__in=['pending', 'overdue'],
+    ).aggregate(
+        open_total=Coalesce(Sum('amount'), Decimal('0')),
+        overdue_count=Count('id', filter=Q(due_date__lt=today)),
+    )
+    due_list = []
     overdue_installs = CreditInstallment.objects.filter(
         credit_account__status='open',
         status__in=['pending', 'overdue'],
@@ -292,7 +233,7 @@ def get_dashboard_summary(target_date=None):
     ).select_related('credit_account__client').order_by('due_date')[:10]
     for inst in overdue_installs:
         client_name = inst.credit_account.client.name if inst.credit_account.client else '-'
-        credit_due_list.append({
+        due_list.append({
             'installment_id': inst.id,
             'credit_id': inst.credit_account_id,
             'client': client_name,
@@ -300,127 +241,130 @@ def get_dashboard_summary(target_date=None):
             'due_date': inst.due_date.isoformat(),
             'status': 'OVERDUE' if inst.due_date < today else 'DUE',
         })
+    return agg['open_total'] or Decimal('0'), agg['overdue_count'] or 0, due_list
 
-    alerts = {
-        'low_stock': low_stock_list,
-        'credit_due': credit_due_list,
-    }
 
-    # --- Top clientes do mês ---
-    month_sales_qs = sales_paid_qs.filter(
-        sale_date__gte=timezone.make_aware(datetime.combine(month_start, datetime.min.time()), tz),
-        sale_date__lte=month_end,
-        client__isnull=False,
-    )
-    top_clients_month = list(
-        month_sales_qs.values('client_id', 'client__name')
-        .annotate(
-            revenue=Coalesce(Sum('total'), Decimal('0')),
-            visits=Count('id'),
-        )
-        .order_by('-revenue')[:5]
-    )
-    customers_top = [
+def _summary_low_stock(threshold):
+    return [
+        {'product_id': p['id'], 'name': p['name'], 'balance': p['stock_quantity']}
+        for p in Product.objects.filter(
+            is_active=True,
+            stock_quantity__lte=threshold,
+        ).order_by('stock_quantity')[:10].values('id', 'name', 'stock_quantity')
+    ]
+
+
+def _summary_top_clients(month_start, today):
+    return [
         {
             'client_id': r['client_id'],
             'name': r['client__name'],
             'revenue': float(r['revenue']),
             'visits': r['visits'],
         }
-        for r in top_clients_month
+        for r in DailyClientSales.objects.filter(
+            day__gte=month_start, day__lte=today,
+            status__in=SUMMARY_SALE_STATUSES, sales_count__gt=0,
+        ).values('client_id', 'client__name').annotate(
+            revenue=Coalesce(Sum('revenue'), Decimal('0')),
+            visits=Sum('sales_count'),
+        ).order_by('-revenue')[:5]
     ]
 
-    # --- Clientes inativos (sem venda nem agendamento há 60+ dias) ---
-    from django.db.models import Max
-    inactive_cutoff = timezone.make_aware(datetime.combine(today - timedelta(days=inactive_days), datetime.min.time()), tz)
-    clients_with_recent_sale = set(
-        Sale.objects.filter(sale_date__gte=inactive_cutoff, client__isnull=False).values_list('client_id', flat=True)
-    )
-    clients_with_recent_apt = set(
-        Appointment.objects.filter(start_at__gte=inactive_cutoff).values_list('client_id', flat=True)
-    )
-    clients_with_recent = clients_with_recent_sale | clients_with_recent_apt
-    inactive_clients_qs = Client.objects.filter(is_active=True).exclude(id__in=clients_with_recent)
-    last_sale_map = dict(
-        Sale.objects.filter(client__isnull=False)
-        .values('client_id')
-        .annotate(d=Max('sale_date'))
-        .values_list('client_id', 'd')
+
+def _summary_top_products(start, today):
+    return [
+        {
+            'product_id': r['product_id'],
+            'name': r['product__name'],
+            'qty': r['qty'],
+            'revenue': float(r['revenue']),
+        }
+        for r in DailyProductSales.objects.filter(
+            day__gte=start, day__lte=today,
+            status__in=SUMMARY_SALE_STATUSES, quantity__gt=0,
+        ).values('product_id', 'product__name').annotate(
+            qty=Coalesce(Sum('quantity'), Decimal('0')),
+            revenue=Coalesce(Sum('revenue'), Decimal('0')),
+        ).order_by('-qty')[:5]
+    ]
+
+
+def get_dashboard_summary(target_date=None):
+    """
+    Retorna todos os dados do dashboard em uma única chamada.
+    GET /api/reports/dashboard-summary/?date=YYYY-MM-DD
+
+    Cada seção é uma consulta (ou um agregado condicional) independente;
+    timings_ms traz a duração de cada uma e o total.
+    """
+    today = _parse_date(target_date, timezone.now().date())
+    yesterday = today - timedelta(days=1)
+    month_start = today.replace(day=1)
+    seven_days_ago = today - timedelta(days=7)
+    inactive_days = 60  # clientes inativos: sem compra/agendamento há 60 dias
+    low_stock_threshold = 5
+
+    timings = {}
+    started = time.perf_counter()
+
+    # --- KPIs + gráfico de 7 dias: uma leitura do rollup diário ---
+    sales_by_day = _timed(
+        timings, 'sales', lambda: _summary_sales(today, min(month_start, seven_days_ago)),
     )
-    last_apt_map = dict(
-        Appointment.objects.values('client_id')
-        .annotate(d=Max('start_at'))
-        .values_list('client_id', 'd')
+    sales_today = sales_by_day.get(today, Decimal('0'))
+    sales_yesterday = sales_by_day.get(yesterday, Decimal('0'))
+    sales_month = sum((v for d, v in sales_by_day.items() if d >= month_start), Decimal('0'))
+    sales_month_goal = None  # opcional, pode vir de config
+
+    sales_today_change_pct = 0
+    if sales_yesterday and sales_yesterday > 0:
+        sales_today_change_pct = float((sales_today - sales_yesterday) / sales_yesterday * 100)
+
+    # --- Agenda do dia (também alimenta os KPIs de atendimento) ---
+    today_schedule = _timed(timings, 'schedule', lambda: _summary_schedule(today))
+    appts_done = sum(1 for a in today_schedule if a['status'] in ('completed', 'done'))
+
+    # --- Crediário em aberto ---
+    credit_open_total, credit_overdue_count, credit_due_list = _timed(
+        timings, 'credit', lambda: _summary_credit(today),
     )
-    inactive_list = []
-    for c in inactive_clients_qs[:15]:
-        ls = last_sale_map.get(c.id)
-        la = last_apt_map.get(c.id)
-        candidates = [x for x in [ls, la] if x is not None]
-        last_dt = max(candidates) if candidates else None
-        if last_dt:
-            last_date = last_dt.date() if hasattr(last_dt, 'date') else last_dt
-            days_inactive = (today - last_date).days
-            inactive_list.append({
-                'client_id': c.id,
-                'name': c.name,
-                'last_visit': last_date.isoformat(),
-                'days_inactive': days_inactive,
-            })
-    inactive_list.sort(key=lambda x: x['days_inactive'], reverse=True)
-    inactive_list = inactive_list[:5]
 
+    kpis = {
+        'sales_today': float(sales_today),
+        'sales_yesterday': float(sales_yesterday),
+        'sales_today_change_pct': round(sales_today_change_pct, 1),
+        'sales_month': float(sales_month),
+        'sales_month_goal': float(sales_month_goal) if sales_month_goal else None,
+        'appointments_today_total': len(today_schedule),
+        'appointments_today_done': appts_done,
+        'credit_open_total': float(credit_open_total),
+        'credit_overdue_count': credit_overdue_count,
+    }
+
+    # --- Alertas ---
+    alerts = {
+        'low_stock': _timed(timings, 'low_stock', lambda: _summary_low_stock(low_stock_threshold)),
+        'credit_due': credit_due_list,
+    }
+
+    # --- Clientes ---
     customers = {
-        'top_clients_month': customers_top,
-        'inactive_clients': inactive_list,
+        'top_clients_month': _timed(timings, 'top_clients', lambda: _summary_top_clients(month_start, today)),
+        'inactive_clients': _timed(
+            timings, 'inactive_clients', lambda: inactive_clients(days=inactive_days, limit=5, today=today),
+        ),
     }
 
     # --- Gráficos ---
-    seven_days_start = timezone.make_aware(datetime.combine(seven_days_ago, datetime.min.time()), tz)
-    sales_7d_qs = sales_paid_qs.filter(
-        sale_date__gte=seven_days_start,
-        sale_date__lte=today_end,
-    )
-    sales_7d = list(
-        sales_7d_qs.annotate(day=TruncDay('sale_date'))
-        .values('day')
-        .annotate(value=Coalesce(Sum('total'), Decimal('0')))
-        .order_by('day')
-    )
-    sales_7d_by_date = {r['day'].date(): r['value'] for r in sales_7d if r.get('day')}
-    sales_last_7_days = []
-    for d in range(8):
-        dt = seven_days_ago + timedelta(days=d)
-        if dt <= today:
-            sales_last_7_days.append({
-                'date': dt.isoformat(),
-                'value': float(sales_7d_by_date.get(dt, Decimal('0'))),
-            })
-
-    sale_ids_7d = list(sales_7d_qs.values_list('id', flat=True))
-    top_products = list(
-        SaleItem.objects.filter(
-            sale_id__in=sale_ids_7d,
-            item_type='product',
-            product__isnull=False,
-        )
-        .values('product_id', 'product__name')
-        .annotate(
-            qty=Coalesce(Sum('quantity'), 0),
-            revenue=Coalesce(Sum('total'), Decimal('0')),
-        )
-        .order_by('-qty')[:5]
-    ) if sale_ids_7d else []
-    charts_top_products = [
+    sales_last_7_days = [
         {
-            'product_id': r['product_id'],
-            'name': r['product__name'],
-            'qty': r['qty'],
-            'revenue': float(r['revenue']),
+            'date': dt.isoformat(),
+            'value': float(sales_by_day.get(dt, Decimal('0'))),
         }
-        for r in top_products
+        for dt in (seven_days_ago + timedelta(days=d) for d in range(8))
     ]
-
+    charts_top_products = _timed(timings, 'top_products', lambda: _summary_top_products(seven_days_ago, today))
     charts = {
         'sales_last_7_days': sales_last_7_days,
         'top_products': charts_top_products,
@@ -441,6 +385,7 @@ def get_dashboard_summary(target_date=None):
     if not insights:
         insights.append('Nenhum insight específico para hoje.')
 
+    timings['total'] = round((time.perf_counter() - started) * 1000, 2)
     return {
         'kpis': kpis,
         'today_schedule': today_schedule,
@@ -448,9 +393,70 @@ def get_dashboard_summary(target_date=None):
         'customers': customers,
         'charts': charts,
         'insights': insights,
+        'timings_ms': timings,
     }
 
 
+# ---------- Clientes inativos ----------
+def inactive_clients_queryset(days=60, today=None):
+    """
+    Clientes ativos cuja última atividade (venda ou agendamento) é anterior a
+    today - days. A última atividade é calculada no banco (Greatest sobre
+    subconsultas Max por cliente), mais inativos primeiro. Clientes sem
+    nenhuma venda/agendamento ficam de fora.
+    """
+    from datetime import datetime
+    today = _parse_date(today, timezone.now().date())
+    cutoff = timezone.make_aware(
+        datetime.combine(today - timedelta(days=days), datetime.min.time()),
+        timezone.get_current_timezone(),
+    )
+    last_sale = Subquery(
+        Sale.objects.filter(client_id=OuterRef('pk'))
+        .order_by().values('client_id').annotate(d=Max('sale_date')).values('d')[:1],
+        output_field=DateTimeField(),
+    )
+    last_apt = Subquery(
+        Appointment.objects.filter(client_id=OuterRef('pk'))
+        .order_by().values('client_id').annotate(d=Max('start_at')).values('d')[:1],
+        output_field=DateTimeField(),
+    )
+    return (
+        Client.objects.filter(is_active=True)
+        .annotate(last_sale=last_sale, last_apt=last_apt)
+        # Greatest com NULL varia por banco; Coalesce garante o maior valor não nulo.
+        .annotate(last_activity=Greatest(
+            Coalesce('last_sale', 'last_apt'),
+            Coalesce('last_apt', 'last_sale'),
+        ))
+        .filter(last_activity__isnull=False, last_activity__lt=cutoff)
+        .order_by('last_activity', 'id')
+        .values('id', 'name', 'last_activity')
+    )
+
+
+def format_inactive_clients(rows, today=None):
+    today = _parse_date(today, timezone.now().date())
+    result = []
+    for r in rows:
+        last_date = timezone.localtime(r['last_activity']).date()
+        result.append({
+            'client_id': r['id'],
+            'name': r['name'],
+            'last_visit': last_date.isoformat(),
+            'days_inactive': (today - last_date).days,
+        })
+    return result
+
+
+def inactive_clients(days=60, limit=None, today=None):
+    """Lista de clientes inativos há days+ dias (mais inativos primeiro)."""
+    qs = inactive_clients_queryset(days=days, today=today)
+    if limit:
+        qs = qs[:limit]
+    return format_inactive_clients(qs, today=today)
+
+
 # ---------- Relatório de vendas (lista paginada) ----------
 def sales_report_queryset(start=None, end=None, user_id=None, client_id=None,
                           status=None, search=None, exclude_cancelled=True):
@@ -471,7 +477,11 @@ def sales_report_queryset(start=None, end=None, user_id=None, client_id=None,
 
 
 # ---------- Produtos vendidos ----------
-def products_sold(start=None, end=None, category_id=None, order='revenue', limit=100):
+def products_sold_queryset(start=None, end=None, category_id=None, order='revenue'):
+    """
+    Agregado por produto (values) já ordenado e a receita total do período,
+    usada em share_percent. Sem limite: products_sold() fatia, a exportação itera.
+    """
     end = _parse_date(end, timezone.now().date())
     start = _parse_date(start, end - timedelta(days=30))
     sales_qs = _sales_queryset(start=start, end=end, status='paid', exclude_cancelled=True)
@@ -487,7 +497,7 @@ def products_sold(start=None, end=None, category_id=None, order='revenue', limit
         output_field=DecimalField(),
     )
     agg = items_qs.values('product_id', 'product__name', 'product__category__name').annotate(
-        quantity_total=Coalesce(Sum('quantity'), 0),
+        quantity_total=Coalesce(Sum('quantity'), Decimal('0')),
         revenue_total=Coalesce(Sum('total'), Decimal('0')),
         profit=Sum(profit_expr),
     ).annotate(
@@ -503,60 +513,59 @@ def products_sold(start=None, end=None, category_id=None, order='revenue', limit
         'revenue': '-revenue_total',
         'profit': '-profit',
     }.get(order, '-revenue_total')
-    rows = list(agg.order_by(order_field)[:limit])
-    result = []
-    for row in rows:
-        share = (float(row['revenue_total'] / total_revenue * 100)) if total_revenue else 0
-        result.append({
-            'product_id': row['product_id'],
-            'name': row['product__name'],
-            'category_name': row['product__category__name'],
-            'quantity_total': row['quantity_total'],
-            'revenue_total': row['revenue_total'],
-            'avg_price': row['avg_price'],
-            'estimated_profit': row['profit'],
-            'share_percent': round(share, 2),
-        })
-    return result
+    return agg.order_by(order_field), total_revenue
+
+
+def format_products_sold_row(row, total_revenue):
+    share = (float(row['revenue_total'] / total_revenue * 100)) if total_revenue else 0
+    return {
+        'product_id': row['product_id'],
+        'name': row['product__name'],
+        'category_name': row['product__category__name'],
+        'quantity_total': row['quantity_total'],
+        'revenue_total': row['revenue_total'],
+        'avg_price': row['avg_price'],
+        'estimated_profit': row['profit'],
+        'share_percent': round(share, 2),
+    }
+
+
+def products_sold(start=None, end=None, category_id=None, order='revenue', limit=100):
+    agg, total_revenue = products_sold_queryset(start=start, end=end, category_id=category_id, order=order)
+    return [format_products_sold_row(row, total_revenue) for row in agg[:limit]]
 
 
 # ---------- Ranking de vendedores ----------
 def sales_ranking(start=None, end=None, order='revenue', limit=20):
     end = _parse_date(end, timezone.now().date())
     start = _parse_date(start, end - timedelta(days=30))
-    sales_qs = _sales_queryset(start=start, end=end, exclude_cancelled=True)
     by_user = list(
-        sales_qs.values('created_by_id', 'created_by__username', 'created_by__first_name', 'created_by__last_name')
+        _rollup_queryset(DailySalesFact, start, end, exclude_cancelled=True)
+        .filter(sales_count__gt=0)
+        .values('seller_id', 'seller__username', 'seller__first_name', 'seller__last_name')
         .annotate(
-            total_sales=Count('id'),
-            total_revenue=Coalesce(Sum('total'), Decimal('0')),
-            cancelled=Count('id', filter=Q(status='cancelled')),
+            total_sales=Sum('sales_count'),
+            total_revenue=Coalesce(Sum('revenue'), Decimal('0')),
+            items_sold=Coalesce(Sum('items_qty'), Decimal('0')),
+            cancelled=Coalesce(Sum('sales_count', filter=Q(status='cancelled')), 0),
         )
     )
-    # Items vendidos por vendedor (uma query)
-    sale_ids = list(sales_qs.values_list('id', flat=True))
-    items_by_user = {}
-    if sale_ids:
-        from django.db.models import Sum as S
-        for row in SaleItem.objects.filter(sale_id__in=sale_ids).values('sale__created_by_id').annotate(s=S('quantity')):
-            uid = row['sale__created_by_id']
-            items_by_user[uid] = items_by_user.get(uid, 0) + row['s']
     result = []
     for row in by_user:
-        uid = row['created_by_id']
-        items = items_by_user.get(uid, 0)
+        uid = row['seller_id']
+        items = row['items_sold'] or 0
         rev = row['total_revenue'] or Decimal('0')
         count = row['total_sales'] or 0
         ticket = (rev / count) if count else Decimal('0')
         cancel_count = row.get('cancelled') or 0
         cancel_rate = (cancel_count / count * 100) if count else 0
-        name = row.get('created_by__username') or ''
-        if row.get('created_by__first_name') or row.get('created_by__last_name'):
-            name = f"{row.get('created_by__first_name') or ''} {row.get('created_by__last_name') or ''}".strip() or name
+        name = row.get('seller__username') or ''
+        if row.get('seller__first_name') or row.get('seller__last_name'):
+            name = f"{row.get('seller__first_name') or ''} {row.get('seller__last_name') or ''}".strip() or name
         result.append({
             'user_id': uid,
             'name': name,
-            'username': row.get('created_by__username'),
+            'username': row.get('seller__username'),
             'total_sales': count,
             'items_sold': items,
             'revenue': rev,
@@ -655,12 +664,13 @@ def services_sold(start=None, end=None):
 def top_clients(start=None, end=None, order='revenue', limit=20):
     end = _parse_date(end, timezone.now().date())
     start = _parse_date(start, end - timedelta(days=30))
-    sales_qs = _sales_queryset(start=start, end=end, status='paid', exclude_cancelled=True).filter(client__isnull=False)
     agg = list(
-        sales_qs.values('client_id', 'client__name')
+        _rollup_queryset(DailyClientSales, start, end, status='paid')
+        .filter(sales_count__gt=0)
+        .values('client_id', 'client__name')
         .annotate(
-            total_sales=Count('id'),
-            total_revenue=Coalesce(Sum('total'), Decimal('0')),
+            total_sales=Sum('sales_count'),
+            total_revenue=Coalesce(Sum('revenue'), Decimal('0')),
         )
         .order_by('-total_revenue' if order == 'revenue' else '-total_sales')[:limit]
     )
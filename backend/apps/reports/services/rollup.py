@@ -0,0 +1,249 @@
+"""
+Rollup diário de vendas (DailySalesFact, DailyProductSales, DailyClientSales).
+
+Vendas novas (PDV) são somadas de forma incremental quando a transação faz
+commit. Mudanças de status (cancelamento, quitação do crediário, pagamento)
+e edições de vendas existentes recalculam o dia afetado. rebuild_range()
+reconstrói qualquer período a partir de Sale/SaleItem (comando: python
+manage.py rebuild_sales_rollup); o Celery Beat reconstrói os últimos
+SALES_ROLLUP_REBUILD_DAYS dias toda madrugada, reparando falhas que
+_after_commit apenas registra no log.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from apps.sales.models import Sale, SaleItem
+from apps.reports.models import DailySalesFact, DailyProductSales, DailyClientSales
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+
+
+def sale_day(sale):
+    """Dia (fuso local) em que a venda entra no rollup."""
+    return timezone.localtime(sale.sale_date).date()
+
+
+def _contribution(sale):
+    """
+    Lê os itens da venda e devolve a contribuição dela para o rollup:
+    {'revenue', 'items_qty', 'profit', 'products': {product_id: {quantity, revenue, profit}}}.
+    O lucro usa o custo do produto no momento em que a venda entra no rollup.
+    """
+    items = SaleItem.objects.filter(sale_id=sale.pk).values_list(
+        'item_type', 'product_id', 'quantity', 'unit_price', 'total', 'product__cost_price',
+    )
+    items_qty = ZERO
+    profit = ZERO
+    products = {}
+    for item_type, product_id, quantity, unit_price, total, cost in items:
+        items_qty += quantity
+        if item_type != 'product' or not product_id:
+            continue
+        line_profit = (unit_price - (cost or ZERO)) * quantity
+        profit += line_profit
+        row = products.setdefault(product_id, {'quantity': ZERO, 'revenue': ZERO, 'profit': ZERO})
+        row['quantity'] += quantity
+        row['revenue'] += total
+        row['profit'] += line_profit
+    return {
+        'revenue': sale.total or ZERO,
+        'items_qty': items_qty,
+        'profit': profit.quantize(Decimal('0.01')),
+        'products': products,
+    }
+
+
+def _bump(model, key, deltas):
+    """Soma deltas (F + valor) à linha identificada por key; cria a linha se não existir."""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Outra transação criou a linha entre o UPDATE e o INSERT.
+        model.objects.filter(**key).update(**updates)
+
+
+def _apply(sale, status, sign, contribution):
+    base = {
+        'day': sale_day(sale),
+        'seller_id': sale.created_by_id,
+        'payment_method': sale.payment_method,
+        'status': status,
+    }
+    _bump(DailySalesFact, base, {
+        'sales_count': sign,
+        'revenue': sign * contribution['revenue'],
+        'items_qty': sign * contribution['items_qty'],
+        'profit': sign * contribution['profit'],
+    })
+    for product_id, row in contribution['products'].items():
+        _bump(DailyProductSales, {**base, 'product_id': product_id}, {
+            'quantity': sign * row['quantity'],
+            'revenue': sign * row['revenue'],
+            'profit': sign * row['profit'].quantize(Decimal('0.01')),
+        })
+    if sale.client_id:
+        _bump(DailyClientSales, {**base, 'client_id': sale.client_id}, {
+            'sales_count': sign,
+            'revenue': sign * contribution['revenue'],
+        })
+
+
+def _after_commit(func):
+    """Executa func após o commit; falhas no rollup não afetam a venda já gravada."""
+    def run():
+        try:
+            with transaction.atomic():
+                func()
+        except Exception:
+            logger.exception('Falha ao atualizar rollup diário de vendas')
+    transaction.on_commit(run)
+
+
+def record_sale(sale):
+    """Soma uma venda recém-criada ao rollup (no status atual)."""
+    def run():
+        _apply(sale, sale.status, 1, _contribution(sale))
+    _after_commit(run)
+
+
+def record_status_change(sale, old_status, new_status):
+    """
+    Venda mudou de status: recalcula o dia dela após o commit. Subtrair do
+    bucket antigo uma contribuição recalculada com o custo atual deixaria
+    lucro residual se o custo do produto mudou desde a venda; reconstruir o
+    dia dá sempre o mesmo resultado de rebuild_range.
+    """
+    if old_status == new_status:
+        return
+    refresh_sale_day(sale)
+
+
+def refresh_days(days):
+    """Recalcula após o commit cada dia informado (uma vez por dia)."""
+    days = sorted(set(days))
+
+    def run():
+        for day in days:
+            rebuild_range(day, day)
+    _after_commit(run)
+
+
+def refresh_sale_day(sale, previous_day=None):
+    """
+    Recalcula após o commit o dia inteiro da venda (edições de itens/valores).
+    previous_day: dia da venda antes da edição; se sale_date mudou, ele também
+    é recalculado para a venda sair do dia antigo.
+    """
+    refresh_days([sale_day(sale), previous_day or sale_day(sale)])
+
+
+def rebuild_recent(days):
+    """Reconstrói os últimos days dias (até hoje): repara atualizações que falharam após o commit."""
+    end = timezone.localdate()
+    return rebuild_range(end - timedelta(days=max(days, 1) - 1), end)
+
+
+def rebuild_range(start, end):
+    """
+    Reconstrói o rollup de start a end (inclusive) a partir de Sale/SaleItem.
+    Retorna o número de linhas de fato geradas.
+    """
+    profit_expr = ExpressionWrapper(
+        (F('unit_price') - Coalesce(F('product__cost_price'), ZERO)) * F('quantity'),
+        output_field=DecimalField(max_digits=16, decimal_places=4),
+    )
+    product_filter = Q(item_type='product', product__isnull=False)
+    sales = Sale.objects.filter(sale_date__date__gte=start, sale_date__date__lte=end)
+    items = SaleItem.objects.filter(sale__in=sales).annotate(day=TruncDate('sale__sale_date'))
+    sale_key = ('day', 'sale__created_by_id', 'sale__payment_method', 'sale__status')
+
+    with transaction.atomic():
+        for model in (DailySalesFact, DailyProductSales, DailyClientSales):
+            model.objects.filter(day__gte=start, day__lte=end).delete()
+
+        item_totals = {
+            tuple(r[k] for k in sale_key): r
+            for r in items.values(*sale_key).annotate(
+                qty=Sum('quantity'),
+                profit=Sum(profit_expr, filter=product_filter),
+            )
+        }
+        facts = []
+        for r in (
+            sales.annotate(day=TruncDate('sale_date'))
+            .values('day', 'created_by_id', 'payment_method', 'status')
+            .annotate(c=Count('id'), revenue=Sum('total'))
+        ):
+            extra = item_totals.get((r['day'], r['created_by_id'], r['payment_method'], r['status'])) or {}
+            facts.append(DailySalesFact(
+                day=r['day'],
+                seller_id=r['created_by_id'],
+                payment_method=r['payment_method'],
+                status=r['status'],
+                sales_count=r['c'],
+                revenue=r['revenue'] or ZERO,
+                items_qty=extra.get('qty') or ZERO,
+                profit=(extra.get('profit') or ZERO).quantize(Decimal('0.01')),
+            ))
+        DailySalesFact.objects.bulk_create(facts, batch_size=1000)
+
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                day=r['day'],
+                product_id=r['product_id'],
+                seller_id=r['sale__created_by_id'],
+                payment_method=r['sale__payment_method'],
+                status=r['sale__status'],
+                quantity=r['qty'] or ZERO,
+                revenue=r['revenue'] or ZERO,
+                profit=(r['profit'] or ZERO).quantize(Decimal('0.01')),
+            )
+            for r in items.filter(product_filter).values(*sale_key, 'product_id').annotate(
+                qty=Sum('quantity'),
+                revenue=Sum('total'),
+                profit=Sum(profit_expr),
+            )
+        ], batch_size=1000)
+
+        DailyClientSales.objects.bulk_create([
+            DailyClientSales(
+                day=r['day'],
+                client_id=r['client_id'],
+                seller_id=r['created_by_id'],
+                payment_method=r['payment_method'],
+                status=r['status'],
+                sales_count=r['c'],
+                revenue=r['revenue'] or ZERO,
+            )
+            for r in sales.filter(client__isnull=False).annotate(day=TruncDate('sale_date'))
+            .values('day', 'client_id', 'created_by_id', 'payment_method', 'status')
+            .annotate(c=Count('id'), revenue=Sum('total'))
+        ], batch_size=1000)
+    return len(facts)
+
+
+def rebuild_all(chunk_days=31):
+    """Reconstrói todo o histórico em blocos de chunk_days dias."""
+    first = Sale.objects.order_by('sale_date').values_list('sale_date', flat=True).first()
+    if not first:
+        return 0
+    start = timezone.localtime(first).date()
+    end = timezone.localdate()
+    total = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        total += rebuild_range(start, chunk_end)
+        start = chunk_end + timedelta(days=1)
+    return total
@@ -0,0 +1,27 @@
+"""
+Tasks Celery de relatórios.
+"""
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def snapshot_cash_flow():
+    """Grava o snapshot diário da projeção de caixa (agendada após a marcação de vencidos)."""
+    from apps.reports.services.cashflow import take_snapshot
+    snapshot = take_snapshot()
+    logger.info('Snapshot de fluxo de caixa gerado: %s', snapshot.day)
+    return snapshot.day.isoformat()
+
+
+@shared_task
+def rebuild_recent_sales_rollup(days=None):
+    """Reconstrói o rollup de vendas dos últimos dias (repara atualizações que falharam após o commit)."""
+    from django.conf import settings
+    from apps.reports.services.rollup import rebuild_recent
+    days = days or getattr(settings, 'SALES_ROLLUP_REBUILD_DAYS', 7)
+    rows = rebuild_recent(days)
+    logger.info('Rollup de vendas reconstruído (%s dias, %s linhas)', days, rows)
+    return rows
@@ -0,0 +1,260 @@
+"""
+Reports tests (rollup diário de vendas, fluxo de caixa).
+"""
+import gzip
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.products.models import Category, Product
+from apps.payables.models import BillPayable
+from apps.sales.models import CreditAccount, CreditInstallment, Sale, SaleItem
+from apps.users.models import User
+from .models import CashFlowSnapshot, DailySalesFact, DailyProductSales, DailyClientSales
+from .services import cashflow, rollup
+from .services.queries import (
+    dashboard_data, get_dashboard_summary, inactive_clients, sales_ranking, top_clients,
+)
+
+
+class RollupFixtureMixin:
+    """Produto, cliente e vendedor para montar vendas de teste."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='caixa', password='x')
+        self.client_obj = Client.objects.create(
+            name='Maria', document_type='cpf', document='12345678901', phone='11999999999',
+        )
+        category = Category.objects.create(name='Rações')
+        self.product = Product.objects.create(
+            name='Ração', category=category, cost_price=Decimal('6.00'),
+            sale_price=Decimal('10.00'), price_manually_set=True, stock_quantity=100,
+        )
+        self.today = timezone.localdate()
+
+    def _sale(self, qty=2, status='paid', payment_method='pix'):
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(
+                client=self.client_obj, payment_method=payment_method,
+                status=status, created_by=self.user,
+            )
+            SaleItem.objects.create(
+                sale=sale, item_type='product', product=self.product,
+                quantity=qty, unit_price=Decimal('10.00'),
+            )
+            sale.refresh_from_db()
+            rollup.record_sale(sale)
+        return sale
+
+
+class SalesRollupTest(RollupFixtureMixin, TestCase):
+    """Rollup incremental x reconstrução e leitura pelo dashboard."""
+
+    def test_record_sale_updates_facts(self):
+        self._sale(qty=2)
+        self._sale(qty=3)
+        fact = DailySalesFact.objects.get(day=self.today, status='paid')
+        self.assertEqual(fact.sales_count, 2)
+        self.assertEqual(fact.revenue, Decimal('50.00'))
+        self.assertEqual(fact.profit, Decimal('20.00'))
+        self.assertEqual(DailyProductSales.objects.get(status='paid').quantity, Decimal('5'))
+        self.assertEqual(DailyClientSales.objects.get(status='paid').sales_count, 2)
+
+    def test_status_change_moves_bucket(self):
+        sale = self._sale(qty=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.status = 'cancelled'
+            sale.save()
+            rollup.record_status_change(sale, 'paid', 'cancelled')
+        data = dashboard_data(self.today, self.today)
+        self.assertEqual(data['total_sales'], 0)
+        self.assertEqual(data['top_5_products'], [])
+        cancelled = dashboard_data(self.today, self.today, status='cancelled')
+        self.assertEqual(cancelled['total_sales'], 1)
+        self.assertEqual(cancelled['total_revenue'], Decimal('10.00'))
+
+    def test_status_change_after_cost_change_leaves_no_residue(self):
+        sale = self._sale(qty=2, status='credit_open')
+        self.product.cost_price = Decimal('8.00')  # ex.: confirmação de NF-e
+        self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.status = 'paid'
+            sale.save()
+            rollup.record_status_change(sale, 'credit_open', 'paid')
+        self.assertFalse(DailySalesFact.objects.filter(status='credit_open').exists())
+        self.assertFalse(DailyProductSales.objects.filter(status='credit_open').exists())
+        self.assertEqual(DailySalesFact.objects.get(status='paid').profit, Decimal('4.00'))
+
+    def test_rebuild_recent_task(self):
+        from apps.reports.tasks import rebuild_recent_sales_rollup
+        self._sale(qty=2)
+        DailySalesFact.objects.all().delete()
+        rebuild_recent_sales_rollup(days=2)
+        self.assertEqual(DailySalesFact.objects.get(day=self.today).sales_count, 1)
+
+    def test_rebuild_matches_incremental(self):
+        self._sale(qty=2)
+        self._sale(qty=1, payment_method='cash')
+        before = dashboard_data(self.today, self.today)
+        rollup.rebuild_range(self.today, self.today)
+        after = dashboard_data(self.today, self.today)
+        for key in ('total_sales', 'total_revenue', 'total_items_sold', 'estimated_profit'):
+            self.assertEqual(before[key], after[key])
+        self.assertEqual(after['total_revenue'], Decimal('30.00'))
+        self.assertEqual(len(after['sales_by_payment_method']), 2)
+
+    def test_refresh_moves_sale_out_of_previous_day(self):
+        sale = self._sale(qty=2)
+        yesterday = self.today - timedelta(days=1)
+        Sale.objects.filter(pk=sale.pk).update(sale_date=sale.sale_date - timedelta(days=1))
+        sale.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            rollup.refresh_sale_day(sale, previous_day=self.today)
+        self.assertFalse(DailySalesFact.objects.filter(day=self.today).exists())
+        self.assertEqual(DailySalesFact.objects.get(day=yesterday, status='paid').sales_count, 1)
+
+    def test_rankings_read_rollup(self):
+        self._sale(qty=4)
+        ranking = sales_ranking(self.today, self.today)
+        self.assertEqual(ranking[0]['user_id'], self.user.id)
+        self.assertEqual(ranking[0]['items_sold'], Decimal('4'))
+        clients = top_clients(self.today, self.today)
+        self.assertEqual(clients[0]['client_id'], self.client_obj.id)
+        self.assertEqual(clients[0]['total_revenue'], Decimal('40.00'))
+
+
+class DashboardSummaryTest(RollupFixtureMixin, TestCase):
+    """get_dashboard_summary lê KPIs do rollup e expõe tempos por seção."""
+
+    def test_summary_kpis_and_timings(self):
+        self._sale(qty=3)
+        self._sale(qty=1, status='credit_open', payment_method='crediario')
+        data = get_dashboard_summary(self.today.isoformat())
+        self.assertEqual(data['kpis']['sales_today'], 40.0)
+        self.assertEqual(data['kpis']['sales_month'], 40.0)
+        self.assertEqual(data['charts']['sales_last_7_days'][-1], {'date': self.today.isoformat(), 'value': 40.0})
+        self.assertEqual(data['charts']['top_products'][0]['product_id'], self.product.id)
+        self.assertEqual(data['customers']['top_clients_month'][0]['visits'], 2)
+        for section in ('sales', 'schedule', 'credit', 'low_stock', 'top_clients',
+                        'inactive_clients', 'top_products', 'total'):
+            self.assertIn(section, data['timings_ms'])
+
+
+class InactiveClientsTest(RollupFixtureMixin, TestCase):
+    """inactive_clients: última atividade calculada no banco."""
+
+    def _client(self, name, document):
+        return Client.objects.create(name=name, document_type='cpf', document=document, phone='11988888888')
+
+    def test_inactive_clients_ordering_and_limit(self):
+        old = self._client('Antigo', '11144477735')
+        older = self._client('Mais antigo', '52998224725')
+        self._client('Sem histórico', '39053344705')
+        for client, days_ago in ((old, 70), (older, 120), (self.client_obj, 5)):
+            sale = Sale.objects.create(client=client, payment_method='cash', status='paid', created_by=self.user)
+            Sale.objects.filter(pk=sale.pk).update(sale_date=timezone.now() - timedelta(days=days_ago))
+
+        rows = inactive_clients(days=60, today=self.today)
+        self.assertEqual([r['client_id'] for r in rows], [older.id, old.id])
+        self.assertEqual(rows[0]['days_inactive'], 120)
+        self.assertEqual(len(inactive_clients(days=60, limit=1, today=self.today)), 1)
+
+
+class CsvExportTest(RollupFixtureMixin, TestCase):
+    """Exportações CSV em streaming, sem limite de linhas, com gzip opcional."""
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def _get(self, path, **params):
+        params.setdefault('start', self.today.isoformat())
+        params.setdefault('end', self.today.isoformat())
+        response = self.api.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_sales_export_streams_all_rows(self):
+        Sale.objects.create(is_walk_in=True, payment_method='cash', status='paid', created_by=self.user)
+        self._sale(qty=2)
+        response, body = self._get('/api/reports/sales/export.csv')
+        lines = body.decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'ID,Data,Vendedor,Cliente,Total,Forma Pagamento,Status')
+        self.assertEqual(len(lines), 3)
+        self.assertIn(',caixa,Maria,20.00,', lines[1])
+        self.assertIn(',caixa,Avulsa,', lines[2])
+
+    def test_products_sold_export_gzip(self):
+        self._sale(qty=3)
+        response, body = self._get('/api/reports/products-sold/export.csv', gzip='true')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(body).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.product.id},Ração,Rações,3'))
+
+
+class CashFlowTest(RollupFixtureMixin, TestCase):
+    """Aging do crediário/contas a pagar e curva semanal de caixa."""
+
+    def setUp(self):
+        super().setUp()
+        sale = Sale.objects.create(
+            client=self.client_obj, payment_method='crediario', status='paid', created_by=self.user,
+        )
+        self.account = CreditAccount.objects.create(
+            sale=sale, client=self.client_obj, total_amount=Decimal('600'), financed_amount=Decimal('600'),
+            installments_count=6, created_by=self.user,
+        )
+        # atrasos de 100, 45 e 5 dias; vencimentos hoje, em 7 dias e uma parcela paga
+        for n, (days, status) in enumerate(
+            [(-100, 'overdue'), (-45, 'pending'), (-5, 'pending'), (0, 'pending'), (7, 'pending'), (14, 'paid')], 1,
+        ):
+            CreditInstallment.objects.create(
+                credit_account=self.account, number=n, due_date=self.today + timedelta(days=days),
+                amount=Decimal('100'), status=status,
+            )
+        BillPayable.objects.create(description='Aluguel', amount=Decimal('250'), due_date=self.today + timedelta(days=7))
+        BillPayable.objects.create(description='Luz', amount=Decimal('80'), due_date=self.today - timedelta(days=70))
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_aging_buckets_and_weekly_curve(self):
+        with self.assertNumQueries(2):
+            data = cashflow.cash_flow(self.today, weeks=4)
+        buckets = data['receivables']['buckets']
+        self.assertEqual(data['receivables']['open_total'], 500.0)
+        self.assertEqual({k: v['total'] for k, v in buckets.items()},
+                         {'current': 200.0, '0-30': 100.0, '31-60': 100.0, '61-90': 0.0, '90+': 100.0})
+        self.assertEqual(data['payables']['buckets']['61-90'], {'total': 80.0, 'count': 1})
+        self.assertEqual(data['overdue'], {'inflow': 300.0, 'outflow': 80.0})
+
+        self.assertEqual(len(data['curve']), 4)
+        first, second = data['curve'][0], data['curve'][1]
+        monday = self.today - timedelta(days=self.today.weekday())
+        self.assertEqual(first['week_start'], monday.isoformat())
+        self.assertEqual((first['inflow'], first['outflow']), (100.0, 0.0))
+        self.assertEqual((second['inflow'], second['outflow'], second['net'], second['cumulative']),
+                         (100.0, 250.0, -150.0, -50.0))
+        self.assertEqual(data['totals'], {'inflow': 200.0, 'outflow': 250.0, 'net': -50.0})
+
+    def test_endpoints_and_snapshot(self):
+        response = self.api.get('/api/reports/cash-flow/', {'weeks': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['curve']), 2)
+        self.assertEqual(self.api.get('/api/reports/cash-flow/', {'source': 'snapshot'}).status_code, 404)
+
+        cashflow.take_snapshot(self.today)
+        cashflow.take_snapshot(self.today)
+        self.assertEqual(CashFlowSnapshot.objects.count(), 1)
+        snapshot = self.api.get('/api/reports/cash-flow/', {'source': 'snapshot'}).json()
+        self.assertEqual(snapshot['receivables']['open_total'], 500.0)
+
+        forecast = self.api.get('/api/credits/forecast/').json()
+        self.assertEqual(forecast['forecast_total'], 500.0)
+        self.assertEqual(forecast['aging']['buckets']['90+']['count'], 1)
@@ -13,6 +13,8 @@ from .views import (
     ABCProductsReportView,
     ServicesSoldReportView,
     TopClientsReportView,
+    InactiveClientsReportView,
+    CashFlowReportView,
     SalesHeatmapReportView,
     ProfitByProductReportView,
     SalesExportCSVView,
@@ -32,6 +34,8 @@ urlpatterns = [
     path('abc-products/', ABCProductsReportView.as_view(), name='reports-abc-products'),
     path('services-sold/', ServicesSoldReportView.as_view(), name='reports-services-sold'),
     path('top-clients/', TopClientsReportView.as_view(), name='reports-top-clients'),
+    path('inactive-clients/', InactiveClientsReportView.as_view(), name='reports-inactive-clients'),
+    path('cash-flow/', CashFlowReportView.as_view(), name='reports-cash-flow'),
     path('sales-heatmap/', SalesHeatmapReportView.as_view(), name='reports-sales-heatmap'),
     path('profit-by-product/', ProfitByProductReportView.as_view(), name='reports-profit-by-product'),
 ]
@@ -2,10 +2,8 @@
 Reports views — read-only endpoints. All date filters use start/end (YYYY-MM-DD).
 Default status: paid; use status= to include cancelled or other.
 """
-import csv
-from io import StringIO
 from datetime import date, timedelta
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import action
@@ -27,7 +25,18 @@ from apps.reports.services.queries import (
     sales_heatmap,
     profit_by_product,
     get_sellers,
+    inactive_clients_queryset,
+    format_inactive_clients,
 )
+from apps.reports.services.exports import (
+    PRODUCTS_SOLD_HEADER,
+    SALES_HEADER,
+    csv_stream,
+    gzip_stream,
+    products_sold_rows,
+    sales_rows,
+)
+from apps.reports.services.cashflow import DEFAULT_WEEKS, cash_flow, latest_snapshot
 from apps.reports.serializers import ReportSaleListSerializer
 
 
@@ -170,6 +179,49 @@ class SalesRankingReportView(APIView):
         return Response({'results': data, 'period': {'start': start.isoformat(), 'end': end.isoformat()}})
 
 
+# ---------- Inactive clients ----------
+class InactiveClientsReportView(APIView):
+    """
+    Clientes sem venda nem agendamento há `days` dias (padrão 60), paginado.
+    GET /api/reports/inactive-clients/?days=60&page=1&page_size=20
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = ReportPagination
+
+    def get(self, request):
+        try:
+            days = max(int(request.query_params.get('days') or 60), 1)
+        except ValueError:
+            days = 60
+        today = timezone.now().date()
+        qs = inactive_clients_queryset(days=days, today=today)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(qs, request)
+        return paginator.get_paginated_response(format_inactive_clients(page, today=today))
+
+
+# ---------- Cash flow ----------
+class CashFlowReportView(APIView):
+    """
+    Aging do crediário e das contas a pagar + projeção semanal de caixa (entradas x saídas).
+    GET /api/reports/cash-flow/?weeks=12
+    GET /api/reports/cash-flow/?source=snapshot  (último snapshot diário, sem recalcular)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.query_params.get('source') == 'snapshot':
+            snapshot = latest_snapshot()
+            if snapshot is None:
+                return Response({'detail': 'Nenhum snapshot gerado ainda.'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({**snapshot.data, 'snapshot_at': snapshot.created_at.isoformat()})
+        try:
+            weeks = int(request.query_params.get('weeks') or DEFAULT_WEEKS)
+        except ValueError:
+            weeks = DEFAULT_WEEKS
+        return Response(cash_flow(weeks=weeks))
+
+
 # ---------- Low stock ----------
 class LowStockReportView(APIView):
     permission_classes = [IsAuthenticated]
@@ -260,6 +312,22 @@ def _serialize_decimals(obj):
 
 
 # ---------- CSV Exports ----------
+def _csv_response(request, header, rows, filename):
+    """
+    CSV em streaming, sem limite de linhas. Com ?gzip=true o corpo vai
+    comprimido (Content-Encoding: gzip).
+    """
+    chunks = csv_stream(header, rows)
+    use_gzip = request.query_params.get('gzip', 'false').lower() == 'true'
+    if use_gzip:
+        chunks = gzip_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8')
+    if use_gzip:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 class SalesExportCSVView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -274,26 +342,8 @@ class SalesExportCSVView(APIView):
             user_id=user_id, client_id=client_id,
             status=status_filter,
             exclude_cancelled=exclude_cancelled,
-        )[:5000]
-        buffer = StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow([
-            'ID', 'Data', 'Vendedor', 'Cliente', 'Total', 'Forma Pagamento', 'Status'
-        ])
-        for s in qs:
-            client_name = s.client.name if s.client else ('Avulsa' if s.is_walk_in else '-')
-            writer.writerow([
-                s.id,
-                s.sale_date.strftime('%Y-%m-%d %H:%M') if s.sale_date else '',
-                s.created_by.username if s.created_by else '',
-                client_name,
-                str(s.total),
-                s.get_payment_method_display(),
-                s.get_status_display(),
-            ])
-        response = HttpResponse(buffer.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="vendas_{start}_{end}.csv"'
-        return response
+        )
+        return _csv_response(request, SALES_HEADER, sales_rows(qs), f'vendas_{start}_{end}.csv')
 
 
 class ProductsSoldExportCSVView(APIView):
@@ -303,23 +353,5 @@ class ProductsSoldExportCSVView(APIView):
         start, end = _parse_params(request)
         category_id = request.query_params.get('category_id') or None
         order = request.query_params.get('order') or 'revenue'
-        data = products_sold(start=start, end=end, category_id=category_id, order=order, limit=1000)
-        buffer = StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow([
-            'ID Produto', 'Nome', 'Categoria', 'Qtd Vendida', 'Receita', 'Preço Médio', 'Lucro Est.', 'Participação %'
-        ])
-        for r in data:
-            writer.writerow([
-                r.get('product_id'),
-                r.get('name'),
-                r.get('category_name'),
-                r.get('quantity_total'),
-                r.get('revenue_total'),
-                r.get('avg_price'),
-                r.get('estimated_profit'),
-                r.get('share_percent'),
-            ])
-        response = HttpResponse(buffer.getvalue(), content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="produtos_vendidos_{start}_{end}.csv"'
-        return response
+        rows = products_sold_rows(start=start, end=end, category_id=category_id, order=order)
+        return _csv_response(request, PRODUCTS_SOLD_HEADER, rows, f'produtos_vendidos_{start}_{end}.csv')
@@ -0,0 +1,64 @@
+"""
+Benchmark do lançamento de venda PDV: latência por venda x tamanho do carrinho.
+Roda dentro de uma transação desfeita ao final (não deixa dados no banco).
+
+    python manage.py bench_pdv --sizes 1,5,10,20,40 --runs 20
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.products.models import Category, Product
+from apps.sales.services.pdv import create_pdv_sale
+from apps.users.models import User
+from core.bench import percentile, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Mede a latência de create_pdv_sale por tamanho de carrinho (dados descartados ao final).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,20,40', help='Tamanhos de carrinho separados por vírgula.')
+        parser.add_argument('--runs', type=int, default=20, help='Vendas por tamanho de carrinho.')
+
+    def handle(self, *args, **options):
+        sizes = [int(x) for x in options['sizes'].split(',') if x.strip()]
+        runs = max(options['runs'], 1)
+        with rolled_back():
+            self._run(sizes, runs)
+
+    def _run(self, sizes, runs):
+        user = User.objects.create_user(username='__bench_pdv__', password=None)
+        category = Category.objects.create(name='__bench_pdv__')
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Bench {i}', category=category, cost_price=Decimal('5.00'),
+                sale_price=Decimal('9.90'), price_manually_set=True,
+                stock_quantity=10 ** 9, min_stock=0,
+            )
+            for i in range(max(sizes))
+        ])
+        self.stdout.write(f'{"itens":>6} {"média ms":>10} {"p95 ms":>10} {"queries":>8}')
+        for size in sizes:
+            data = {
+                'is_walk_in': True,
+                'items': [
+                    {'product_id': p.pk, 'quantity': Decimal('1'), 'unit_price': Decimal('9.90'),
+                     'discount': Decimal('0'), 'sold_by_kg': False}
+                    for p in products[:size]
+                ],
+                'discount': Decimal('0'),
+            }
+            timings, queries = [], 0
+            for _ in range(runs):
+                with CaptureQueriesContext(connection) as ctx:
+                    t0 = time.perf_counter()
+                    create_pdv_sale(data, user, payment_method='cash')
+                    timings.append((time.perf_counter() - t0) * 1000)
+                queries = len(ctx.captured_queries)
+            p95 = percentile(timings, 0.95)
+            self.stdout.write(f'{size:>6} {statistics.mean(timings):>10.2f} {p95:>10.2f} {queries:>8}')
@@ -0,0 +1,17 @@
+# Index for per-client "last activity" lookups (reports: inactive clients)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0013_add_cash_received'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['client', 'sale_date'], name='sales_sale_client_date_idx'),
+        ),
+    ]
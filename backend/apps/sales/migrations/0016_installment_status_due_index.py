@@ -0,0 +1,17 @@
+# Migration: índice (status, due_date) das parcelas para aging e projeção de caixa
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0015_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditinstallment',
+            index=models.Index(fields=['status', 'due_date', 'amount'], name='sales_inst_status_due_idx'),
+        ),
+    ]
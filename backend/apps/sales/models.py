@@ -2,6 +2,7 @@
 Sales and Billing models
 """
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -116,6 +117,7 @@ class Sale(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['payment_method']),
             models.Index(fields=['created_by']),
+            models.Index(fields=['client', 'sale_date'], name='sales_sale_client_date_idx'),
         ]
 
     def __str__(self):
@@ -400,14 +402,21 @@ class CreditAccount(models.Model):
     def __str__(self):
         return f"Crediário #{self.id} - {self.client.name} - R$ {self.financed_amount}"
 
+    # next_due_date/pending_count/overdue_count usam as anotações de
+    # services.credit.with_installment_summary quando presentes (listagens).
+
     @property
     def next_due_date(self):
         """Próxima data de vencimento (parcela pendente mais antiga)"""
+        if hasattr(self, 'next_due'):
+            return self.next_due
         inst = self.installments.filter(status__in=['pending', 'overdue']).order_by('due_date').first()
         return inst.due_date if inst else None
 
     @property
     def pending_count(self):
+        if hasattr(self, 'open_installments'):
+            return self.open_installments
         return self.installments.filter(status__in=['pending', 'overdue']).count()
 
     @property
@@ -416,7 +425,14 @@ class CreditAccount(models.Model):
 
     @property
     def overdue_count(self):
-        return self.installments.filter(status='overdue').count()
+        """Parcelas vencidas, inclusive pendentes com vencimento passado ainda não marcadas."""
+        if hasattr(self, 'overdue_installments'):
+            return self.overdue_installments
+        from django.utils import timezone
+        today = timezone.localdate()
+        return self.installments.filter(
+            models.Q(status='overdue') | models.Q(status='pending', due_date__lt=today)
+        ).count()
 
 
 class CreditInstallment(models.Model):
@@ -488,7 +504,49 @@ class CreditInstallment(models.Model):
         unique_together = [('credit_account', 'number')]
         indexes = [
             models.Index(fields=['due_date', 'status']),
+            models.Index(fields=['status', 'due_date', 'amount'], name='sales_inst_status_due_idx'),
         ]
 
     def __str__(self):
         return f"Parcela {self.number}/{self.credit_account.installments_count} - R$ {self.amount}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Idempotency-Key do PDV: guarda a resposta da venda para que reenvios
+    (Wi-Fi instável, retry do front) recebam a mesma resposta em vez de
+    gerar uma venda duplicada. Expira após PDV_IDEMPOTENCY_TTL_SECONDS.
+    """
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Usuário'
+    )
+    key = models.CharField(max_length=255, verbose_name='Chave')
+    request_hash = models.CharField(max_length=64, verbose_name='Hash da requisição')
+    sale = models.ForeignKey(
+        Sale,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Venda'
+    )
+    response_status = models.PositiveSmallIntegerField(default=0, verbose_name='Status HTTP')
+    response_body = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Resposta')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    expires_at = models.DateTimeField(verbose_name='Expira em')
+
+    class Meta:
+        verbose_name = 'Chave de idempotência'
+        verbose_name_plural = 'Chaves de idempotência'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='sales_idempotency_user_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='sales_idem_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> Venda #{self.sale_id}"
@@ -243,8 +243,9 @@ class PdvSaleCreateSerializer(serializers.Serializer):
 # --- Crediário serializers ---
 
 class CreditInstallmentSerializer(serializers.ModelSerializer):
-    """Serializer for CreditInstallment"""
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    """Serializer for CreditInstallment (status efetivo: pendente vencida sai como overdue)"""
+    status = serializers.SerializerMethodField()
+    status_display = serializers.SerializerMethodField()
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
     paid_by_name = serializers.CharField(source='paid_by.username', read_only=True)
 
@@ -257,6 +258,13 @@ class CreditInstallmentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'number', 'due_date', 'amount', 'created_at']
 
+    def get_status(self, obj):
+        # current_status: anotado no prefetch de CreditAccountViewSet
+        return getattr(obj, 'current_status', obj.status)
+
+    def get_status_display(self, obj):
+        return dict(CreditInstallment.STATUS_CHOICES).get(self.get_status(obj), obj.status)
+
 
 class CreditAccountSerializer(serializers.ModelSerializer):
     """Serializer for CreditAccount list/detail"""
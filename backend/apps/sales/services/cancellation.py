@@ -0,0 +1,105 @@
+"""
+Cancelamento de vendas concluídas (uma ou várias, ex.: estorno em lote no fechamento do caixa).
+
+Número fixo de queries independente de vendas e itens, tudo numa transação:
+- vendas e produtos travados com select_for_update (em ordem de id);
+- estoque devolvido com um UPDATE com F() para todos os produtos (bulk_adjust_stock);
+- movimentações de estorno gravadas com bulk_create;
+- parcelas em aberto, crediários e vendas cancelados com um UPDATE cada.
+O rollup diário é recalculado após o commit, uma vez por dia das vendas.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from apps.reports.services import rollup
+
+from ..models import CreditAccount, CreditInstallment, Sale, SaleItem
+from .pdv import bulk_adjust_stock, stock_delta
+
+CANCELLABLE_STATUSES = ('paid', 'credit_open')
+MAX_BULK_SALES = 500
+
+
+class SaleCancelError(ValueError):
+    """Cancelamento rejeitado (mensagem para o campo error da resposta); nada é gravado."""
+
+
+def _reject(sales_by_id, sale_ids):
+    missing = [pk for pk in sale_ids if pk not in sales_by_id]
+    if missing:
+        raise SaleCancelError(f'Venda(s) não encontrada(s): {", ".join(map(str, missing))}.')
+    single = len(sale_ids) == 1
+    for pk in sale_ids:
+        sale = sales_by_id[pk]
+        if sale.status in CANCELLABLE_STATUSES:
+            continue
+        prefix = '' if single else f'Venda #{pk}: '
+        if sale.status == 'cancelled':
+            raise SaleCancelError(f'{prefix}Esta venda já está cancelada.')
+        raise SaleCancelError(f'{prefix}Somente vendas concluídas (pagas ou no crediário) podem ser canceladas.')
+
+
+def cancel_sales(sale_ids, user, reason=''):
+    """
+    Cancela as vendas (pagas ou no crediário) e devolve o estoque dos produtos.
+    Retorna as Sale canceladas (em ordem de id) ou levanta SaleCancelError.
+    """
+    from apps.products.models import Product, StockMovement
+
+    sale_ids = sorted({int(pk) for pk in sale_ids})
+    if not sale_ids:
+        raise SaleCancelError('Informe ao menos uma venda.')
+    if len(sale_ids) > MAX_BULK_SALES:
+        raise SaleCancelError(f'No máximo {MAX_BULK_SALES} vendas por cancelamento em lote.')
+    reason = (reason or '').strip()
+    observation_suffix = f': {reason[:200]}' if reason else ''
+
+    with transaction.atomic():
+        sales = list(Sale.objects.select_for_update().filter(pk__in=sale_ids).order_by('pk'))
+        sales_by_id = {sale.pk: sale for sale in sales}
+        _reject(sales_by_id, sale_ids)
+
+        items = list(
+            SaleItem.objects.filter(sale_id__in=sale_ids, item_type='product', product__isnull=False)
+            .order_by('sale_id', 'pk')
+            .values_list('sale_id', 'product_id', 'quantity', 'sold_by_kg')
+        )
+        product_ids = sorted({product_id for _s, product_id, _q, _k in items})
+        products = Product.objects.select_for_update().order_by('pk').in_bulk(product_ids)
+
+        running = {pk: p.stock_quantity for pk, p in products.items()}
+        movements = []
+        for sale_id, product_id, quantity, sold_by_kg in items:
+            product = products[product_id]
+            delta = stock_delta(product, quantity, sold_by_kg)
+            previous = running[product_id]
+            running[product_id] = previous + delta
+            movements.append(StockMovement(
+                product=product,
+                movement_type='entry',
+                quantity=delta,
+                previous_stock=previous,
+                new_stock=previous + delta,
+                reference=f'Venda #{sale_id}',
+                observation=f'Estorno por cancelamento da venda #{sale_id}{observation_suffix}',
+                created_by=user,
+            ))
+
+        bulk_adjust_stock({
+            pk: running[pk] - p.stock_quantity for pk, p in products.items() if running[pk] != p.stock_quantity
+        })
+        StockMovement.objects.bulk_create(movements)
+
+        CreditInstallment.objects.filter(
+            credit_account__sale_id__in=sale_ids, status__in=['pending', 'overdue'],
+        ).update(status='cancelled')
+        CreditAccount.objects.filter(sale_id__in=sale_ids).update(status='cancelled')
+        Sale.objects.filter(pk__in=sale_ids).update(
+            status='cancelled', cancellation_reason=reason, updated_at=timezone.now(),
+        )
+
+        for sale in sales:
+            sale.status = 'cancelled'
+            sale.cancellation_reason = reason
+        rollup.refresh_days(rollup.sale_day(sale) for sale in sales)
+    return sales
@@ -6,8 +6,11 @@ from datetime import date
 from decimal import Decimal
 
 from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Min, Q, Value, When
 from django.utils import timezone
 
+from apps.reports.services import rollup
+
 from ..models import CreditAccount, CreditInstallment
 
 
@@ -61,15 +64,50 @@ def generate_installments(total, down_payment, n, first_due_date):
     return installments
 
 
+OPEN_STATUSES = ('pending', 'overdue')
+
+
+def installment_current_status(today=None):
+    """
+    Status efetivo calculado no SQL: parcela pendente com vencimento passado
+    aparece como 'overdue' sem gravar nada (leituras nunca fazem UPDATE).
+    """
+    today = today or timezone.localdate()
+    return Case(
+        When(status='pending', due_date__lt=today, then=Value('overdue')),
+        default=F('status'),
+        output_field=CharField(),
+    )
+
+
+def overdue_installments_q(today=None, prefix=''):
+    """Q das parcelas vencidas (já marcadas ou pendentes com data passada)."""
+    today = today or timezone.localdate()
+    return Q(**{f'{prefix}status': 'overdue'}) | Q(**{f'{prefix}status': 'pending', f'{prefix}due_date__lt': today})
+
+
+def with_installment_summary(accounts, today=None):
+    """
+    Anota open_installments, overdue_installments e next_due em CreditAccount
+    (lidos por pending_count/overdue_count/next_due_date) numa única query.
+    """
+    today = today or timezone.localdate()
+    open_q = Q(installments__status__in=OPEN_STATUSES)
+    return accounts.annotate(
+        open_installments=Count('installments', filter=open_q),
+        overdue_installments=Count('installments', filter=overdue_installments_q(today, 'installments__')),
+        next_due=Min('installments__due_date', filter=open_q),
+    )
+
+
 def mark_overdue_installments():
     """
-    Mark pending installments as overdue when due_date < today.
-    Call via cron/celery beat periodically.
+    Grava status='overdue' nas parcelas pendentes vencidas (due_date < hoje, fuso local).
+    Executada pelo Celery Beat à meia-noite; as leituras usam installment_current_status.
     """
-    today = date.today()
-    CreditInstallment.objects.filter(
+    return CreditInstallment.objects.filter(
         status='pending',
-        due_date__lt=today
+        due_date__lt=timezone.localdate(),
     ).update(status='overdue')
 
 
@@ -120,7 +158,10 @@ def pay_installment(installment_id, amount, user, payment_method=None):
             account.status = 'settled'
             account.save(update_fields=['status'])
             # Also update sale status
-            account.sale.status = 'paid'
-            account.sale.save(update_fields=['status'])
+            sale = account.sale
+            old_status = sale.status
+            sale.status = 'paid'
+            sale.save(update_fields=['status'])
+            rollup.record_status_change(sale, old_status, 'paid')
 
         return inst, account
@@ -0,0 +1,111 @@
+"""
+Idempotency-Key do PDV (POST /api/sales/sales/pdv/).
+
+- lookup(): resposta já gravada para (usuário, chave) -> replay, sem abrir transação.
+- claim(): reserva a chave dentro da transação da venda. Se outra requisição com a
+  mesma chave está em andamento, o INSERT fica bloqueado no índice único até ela
+  terminar: após o commit, a segunda recebe a resposta gravada; se a primeira
+  falhou (rollback), a segunda segue e processa a venda normalmente.
+- store(): grava a resposta (e no cache do Django após o commit, se habilitado).
+
+Apenas respostas de sucesso são gravadas; erros de validação liberam a chave
+para que o cliente corrija e reenvie.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """A chave já foi usada com outro conteúdo de requisição."""
+
+
+def _ttl():
+    return getattr(settings, 'PDV_IDEMPOTENCY_TTL_SECONDS', 24 * 60 * 60)
+
+
+def _use_cache():
+    return getattr(settings, 'PDV_IDEMPOTENCY_USE_CACHE', True)
+
+
+def _cache_key(user_id, key):
+    return f'pdv-idem:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def request_fingerprint(payload):
+    """Hash estável do corpo da requisição (mesma chave + outro corpo = conflito)."""
+    raw = json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _check(request_hash, fingerprint):
+    if request_hash != fingerprint:
+        raise IdempotencyConflict('Idempotency-Key já utilizada com outro conteúdo de venda.')
+
+
+def lookup(user, key, fingerprint):
+    """Retorna (status, body) gravados para a chave ou None."""
+    if _use_cache():
+        cached = cache.get(_cache_key(user.pk, key))
+        if cached:
+            _check(cached['request_hash'], fingerprint)
+            return cached['status'], cached['body']
+    row = IdempotencyKey.objects.filter(
+        user=user, key=key, expires_at__gt=timezone.now(),
+    ).values('request_hash', 'response_status', 'response_body').first()
+    if not row:
+        return None
+    _check(row['request_hash'], fingerprint)
+    return row['response_status'], row['response_body']
+
+
+def claim(user, key, fingerprint):
+    """
+    Reserva a chave; deve ser chamado dentro da transação da venda.
+    Retorna (record, None) quando esta requisição deve processar a venda,
+    ou (None, (status, body)) quando outra já a processou.
+    """
+    now = timezone.now()
+    IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_hash=fingerprint,
+                expires_at=now + timedelta(seconds=_ttl()),
+            )
+        return record, None
+    except IntegrityError:
+        row = IdempotencyKey.objects.get(user=user, key=key)
+        _check(row.request_hash, fingerprint)
+        return None, (row.response_status, row.response_body)
+
+
+def store(record, status_code, body, sale=None):
+    """Grava a resposta na linha reservada por claim()."""
+    body = json.loads(json.dumps(body, cls=DjangoJSONEncoder))
+    record.response_status = status_code
+    record.response_body = body
+    record.sale = sale
+    record.save(update_fields=['response_status', 'response_body', 'sale'])
+    if _use_cache():
+        payload = {'request_hash': record.request_hash, 'status': status_code, 'body': body}
+        ttl = max(int((record.expires_at - timezone.now()).total_seconds()), 1)
+        transaction.on_commit(lambda: cache.set(_cache_key(record.user_id, record.key), payload, ttl))
+
+
+def purge_expired():
+    """Remove chaves expiradas. Retorna quantas foram apagadas."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
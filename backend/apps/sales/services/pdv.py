@@ -0,0 +1,206 @@
+"""
+PDV - lançamento de venda em lote.
+
+Todos os produtos do carrinho são travados de uma vez (select_for_update em
+ordem de id, evitando deadlock entre caixas), o estoque é baixado com um
+único UPDATE com F() e itens, movimentações, pagamentos e parcelas são
+gravados com bulk_create. O número de round-trips não cresce com o tamanho
+do carrinho.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from apps.products.services import code_cache
+from apps.reports.services import rollup
+
+from ..models import Sale, SaleItem, SalePayment, CreditAccount, CreditInstallment
+from .credit import generate_installments
+
+CENTS = Decimal('0.01')
+
+
+class PdvSaleError(ValueError):
+    """Erro de validação do PDV; field indica a chave da resposta (items, payments, down_payment)."""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+def stock_delta(product, quantity, sold_by_kg=False):
+    """
+    Quantidade a movimentar no estoque para quantity do produto:
+    KG vendido por kg -> gramas; PKG -> pacotes * unidades por pacote; demais -> unidades.
+    """
+    if product.unit == 'KG' and sold_by_kg:
+        return int(round(float(quantity) * 1000))
+    qty_int = int(quantity) if quantity == int(quantity) else int(round(float(quantity)))
+    if product.unit == 'PKG' and product.units_per_package:
+        return qty_int * product.units_per_package
+    return qty_int
+
+
+def _insufficient_stock_message(product, available, sold_by_kg):
+    if product.unit == 'KG' and sold_by_kg:
+        return f'Estoque insuficiente para {product.name}. Disponível: {available / 1000:.3f} kg'
+    if product.unit == 'PKG' and product.units_per_package:
+        return f'Estoque insuficiente para {product.name}. Disponível: {available // product.units_per_package} pacote(s)'
+    return f'Estoque insuficiente para {product.name}. Disponível: {available}'
+
+
+def line_total(unit_price, quantity, discount):
+    """Total do item (mesma regra de SaleItem.calculate_total), em centavos."""
+    return ((unit_price * Decimal(str(quantity))) - (discount or 0)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def bulk_adjust_stock(deltas):
+    """
+    Soma deltas {product_id: delta} ao estoque em um único UPDATE
+    (delta negativo = baixa). Os produtos devem estar travados pelo chamador.
+    """
+    if not deltas:
+        return
+    from apps.products.models import Product
+    Product.objects.filter(pk__in=list(deltas)).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+    # UPDATE com F() não dispara signals: invalida o cache de código do PDV aqui
+    code_cache.invalidate(deltas)
+
+
+def create_pdv_sale(data, user, client=None, cpf='', payment_method='cash'):
+    """
+    Cria e finaliza uma venda PDV a partir de PdvSaleCreateSerializer.validated_data.
+
+    Retorna a Sale criada ou levanta PdvSaleError (a transação é desfeita por inteiro).
+    """
+    from apps.products.models import Product, StockMovement
+
+    items_data = data['items']
+    payments_data = data.get('payments') or []
+    is_walk_in = data.get('is_walk_in', True)
+    sale_discount = data.get('discount') or 0
+
+    subtotal = sum((line_total(i['unit_price'], i['quantity'], i.get('discount')) for i in items_data), Decimal('0'))
+    total = subtotal - sale_discount
+
+    down_payment = data.get('down_payment') or 0
+    installments_count = data.get('installments_count', 6)
+
+    with transaction.atomic():
+        product_ids = sorted({i['product_id'] for i in items_data})
+        products = {
+            p.pk: p for p in Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+        }
+
+        # Validação na ordem do carrinho, com saldo corrente por produto
+        # (o mesmo produto pode aparecer em mais de uma linha).
+        remaining = {pk: p.stock_quantity for pk, p in products.items()}
+        lines = []
+        for item_data in items_data:
+            product = products.get(item_data['product_id'])
+            if product is None:
+                raise PdvSaleError('items', f'Produto id {item_data["product_id"]} não encontrado.')
+            sold_by_kg = item_data.get('sold_by_kg', False)
+            delta = stock_delta(product, item_data['quantity'], sold_by_kg)
+            available = remaining[product.pk]
+            if available < delta:
+                raise PdvSaleError('items', _insufficient_stock_message(product, available, sold_by_kg))
+            remaining[product.pk] = available - delta
+            lines.append((item_data, product, delta, available))
+
+        if payments_data:
+            payments_total = sum(Decimal(str(p['amount'])) for p in payments_data)
+            if abs(payments_total - total) > CENTS:
+                raise PdvSaleError(
+                    'payments',
+                    f'A soma dos pagamentos (R$ {payments_total:.2f}) deve ser igual ao total da venda (R$ {total:.2f}).'
+                )
+
+        plan = None
+        if payment_method == 'crediario' and client:
+            if total - down_payment <= 0:
+                raise PdvSaleError('down_payment', 'Entrada não pode ser maior ou igual ao total.')
+            plan = generate_installments(total, down_payment, installments_count, data.get('first_due_date'))
+
+        sale = Sale.objects.create(
+            client=client,
+            is_walk_in=is_walk_in,
+            cpf=cpf,
+            subtotal=subtotal,
+            discount=sale_discount,
+            total=total,
+            payment_method=payment_method,
+            status='paid' if payment_method != 'crediario' else 'credit_open',
+            change_amount=data.get('change_amount') or 0,
+            cash_received=data.get('cash_received'),
+            created_by=user,
+        )
+
+        SaleItem.objects.bulk_create([
+            SaleItem(
+                sale=sale,
+                item_type='product',
+                product=product,
+                quantity=item_data['quantity'],
+                sold_by_kg=item_data.get('sold_by_kg', False),
+                unit_price=item_data['unit_price'],
+                discount=item_data.get('discount') or 0,
+                total=line_total(item_data['unit_price'], item_data['quantity'], item_data.get('discount')),
+            )
+            for item_data, product, _delta, _prev in lines
+        ])
+
+        bulk_adjust_stock({pk: remaining[pk] - p.stock_quantity for pk, p in products.items()})
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product=product,
+                movement_type='exit',
+                quantity=delta,
+                previous_stock=prev,
+                new_stock=prev - delta,
+                reference=f'Venda #{sale.id}',
+                observation=f'Saída por venda PDV #{sale.id}',
+                created_by=user,
+            )
+            for _item, product, delta, prev in lines
+        ])
+
+        if payments_data:
+            SalePayment.objects.bulk_create([
+                SalePayment(sale=sale, payment_method=p['payment_method'], amount=p['amount'])
+                for p in payments_data
+            ])
+
+        if plan is not None:
+            account = CreditAccount.objects.create(
+                sale=sale,
+                client=client,
+                total_amount=total,
+                down_payment=down_payment,
+                financed_amount=total - down_payment,
+                installments_count=installments_count,
+                status='open',
+                created_by=user,
+            )
+            CreditInstallment.objects.bulk_create([
+                CreditInstallment(
+                    credit_account=account,
+                    number=p['number'],
+                    due_date=p['due_date'],
+                    amount=p['amount'],
+                    status='pending',
+                )
+                for p in plan
+            ])
+
+        rollup.record_sale(sale)
+
+    return sale
@@ -0,0 +1,162 @@
+"""
+Autorização de supervisor no PDV (cancelamento de venda).
+
+- O supervisor é identificado por usuário (senha) ou crachá (PIN) e só um hash
+  é verificado por tentativa; usuário inexistente roda o hasher uma vez, então
+  o tempo de resposta não revela quem existe.
+- Autorizado, recebe um token assinado (django.core.signing) válido por
+  SUPERVISOR_OVERRIDE_TTL segundos e preso ao terminal: reutilizável em vários
+  cancelamentos do turno sem novo hash. Troca de senha/PIN ou perda do perfil
+  Administrador invalida os tokens já emitidos.
+- Falhas contam no cache do Django por IP de origem (REMOTE_ADDR, não o
+  X-Terminal-Id, que o cliente escolhe) e por usuário/crachá informado; após
+  SUPERVISOR_AUTH_MAX_FAILURES na janela, novas tentativas recebem 429.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+TOKEN_SALT = 'sales.supervisor-override'
+FAILURES_PREFIX = 'sup-auth-fail'
+
+
+class SupervisorAuthError(ValueError):
+    """Autorização negada; status_code e retry_after (segundos) vão para a resposta."""
+
+    def __init__(self, message, status_code=403, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def token_ttl():
+    return _setting('SUPERVISOR_OVERRIDE_TTL', 60 * 60 * 2)
+
+
+def terminal_id(request):
+    """Terminal do PDV: X-Terminal-Id enviado pelo front ou, sem ele, o IP."""
+    terminal = (request.headers.get('X-Terminal-Id') or '').strip()[:64]
+    return terminal or request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _failure_keys(client_ip, username, badge):
+    """Contadores de falha: IP de origem e a conta tentada (usuário ou crachá)."""
+    account = f'user:{username}' if username else f'badge:{badge}'
+    return (
+        (f'{FAILURES_PREFIX}:ip:{client_ip or "unknown"}',
+         'Muitas tentativas de autorização neste terminal. Aguarde alguns minutos.'),
+        (f'{FAILURES_PREFIX}:{account}',
+         'Muitas tentativas de autorização para este supervisor. Aguarde alguns minutos.'),
+    )
+
+
+def _check_rate(failure_keys):
+    counts = cache.get_many([key for key, _message in failure_keys])
+    for key, message in failure_keys:
+        if (counts.get(key) or 0) >= _setting('SUPERVISOR_AUTH_MAX_FAILURES', 5):
+            raise SupervisorAuthError(
+                message, status_code=429, retry_after=_setting('SUPERVISOR_AUTH_WINDOW', 60 * 5),
+            )
+
+
+def _record_failure(failure_keys):
+    window = _setting('SUPERVISOR_AUTH_WINDOW', 60 * 5)
+    for key, _message in failure_keys:
+        cache.add(key, 0, window)
+        try:
+            cache.incr(key)
+        except ValueError:  # expirou entre add e incr
+            cache.set(key, 1, window)
+
+
+def _fingerprint(user):
+    """Muda quando senha, PIN ou perfil mudam: tokens antigos deixam de valer."""
+    value = f'{user.pk}:{user.password}:{user.supervisor_pin}:{user.role}:{user.is_active}'
+    return salted_hmac(TOKEN_SALT, value).hexdigest()[:20]
+
+
+def authenticate(client_ip, secret, username=None, badge=None):
+    """
+    Supervisor Administrador ativo pelo usuário+senha ou crachá+PIN (um único hash).
+    client_ip é o REMOTE_ADDR da requisição (limite de tentativas).
+    Levanta SupervisorAuthError (400, 403 ou 429).
+    """
+    from apps.users.models import User, UserRole
+
+    username, badge = (username or '').strip(), (badge or '').strip()
+    if not secret:
+        raise SupervisorAuthError('Senha do supervisor é obrigatória.', status_code=400)
+    if not username and not badge:
+        raise SupervisorAuthError('Informe o usuário ou o crachá do supervisor.', status_code=400)
+    failure_keys = _failure_keys(client_ip, username, badge)
+    _check_rate(failure_keys)
+
+    lookup = {'username': username} if username else {'badge_code': badge}
+    user = User.objects.filter(is_active=True, **lookup).first()
+    if user is None:
+        make_password(secret)  # mesmo custo de um usuário existente
+        valid = False
+    elif username:
+        valid = user.check_password(secret)
+    else:
+        valid = user.check_supervisor_pin(secret)
+
+    if not valid:
+        _record_failure(failure_keys)
+        raise SupervisorAuthError('Usuário ou senha do supervisor incorretos.')
+    if user.role != UserRole.ADMIN:
+        raise SupervisorAuthError(
+            'O supervisor informado não tem perfil de Administrador. '
+            'Apenas um administrador pode autorizar o cancelamento.'
+        )
+    return user
+
+
+def issue_token(user, terminal):
+    """Token assinado de autorização do supervisor para este terminal."""
+    return signing.dumps({'u': user.pk, 't': terminal, 'f': _fingerprint(user)}, salt=TOKEN_SALT)
+
+
+def verify_token(token, terminal):
+    """Supervisor do token (assinatura, validade, terminal e fingerprint). Uma query, nenhum hash."""
+    from apps.users.models import User, UserRole
+
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=token_ttl())
+    except signing.SignatureExpired:
+        raise SupervisorAuthError('Autorização do supervisor expirada. Informe a senha novamente.')
+    except signing.BadSignature:
+        raise SupervisorAuthError('Autorização do supervisor inválida.')
+    if payload.get('t') != terminal:
+        raise SupervisorAuthError('Autorização do supervisor emitida para outro terminal.')
+    user = User.objects.filter(pk=payload.get('u'), is_active=True, role=UserRole.ADMIN).first()
+    if user is None or payload.get('f') != _fingerprint(user):
+        raise SupervisorAuthError('Autorização do supervisor revogada. Informe a senha novamente.')
+    return user
+
+
+def authenticate_request(request):
+    """authenticate() com supervisor_username/supervisor_badge e supervisor_password/supervisor_pin do corpo."""
+    data = request.data
+    return authenticate(
+        request.META.get('REMOTE_ADDR'),
+        data.get('supervisor_password') or data.get('supervisor_pin') or '',
+        username=data.get('supervisor_username'),
+        badge=data.get('supervisor_badge'),
+    )
+
+
+def authorize(request):
+    """Supervisor que autoriza a operação: supervisor_token ou credenciais no corpo da requisição."""
+    terminal = terminal_id(request)
+    token = request.data.get('supervisor_token')
+    if token:
+        return verify_token(token, terminal)
+    return authenticate_request(request)
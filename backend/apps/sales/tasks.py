@@ -0,0 +1,27 @@
+"""
+Tasks Celery de vendas.
+"""
+import logging
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def purge_expired_idempotency_keys():
+    """Remove Idempotency-Keys do PDV já expiradas (agendada no Celery Beat)."""
+    from apps.sales.services.idempotency import purge_expired
+    deleted = purge_expired()
+    if deleted:
+        logger.info('Idempotency-Keys expiradas removidas: %s', deleted)
+    return deleted
+
+
+@shared_task
+def mark_overdue_installments():
+    """Marca parcelas do crediário vencidas (agendada à meia-noite, fuso da loja)."""
+    from apps.sales.services.credit import mark_overdue_installments as mark
+    updated = mark()
+    if updated:
+        logger.info('Parcelas marcadas como vencidas: %s', updated)
+    return updated
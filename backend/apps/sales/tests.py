@@ -0,0 +1,356 @@
+"""
+Sales tests (PDV).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.clients.models import Client
+from apps.products.models import Category, Product, StockMovement
+from apps.users.models import User
+from .models import Sale, SaleItem, CreditInstallment, IdempotencyKey
+from .services.pdv import create_pdv_sale, PdvSaleError
+
+
+def _item(product, quantity, unit_price='10.00', sold_by_kg=False):
+    return {
+        'product_id': product.pk,
+        'quantity': Decimal(str(quantity)),
+        'unit_price': Decimal(unit_price),
+        'discount': Decimal('0'),
+        'sold_by_kg': sold_by_kg,
+    }
+
+
+class PdvSaleServiceTest(TestCase):
+    """create_pdv_sale: baixa de estoque em lote e mensagens de validação."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='caixa', password='x')
+        category = Category.objects.create(name='Geral')
+        self.product = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('5'),
+            sale_price=Decimal('10'), price_manually_set=True, stock_quantity=10,
+        )
+        self.kg_product = Product.objects.create(
+            name='Ração granel', category=category, unit='KG', cost_price=Decimal('5'),
+            sale_price=Decimal('20'), price_manually_set=True, stock_quantity=5000,
+        )
+
+    def test_batched_sale_updates_stock_and_ledger(self):
+        data = {
+            'is_walk_in': True,
+            'items': [_item(self.product, 2), _item(self.kg_product, '1.5', '20.00', sold_by_kg=True), _item(self.product, 3)],
+            'discount': Decimal('1.00'),
+        }
+        sale = create_pdv_sale(data, self.user, payment_method='cash')
+        self.assertEqual(sale.subtotal, Decimal('80.00'))
+        self.assertEqual(sale.total, Decimal('79.00'))
+        self.assertEqual(SaleItem.objects.filter(sale=sale).count(), 3)
+        self.product.refresh_from_db()
+        self.kg_product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 5)
+        self.assertEqual(self.kg_product.stock_quantity, 3500)
+        movements = list(StockMovement.objects.filter(product=self.product).order_by('id').values_list('previous_stock', 'new_stock'))
+        self.assertEqual(movements, [(10, 8), (8, 5)])
+
+    def test_insufficient_stock_rolls_back_whole_sale(self):
+        data = {'is_walk_in': True, 'items': [_item(self.product, 4), _item(self.product, 7)], 'discount': Decimal('0')}
+        with self.assertRaises(PdvSaleError) as ctx:
+            create_pdv_sale(data, self.user, payment_method='cash')
+        self.assertEqual(ctx.exception.field, 'items')
+        self.assertEqual(str(ctx.exception), 'Estoque insuficiente para Petisco. Disponível: 6')
+        self.assertFalse(Sale.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+
+    def test_unknown_product(self):
+        data = {'is_walk_in': True, 'items': [{**_item(self.product, 1), 'product_id': 999999}], 'discount': Decimal('0')}
+        with self.assertRaisesMessage(PdvSaleError, 'Produto id 999999 não encontrado.'):
+            create_pdv_sale(data, self.user, payment_method='cash')
+
+    def test_crediario_creates_installments(self):
+        client = Client.objects.create(name='Ana', document_type='cpf', document='52998224725', phone='11999999999')
+        data = {
+            'is_walk_in': False,
+            'items': [_item(self.product, 3)],
+            'discount': Decimal('0'),
+            'down_payment': Decimal('0'),
+            'installments_count': 3,
+            'first_due_date': date(2030, 1, 31),
+        }
+        sale = create_pdv_sale(data, self.user, client=client, payment_method='crediario')
+        self.assertEqual(sale.status, 'credit_open')
+        installments = CreditInstallment.objects.filter(credit_account__sale=sale).order_by('number')
+        self.assertEqual([i.amount for i in installments], [Decimal('10.00')] * 3)
+        self.assertEqual(installments[1].due_date, date(2030, 2, 28))
+
+
+class PdvIdempotencyTest(TestCase):
+    """POST /api/sales/sales/pdv/ com Idempotency-Key: replay, conflito e chave liberada em erro."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='caixa', password='x')
+        category = Category.objects.create(name='Geral')
+        self.product = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('5'),
+            sale_price=Decimal('10'), price_manually_set=True, stock_quantity=10,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def _post(self, quantity, key='caixa-1-0001'):
+        body = {
+            'is_walk_in': True,
+            'payment_method': 'cash',
+            'items': [{'product_id': self.product.pk, 'quantity': quantity, 'unit_price': '10.00'}],
+        }
+        return self.api.post('/api/sales/sales/pdv/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self._post(2)
+        self.assertEqual(first.status_code, 201)
+        cache.clear()  # força a leitura da linha gravada no banco
+        retry = self._post(2)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+
+    def test_same_key_with_other_body_conflicts(self):
+        self.assertEqual(self._post(2).status_code, 201)
+        response = self._post(3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_failed_sale_does_not_reserve_key(self):
+        self.assertEqual(self._post(50).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self._post(1).status_code, 201)
+
+
+class CreditOverdueTest(TestCase):
+    """Leituras do crediário calculam vencidas no SQL; a marcação é do Celery Beat."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='caixa', password='x')
+        category = Category.objects.create(name='Geral')
+        product = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('5'),
+            sale_price=Decimal('10'), price_manually_set=True, stock_quantity=10,
+        )
+        client = Client.objects.create(name='Ana', document_type='cpf', document='52998224725', phone='11999999999')
+        today = timezone.localdate()
+        data = {
+            'is_walk_in': False, 'items': [_item(product, 3)], 'discount': Decimal('0'),
+            'down_payment': Decimal('0'), 'installments_count': 3,
+            'first_due_date': today - timedelta(days=40),
+        }
+        self.sale = create_pdv_sale(data, self.user, client=client, payment_method='crediario')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_reads_do_not_write_and_show_effective_status(self):
+        with CaptureQueriesContext(connection) as ctx:
+            listed = self.api.get('/api/credits/').json()
+            account_id = (listed['results'] if isinstance(listed, dict) else listed)[0]['id']
+            detail = self.api.get(f'/api/credits/{account_id}/').json()
+            forecast = self.api.get('/api/credits/forecast/').json()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('UPDATE')])
+        self.assertFalse(CreditInstallment.objects.filter(status='overdue').exists())
+
+        row = (listed['results'] if isinstance(listed, dict) else listed)[0]
+        self.assertEqual((row['pending_count'], row['overdue_count']), (3, 2))
+        self.assertEqual([i['status'] for i in detail['installments']], ['overdue', 'overdue', 'pending'])
+        self.assertEqual(detail['installments'][0]['status_display'], 'Atrasado')
+        self.assertEqual(forecast['forecast_total'], 30.0)
+
+    def test_beat_task_marks_overdue(self):
+        from .tasks import mark_overdue_installments
+        self.assertEqual(mark_overdue_installments(), 2)
+        self.assertEqual(CreditInstallment.objects.filter(status='overdue').count(), 2)
+        self.assertEqual(mark_overdue_installments(), 0)
+
+
+class SupervisorAuthorizationTest(TestCase):
+    """Cancelamento autorizado com um único hash, token reutilizável e limite por IP e por conta."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='caixa', password='caixa-pass')
+        for n in range(3):
+            User.objects.create_user(username=f'func{n}', password='outra-senha')
+        self.admin = User.objects.create_user(username='gerente', password='sup-pass', role='admin')
+        self.admin.badge_code = 'CR-001'
+        self.admin.set_supervisor_pin('4321')
+        self.admin.save()
+        category = Category.objects.create(name='Geral')
+        self.product = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('5'),
+            sale_price=Decimal('10'), price_manually_set=True, stock_quantity=10,
+        )
+        self.api = APIClient(HTTP_X_TERMINAL_ID='caixa-1')
+        self.api.force_authenticate(self.user)
+
+    def _sale(self):
+        data = {'is_walk_in': True, 'items': [_item(self.product, 1)], 'discount': Decimal('0')}
+        return create_pdv_sale(data, self.user, payment_method='cash')
+
+    def _cancel(self, sale, api=None, **body):
+        return (api or self.api).post(f'/api/sales/sales/{sale.pk}/cancel/', {'reason': 'Erro', **body}, format='json')
+
+    def _count_hashes(self):
+        from unittest import mock
+        from django.contrib.auth import hashers
+        return mock.patch.object(
+            hashers.PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=hashers.PBKDF2PasswordHasher.verify,
+        )
+
+    def test_single_hash_then_reusable_token(self):
+        with self._count_hashes() as verify:
+            response = self._cancel(self._sale(), supervisor_username='gerente', supervisor_password='sup-pass')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(verify.call_count, 1)
+
+        token = self.api.post(
+            '/api/sales/sales/supervisor-override/', {'supervisor_badge': 'CR-001', 'supervisor_pin': '4321'}, format='json',
+        ).json()['token']
+        with self._count_hashes() as verify:
+            for _ in range(2):
+                self.assertEqual(self._cancel(self._sale(), supervisor_token=token).status_code, 200)
+        self.assertEqual(verify.call_count, 0)
+
+        other = APIClient(HTTP_X_TERMINAL_ID='caixa-2')
+        other.force_authenticate(self.user)
+        self.assertEqual(self._cancel(self._sale(), api=other, supervisor_token=token).status_code, 403)
+        self.admin.set_password('nova-senha')
+        self.admin.save()
+        self.assertEqual(self._cancel(self._sale(), supervisor_token=token).status_code, 403)
+
+    def test_non_admin_and_missing_username_are_rejected(self):
+        sale = self._sale()
+        response = self._cancel(sale, supervisor_username='func1', supervisor_password='outra-senha')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('Administrador', response.json()['error'])
+        self.assertEqual(self._cancel(sale, supervisor_password='sup-pass').status_code, 400)
+        sale.refresh_from_db()
+        self.assertEqual(sale.status, 'paid')
+
+    def test_failures_are_rate_limited_per_ip_and_account(self):
+        sale = self._sale()
+        for _ in range(5):
+            self.assertEqual(self._cancel(sale, supervisor_username='gerente', supervisor_password='x').status_code, 403)
+        response = self._cancel(sale, supervisor_username='gerente', supervisor_password='sup-pass')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        rotated = APIClient(HTTP_X_TERMINAL_ID='caixa-2')  # mesmo IP, outro X-Terminal-Id
+        rotated.force_authenticate(self.user)
+        response = self._cancel(sale, api=rotated, supervisor_badge='CR-001', supervisor_pin='4321')
+        self.assertEqual(response.status_code, 429)
+
+        other_ip = APIClient(HTTP_X_TERMINAL_ID='caixa-3', REMOTE_ADDR='10.0.0.3')
+        other_ip.force_authenticate(self.user)
+        response = self._cancel(sale, api=other_ip, supervisor_username='gerente', supervisor_password='sup-pass')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('supervisor', response.json()['error'])
+        response = self._cancel(sale, api=other_ip, supervisor_badge='CR-001', supervisor_pin='4321')
+        self.assertEqual(response.status_code, 200)
+
+    def test_badge_without_pin_still_runs_a_hash(self):
+        from unittest import mock
+        from django.contrib.auth import hashers
+        User.objects.filter(pk=self.admin.pk).update(supervisor_pin='')
+        with mock.patch.object(
+            hashers.PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=hashers.PBKDF2PasswordHasher.encode,
+        ) as encode:
+            response = self._cancel(self._sale(), supervisor_badge='CR-001', supervisor_pin='4321')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(encode.call_count, 1)
+
+
+class SaleCancellationTest(TestCase):
+    """cancel_sales: estorno em lote com número fixo de queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='caixa', password='x')
+        category = Category.objects.create(name='Geral')
+        self.product = Product.objects.create(
+            name='Petisco', category=category, cost_price=Decimal('5'),
+            sale_price=Decimal('10'), price_manually_set=True, stock_quantity=20,
+        )
+        self.kg_product = Product.objects.create(
+            name='Ração granel', category=category, unit='KG', cost_price=Decimal('5'),
+            sale_price=Decimal('20'), price_manually_set=True, stock_quantity=5000,
+        )
+        self.client_obj = Client.objects.create(
+            name='Ana', document_type='cpf', document='52998224725', phone='11999999999',
+        )
+
+    def _sale(self, *items, payment_method='cash'):
+        data = {
+            'is_walk_in': payment_method != 'crediario', 'items': list(items), 'discount': Decimal('0'),
+            'down_payment': Decimal('0'), 'installments_count': 2,
+            'first_due_date': timezone.localdate() + timedelta(days=30),
+        }
+        client = self.client_obj if payment_method == 'crediario' else None
+        return create_pdv_sale(data, self.user, client=client, payment_method=payment_method)
+
+    def test_bulk_cancel_restores_stock_in_fixed_queries(self):
+        from .services.cancellation import cancel_sales
+        sales = [
+            self._sale(_item(self.product, 2), _item(self.kg_product, '1.5', '20.00', sold_by_kg=True)),
+            self._sale(_item(self.product, 3), _item(self.product, 1)),
+            self._sale(_item(self.product, 4), payment_method='crediario'),
+        ]
+        # lock vendas, itens, lock produtos, UPDATE estoque, INSERT movimentos,
+        # UPDATE parcelas, UPDATE crediários, UPDATE vendas (+ savepoint/release)
+        with self.assertNumQueries(10):
+            cancelled = cancel_sales([s.pk for s in sales], self.user, 'Fechamento')
+        self.assertEqual([s.status for s in cancelled], ['cancelled'] * 3)
+
+        self.product.refresh_from_db()
+        self.kg_product.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.kg_product.stock_quantity), (20, 5000))
+        entries = StockMovement.objects.filter(product=self.product, movement_type='entry').order_by('id')
+        self.assertEqual(
+            list(entries.values_list('previous_stock', 'new_stock')), [(10, 12), (12, 15), (15, 16), (16, 20)],
+        )
+        self.assertTrue(entries[0].observation.endswith(': Fechamento'))
+        account = sales[2].credit_account
+        account.refresh_from_db()
+        self.assertEqual(account.status, 'cancelled')
+        self.assertFalse(account.installments.exclude(status='cancelled').exists())
+
+    def test_invalid_sale_rolls_back_batch(self):
+        from .services.cancellation import cancel_sales, SaleCancelError
+        first, second = self._sale(_item(self.product, 2)), self._sale(_item(self.product, 1))
+        cancel_sales([second.pk], self.user)
+        with self.assertRaisesMessage(SaleCancelError, f'Venda #{second.pk}: Esta venda já está cancelada.'):
+            cancel_sales([first.pk, second.pk], self.user)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'paid')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 18)
+
+    def test_bulk_cancel_endpoint(self):
+        admin = User.objects.create_user(username='gerente', password='sup-pass', role='admin')
+        sales = [self._sale(_item(self.product, 1)) for _ in range(3)]
+        api = APIClient()
+        api.force_authenticate(self.user)
+        response = api.post('/api/sales/sales/bulk-cancel/', {
+            'sale_ids': [s.pk for s in sales], 'reason': 'Fim do dia',
+            'supervisor_username': admin.username, 'supervisor_password': 'sup-pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(Sale.objects.filter(status='cancelled').count(), 3)
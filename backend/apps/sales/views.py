@@ -9,9 +9,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Prefetch
 from datetime import datetime, timedelta
-from .models import Sale, SaleItem, SalePayment, Receipt, Invoice, CreditAccount, CreditInstallment
+from .models import Sale, SaleItem, Receipt, Invoice, CreditAccount, CreditInstallment
 from .serializers import (
     SaleSerializer, SaleCreateSerializer,
     SaleItemSerializer, ReceiptSerializer, InvoiceSerializer,
@@ -19,7 +19,19 @@ from .serializers import (
     CreditAccountSerializer, CreditAccountListSerializer,
     CreditInstallmentSerializer, PayInstallmentSerializer,
 )
-from .services.credit import generate_installments, mark_overdue_installments
+from .services.credit import installment_current_status, with_installment_summary
+from .services.cancellation import cancel_sales, SaleCancelError
+from .services.pdv import create_pdv_sale, PdvSaleError
+from .services import idempotency, supervisor
+from apps.reports.services import rollup
+from apps.reports.services.cashflow import aging, open_by_day
+
+
+def _supervisor_error(error):
+    response = Response({'error': error.message}, status=error.status_code)
+    if error.retry_after:
+        response['Retry-After'] = str(error.retry_after)
+    return response
 
 
 class SaleViewSet(viewsets.ModelViewSet):
@@ -49,15 +61,33 @@ class SaleViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            sale = serializer.save()
+            rollup.record_sale(sale)
+
+    def perform_update(self, serializer):
+        previous_day = rollup.sale_day(serializer.instance)
+        with transaction.atomic():
+            sale = serializer.save()
+            rollup.refresh_sale_day(sale, previous_day=previous_day)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            rollup.refresh_sale_day(instance)
+            instance.delete()
+
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         """Add item to sale"""
         sale = self.get_object()
         serializer = SaleItemSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(sale=sale)
-        sale.calculate_total()
-        sale.save()
+        with transaction.atomic():
+            serializer.save(sale=sale)
+            sale.calculate_total()
+            sale.save()
+            rollup.refresh_sale_day(sale)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -72,13 +102,13 @@ class SaleViewSet(viewsets.ModelViewSet):
             )
         
         # Update stock for products
-        from apps.products.models import StockMovement
+        from apps.products.models import Product, StockMovement
         from django.db import transaction
         
         with transaction.atomic():
             for item in sale.items.filter(item_type='product'):
-                if item.product:
-                    product = item.product
+                if item.product_id:
+                    product = Product.objects.select_for_update().get(pk=item.product_id)
                     previous_stock = product.stock_quantity
                     if product.unit == 'KG' and getattr(item, 'sold_by_kg', False):
                         stock_delta = int(round(float(item.quantity) * 1000))
@@ -110,8 +140,10 @@ class SaleViewSet(viewsets.ModelViewSet):
                         created_by=request.user
                     )
             
+            old_status = sale.status
             sale.status = 'paid'
             sale.save()
+            rollup.record_status_change(sale, old_status, 'paid')
         
         serializer = self.get_serializer(sale)
         return Response(serializer.data)
@@ -144,14 +176,31 @@ class SaleViewSet(viewsets.ModelViewSet):
         PDV: create and finalize sale in one request.
         Body: { cpf?, is_walk_in, items: [{product_id, quantity, unit_price}], payment_method }
         For crediario: client_cpf, down_payment, installments_count, first_due_date
+        Header opcional Idempotency-Key: reenvios com a mesma chave recebem a
+        resposta da primeira venda (Idempotent-Replayed: true) em vez de duplicá-la.
         """
+        idem_key = (request.headers.get('Idempotency-Key') or '').strip()
+        fingerprint = None
+        if idem_key:
+            if len(idem_key) > idempotency.MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'Idempotency-Key deve ter no máximo {idempotency.MAX_KEY_LENGTH} caracteres.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            fingerprint = idempotency.request_fingerprint(request.data)
+            try:
+                replay = idempotency.lookup(request.user, idem_key, fingerprint)
+            except idempotency.IdempotencyConflict as e:
+                return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if replay:
+                return self._idempotent_replay(replay)
+
         serializer = PdvSaleCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         cpf_raw = (data.get('client_cpf') or data.get('cpf') or '').strip()
         cpf_digits = re.sub(r'[^0-9]', '', cpf_raw)
         is_walk_in = data.get('is_walk_in', True)
-        items_data = data['items']
         payments_data = data.get('payments') or []
         payment_method = data.get('payment_method')
         if payments_data:
@@ -172,233 +221,96 @@ class SaleViewSet(viewsets.ModelViewSet):
         if is_walk_in and cpf_digits:
             cpf_saved = cpf_digits
 
-        from apps.products.models import Product, StockMovement
-
-        with transaction.atomic():
-            sale_status = 'paid' if payment_method != 'crediario' else 'credit_open'
-            sale_discount = data.get('discount') or 0
-            change_amount = data.get('change_amount') or 0
-            cash_received = data.get('cash_received')
-            sale = Sale.objects.create(
-                client=client,
-                is_walk_in=is_walk_in,
-                cpf=cpf_saved,
-                discount=sale_discount,
-                total=0,
-                payment_method=payment_method,
-                status=sale_status,
-                change_amount=change_amount,
-                cash_received=cash_received,
-                created_by=request.user,
-            )
-            for item_data in items_data:
-                product = Product.objects.select_for_update().filter(pk=item_data['product_id']).first()
-                if not product:
-                    return Response(
-                        {'items': f'Produto id {item_data["product_id"]} não encontrado.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                qty = item_data['quantity']
-                sold_by_kg = item_data.get('sold_by_kg', False)
-                # Para produtos KG vendidos por kg: estoque em gramas (qty_grams)
-                if product.unit == 'KG' and sold_by_kg:
-                    qty_grams = int(round(float(qty) * 1000))
-                    if product.stock_quantity < qty_grams:
-                        disp_kg = product.stock_quantity / 1000
-                        return Response(
-                            {'items': f'Estoque insuficiente para {product.name}. Disponível: {disp_kg:.3f} kg'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    stock_delta = qty_grams
-                elif product.unit == 'PKG' and product.units_per_package:
-                    qty_packages = int(qty) if qty == int(qty) else int(round(float(qty)))
-                    stock_delta = qty_packages * product.units_per_package
-                    if product.stock_quantity < stock_delta:
-                        disp_pac = product.stock_quantity // product.units_per_package
-                        return Response(
-                            {'items': f'Estoque insuficiente para {product.name}. Disponível: {disp_pac} pacote(s)'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                else:
-                    qty_int = int(qty) if qty == int(qty) else int(round(float(qty)))
-                    if product.stock_quantity < qty_int:
-                        return Response(
-                            {'items': f'Estoque insuficiente para {product.name}. Disponível: {product.stock_quantity}'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    stock_delta = qty_int
-                unit_price = item_data['unit_price']
-                item_discount = item_data.get('discount') or 0
-                SaleItem.objects.create(
-                    sale=sale,
-                    item_type='product',
-                    product=product,
-                    quantity=qty,
-                    sold_by_kg=sold_by_kg,
-                    unit_price=unit_price,
-                    discount=item_discount,
-                )
-                prev = product.stock_quantity
-                product.stock_quantity = prev - stock_delta
-                product.save(update_fields=['stock_quantity'])
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type='exit',
-                    quantity=stock_delta,
-                    previous_stock=prev,
-                    new_stock=product.stock_quantity,
-                    reference=f'Venda #{sale.id}',
-                    observation=f'Saída por venda PDV #{sale.id}',
-                    created_by=request.user,
-                )
-            sale.calculate_total()
-            sale.save()
-
-            # Pagamentos fracionados (várias formas)
-            if payments_data:
-                from decimal import Decimal
-                payments_total = sum(Decimal(str(p['amount'])) for p in payments_data)
-                if abs(payments_total - sale.total) > Decimal('0.01'):
-                    raise DRFValidationError({
-                        'payments': f'A soma dos pagamentos (R$ {payments_total:.2f}) deve ser igual ao total da venda (R$ {sale.total:.2f}).'
-                    })
-                for p in payments_data:
-                    SalePayment.objects.create(
-                        sale=sale,
-                        payment_method=p['payment_method'],
-                        amount=p['amount'],
-                    )
-
-            # Crediário: create CreditAccount and installments
-            if payment_method == 'crediario' and client:
-                down_payment = data.get('down_payment') or 0
-                installments_count = data.get('installments_count', 6)
-                first_due_date = data.get('first_due_date')
-                total = sale.total
-                financed = total - down_payment
-                if financed <= 0:
-                    return Response(
-                        {'down_payment': 'Entrada não pode ser maior ou igual ao total.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                plan = generate_installments(total, down_payment, installments_count, first_due_date)
-                account = CreditAccount.objects.create(
-                    sale=sale,
-                    client=client,
-                    total_amount=total,
-                    down_payment=down_payment,
-                    financed_amount=financed,
-                    installments_count=installments_count,
-                    status='open',
-                    created_by=request.user,
+        try:
+            with transaction.atomic():
+                record = None
+                if idem_key:
+                    try:
+                        record, replay = idempotency.claim(request.user, idem_key, fingerprint)
+                    except idempotency.IdempotencyConflict as e:
+                        return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                    if replay:
+                        return self._idempotent_replay(replay)
+                sale = create_pdv_sale(
+                    data, request.user,
+                    client=client, cpf=cpf_saved, payment_method=payment_method,
                 )
-                for p in plan:
-                    CreditInstallment.objects.create(
-                        credit_account=account,
-                        number=p['number'],
-                        due_date=p['due_date'],
-                        amount=p['amount'],
-                        status='pending',
-                    )
+                resp_data = SaleSerializer(sale).data
+                if payment_method == 'crediario':
+                    resp_data['credit_account'] = CreditAccountSerializer(sale.credit_account).data
+                if record:
+                    idempotency.store(record, status.HTTP_201_CREATED, resp_data, sale=sale)
+        except PdvSaleError as e:
+            if e.field == 'payments':
+                raise DRFValidationError({e.field: e.message})
+            return Response({e.field: e.message}, status=status.HTTP_400_BAD_REQUEST)
 
-        out = SaleSerializer(sale)
-        resp_data = out.data
-        if payment_method == 'crediario':
-            account = sale.credit_account
-            resp_data['credit_account'] = CreditAccountSerializer(account).data
         return Response(resp_data, status=status.HTTP_201_CREATED)
 
+    def _idempotent_replay(self, replay):
+        status_code, body = replay
+        return Response(body, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
-        """Cancel a completed sale and restore stock. Requires supervisor (admin) credentials."""
+        """
+        Cancel a completed sale and restore stock. Requires supervisor (admin) authorisation:
+        supervisor_token (from supervisor-override) or supervisor_username + supervisor_password
+        (or supervisor_badge + supervisor_pin).
+        """
         sale = self.get_object()
         reason = (request.data.get('reason') or '').strip()
-        sup_pass = request.data.get('supervisor_password') or ''
-
-        if not sup_pass:
-            return Response(
-                {'error': 'Senha do supervisor é obrigatória.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # O cancelamento só é autorizado se a senha pertencer a um usuário com perfil Administrador
-        # Primeiro rejeita se a senha for de qualquer usuário que NÃO seja Administrador
-        from apps.users.models import User, UserRole
-
-        non_admins = User.objects.filter(is_active=True).exclude(role=UserRole.ADMIN)
-        for u in non_admins:
-            if u.check_password(sup_pass):
-                return Response(
-                    {'error': 'A senha informada pertence a um usuário sem perfil de Administrador. Apenas a senha de um administrador pode autorizar o cancelamento.'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-        # Só então verifica se a senha pertence a um Administrador
-        admins = User.objects.filter(is_active=True, role=UserRole.ADMIN)
-        if not any(u.check_password(sup_pass) for u in admins):
-            return Response(
-                {'error': 'Senha incorreta. Informe a senha de um usuário com perfil Administrador.'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        if sale.status not in ('paid', 'credit_open'):
-            return Response(
-                {'error': 'Somente vendas concluídas (pagas ou no crediário) podem ser canceladas.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if sale.status == 'cancelled':
-            return Response(
-                {'error': 'Esta venda já está cancelada.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        from apps.products.models import StockMovement
-
-        with transaction.atomic():
-            # Restore stock for each product item
-            for item in sale.items.filter(item_type='product'):
-                if item.product:
-                    product = item.product
-                    previous_stock = product.stock_quantity
-                    if product.unit == 'KG' and getattr(item, 'sold_by_kg', False):
-                        stock_delta = int(round(float(item.quantity) * 1000))
-                    elif product.unit == 'PKG' and product.units_per_package:
-                        qty_pac = int(item.quantity) if item.quantity == int(item.quantity) else int(round(float(item.quantity)))
-                        stock_delta = qty_pac * product.units_per_package
-                    else:
-                        stock_delta = int(item.quantity) if item.quantity == int(item.quantity) else int(round(float(item.quantity)))
-                    new_stock = previous_stock + stock_delta
-
-                    product.stock_quantity = new_stock
-                    product.save()
-
-                    StockMovement.objects.create(
-                        product=product,
-                        movement_type='entry',
-                        quantity=stock_delta,
-                        previous_stock=previous_stock,
-                        new_stock=new_stock,
-                        reference=f'Venda #{sale.id}',
-                        observation=f'Estorno por cancelamento da venda #{sale.id}' + (f': {reason[:200]}' if reason else ''),
-                        created_by=request.user,
-                    )
+        try:
+            supervisor.authorize(request)
+        except supervisor.SupervisorAuthError as e:
+            return _supervisor_error(e)
 
-            # Cancel credit account if exists (crediário)
-            try:
-                account = sale.credit_account
-                account.status = 'cancelled'
-                account.save()
-                account.installments.filter(status__in=['pending', 'overdue']).update(status='cancelled')
-            except CreditAccount.DoesNotExist:
-                pass
-
-            sale.status = 'cancelled'
-            sale.cancellation_reason = reason
-            sale.save()
+        try:
+            [sale] = cancel_sales([sale.pk], request.user, reason)
+        except SaleCancelError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(sale)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], url_path='bulk-cancel')
+    def bulk_cancel(self, request):
+        """
+        Cancela várias vendas numa transação (ex.: estorno no fechamento do caixa).
+        Body: sale_ids, reason e a mesma autorização de supervisor de cancel.
+        Nenhuma venda é cancelada se alguma não puder ser.
+        """
+        sale_ids = request.data.get('sale_ids')
+        if not isinstance(sale_ids, list) or not all(isinstance(pk, int) for pk in sale_ids):
+            return Response({'error': 'sale_ids deve ser uma lista de números.'}, status=status.HTTP_400_BAD_REQUEST)
+        reason = (request.data.get('reason') or '').strip()
+        try:
+            supervisor.authorize(request)
+        except supervisor.SupervisorAuthError as e:
+            return _supervisor_error(e)
+        try:
+            sales = cancel_sales(sale_ids, request.user, reason)
+        except SaleCancelError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'cancelled': [sale.id for sale in sales], 'count': len(sales)})
+
+    @action(detail=False, methods=['post'], url_path='supervisor-override')
+    def supervisor_override(self, request):
+        """
+        Autoriza o supervisor uma vez (usuário + senha ou crachá + PIN) e devolve um token
+        assinado para este terminal, aceito em cancel (supervisor_token) até expirar.
+        """
+        terminal = supervisor.terminal_id(request)
+        try:
+            user = supervisor.authenticate_request(request)
+        except supervisor.SupervisorAuthError as e:
+            return _supervisor_error(e)
+        return Response({
+            'token': supervisor.issue_token(user, terminal),
+            'expires_in': supervisor.token_ttl(),
+            'supervisor': {'id': user.id, 'username': user.username, 'name': user.get_full_name() or user.username},
+        })
+
     @action(detail=True, methods=['get'], url_path='receipt')
     def receipt(self, request, pk=None):
         """Return structured data for thermal receipt (80mm)."""
@@ -454,6 +366,22 @@ class SaleItemViewSet(viewsets.ModelViewSet):
     queryset = SaleItem.objects.all()
     serializer_class = SaleItemSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            item = serializer.save()
+            rollup.refresh_sale_day(item.sale)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            item = serializer.save()
+            rollup.refresh_sale_day(item.sale)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            sale = instance.sale
+            instance.delete()
+            rollup.refresh_sale_day(sale)
+
 
 class ReceiptViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -492,31 +420,31 @@ class CreditAccountViewSet(viewsets.ReadOnlyModelViewSet):
             return CreditAccountSerializer
         return CreditAccountListSerializer
 
-    def list(self, request, *args, **kwargs):
-        mark_overdue_installments()
-        return super().list(request, *args, **kwargs)
-
-    def retrieve(self, request, *args, **kwargs):
-        mark_overdue_installments()
-        return super().retrieve(request, *args, **kwargs)
-
     @action(detail=False, methods=['get'], url_path='forecast')
     def forecast(self, request):
         """
-        Previsão de entrada: soma do valor das parcelas em aberto (pending + overdue).
+        Previsão de entrada: soma do valor das parcelas em aberto (pending + overdue)
+        e aging por faixa de atraso (a vencer, 0-30, 31-60, 61-90, 90+ dias), numa query.
         Respeita os mesmos filtros da listagem (status, q, start, end).
+        Projeção semanal junto com contas a pagar: /api/reports/cash-flow/.
         """
-        mark_overdue_installments()
-        qs = self.get_queryset().filter(status='open')
-        agg = CreditInstallment.objects.filter(
-            credit_account__in=qs,
-            status__in=['pending', 'overdue'],
-        ).aggregate(total=Sum('amount'))
-        total = agg['total'] or 0
-        return Response({'forecast_total': float(total)})
+        qs = self._filter(CreditAccount.objects.filter(status='open'))
+        rows = open_by_day(CreditInstallment.objects.filter(credit_account__in=qs))
+        data = aging(rows, timezone.localdate())
+        return Response({'forecast_total': data['open_total'], 'aging': data})
 
     def get_queryset(self):
-        qs = CreditAccount.objects.select_related('client', 'sale', 'created_by').prefetch_related('installments')
+        # Somente leitura: status vencido calculado no SQL (a marcação roda no Celery Beat)
+        today = timezone.localdate()
+        installments = CreditInstallment.objects.annotate(current_status=installment_current_status(today))
+        qs = with_installment_summary(
+            CreditAccount.objects.select_related('client', 'sale', 'created_by')
+            .prefetch_related(Prefetch('installments', queryset=installments)),
+            today,
+        )
+        return self._filter(qs)
+
+    def _filter(self, qs):
         status = self.request.query_params.get('status')
         client_id = self.request.query_params.get('client_id')
         q = self.request.query_params.get('q', '').strip()
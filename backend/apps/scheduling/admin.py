@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment, BusinessHoursConfig, BusinessHoursRule, BusinessClosure
+from .models import Appointment, BusinessHoursConfig, BusinessHoursRule, BusinessClosure, Resource, ResourcePool
 
 
 class BusinessHoursRuleInline(admin.TabularInline):
@@ -18,9 +18,20 @@ class BusinessClosureAdmin(admin.ModelAdmin):
     list_display = ('date', 'reason')
 
 
+class ResourceInline(admin.TabularInline):
+    model = Resource
+    extra = 0
+
+
+@admin.register(ResourcePool)
+class ResourcePoolAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_active')
+    inlines = [ResourceInline]
+
+
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
-    list_display = ('client', 'pet', 'service', 'start_at', 'status', 'created_via', 'created_at')
+    list_display = ('client', 'pet', 'service', 'resource', 'start_at', 'status', 'created_via', 'created_at')
     list_filter = ('status', 'created_via', 'created_at')
     search_fields = ('client__name', 'pet__name', 'service__name')
     readonly_fields = ('created_at', 'updated_at', 'created_by')
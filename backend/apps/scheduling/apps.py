@@ -5,3 +5,7 @@ class SchedulingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.scheduling'
     verbose_name = 'Agendamentos'
+
+    def ready(self):
+        import apps.scheduling.checks  # noqa: F401
+        import apps.scheduling.signals  # noqa: F401
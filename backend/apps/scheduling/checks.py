@@ -0,0 +1,32 @@
+"""
+System checks do agendamento.
+
+O cache de disponibilidade (services/availability_cache.py) é invalidado por
+signals no processo que gravou a alteração. Com um cache local por processo
+(LocMemCache), os outros workers do gunicorn continuariam servindo horários
+antigos: em produção o cache precisa ser compartilhado (CACHE_URL).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if not getattr(settings, 'SCHEDULING_REQUIRE_SHARED_CACHE', False):
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f'O cache padrão ({backend}) é local de cada processo; a invalidação da '
+            'disponibilidade de horários não chegaria aos outros workers.',
+            hint='Defina CACHE_URL (ex.: redis://redis:6379/1) para usar um cache compartilhado.',
+            id='scheduling.E001',
+        )
+    ]
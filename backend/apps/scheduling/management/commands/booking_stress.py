@@ -0,0 +1,146 @@
+"""
+Teste de carga de reservas concorrentes: N threads disputam o mesmo horário
+via create_booking e o comando reporta vazão, rejeições e reservas duplicadas
+(acima da capacidade do horário). Use com PostgreSQL; no SQLite as escritas
+concorrentes tendem a falhar com "database is locked" (contadas como erro).
+
+    python manage.py booking_stress --workers 16 --attempts 64 --capacity 2
+
+Com --days N as tentativas são repartidas entre N dias: como o lock de reserva
+é por (dia, grupo), a vazão deve crescer com N no PostgreSQL.
+
+Cria cliente, animal, serviço (e grupo de recursos com --capacity > 1)
+temporários e apaga tudo ao final. Requer horário de funcionamento configurado.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.clients.models import Client
+from apps.pets.models import Pet
+from apps.scheduling.models import Appointment, Resource, ResourcePool
+from apps.scheduling.services.availability import get_available_slots
+from apps.scheduling.services.booking import create_booking
+from apps.services.models import Service
+
+
+def _random_cpf():
+    digits = [random.randint(0, 9) for _ in range(9)]
+    for size in (9, 10):
+        total = sum(d * w for d, w in zip(digits, range(size + 1, 1, -1)))
+        digits.append(0 if total % 11 < 2 else 11 - total % 11)
+    return ''.join(map(str, digits))
+
+
+class Command(BaseCommand):
+    help = 'Dispara reservas concorrentes no mesmo horário e mede vazão e reservas duplicadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Threads simultâneas.')
+        parser.add_argument('--attempts', type=int, default=32, help='Total de tentativas de reserva.')
+        parser.add_argument('--capacity', type=int, default=1, help='Recursos no grupo (1 = agenda única).')
+        parser.add_argument('--date', help='Data (YYYY-MM-DD); padrão: próximo dia com horário livre.')
+        parser.add_argument('--days', type=int, default=1, help='Dias disputados em paralelo (a partir da data).')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        attempts = max(options['attempts'], 1)
+        capacity = max(options['capacity'], 1)
+        days = max(options['days'], 1)
+
+        pool = None
+        if capacity > 1:
+            pool = ResourcePool.objects.create(name=f'__stress__ {time.time_ns()}')
+            Resource.objects.bulk_create([Resource(pool=pool, name=f'R{i + 1}') for i in range(capacity)])
+        service = Service.objects.create(
+            name='__stress__', price=Decimal('1.00'), duration_minutes=30, resource_pool=pool,
+        )
+        client = Client.objects.create(
+            name='__stress__', document_type='cpf', document=_random_cpf(), phone='00000000000',
+        )
+        pet = Pet.objects.create(client=client, name='__stress__', species='dog')
+        try:
+            targets = self._pick_slots(service, options.get('date'), days)
+            self._run(service, client, pet, targets, workers, attempts, capacity)
+        finally:
+            Appointment.objects.filter(service=service).delete()
+            pet.delete()
+            client.delete()
+            service.delete()
+            if pool:
+                pool.delete()
+
+    def _pick_slots(self, service, date_str, count):
+        """Primeiro horário livre de cada um dos próximos `count` dias com horário livre."""
+        if date_str:
+            try:
+                start = date.fromisoformat(date_str)
+            except ValueError:
+                raise CommandError('Data deve estar no formato YYYY-MM-DD.')
+        else:
+            start = date.today() + timedelta(days=1)
+        targets = []
+        for day in (start + timedelta(days=i) for i in range(60)):
+            slots = get_available_slots(service.id, day)
+            if slots:
+                targets.append((day, slots[0]))
+                if len(targets) == count:
+                    return targets
+            elif date_str and not targets:
+                break
+        if not targets:
+            raise CommandError('Nenhum horário livre encontrado (configure o horário de funcionamento).')
+        return targets
+
+    def _run(self, service, client, pet, targets, workers, attempts, capacity):
+        counts = {'ok': 0, 'rejected': 0, 'error': 0}
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(min(workers, attempts))
+
+        def attempt(i):
+            if i < workers:
+                barrier.wait()  # primeira leva dispara junta
+            target_date, slot = targets[i % len(targets)]
+            try:
+                create_booking(
+                    client.id, pet.id, service.id, target_date.isoformat(), slot,
+                    created_via='admin',
+                )
+                outcome = 'ok'
+            except ValueError:
+                outcome = 'rejected'
+            except Exception as e:  # noqa: BLE001 - reportado no resumo
+                outcome = 'error'
+                with lock:
+                    errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                connection.close()
+            with lock:
+                counts[outcome] += 1
+
+        self.stdout.write(
+            f'{connection.vendor}: {attempts} tentativas, {workers} threads, '
+            f'{", ".join(f"{day} {slot}" for day, slot in targets)}, capacidade {capacity}'
+        )
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(attempt, range(attempts)))
+        elapsed = time.perf_counter() - t0
+
+        active = Appointment.objects.filter(service=service).exclude(status__in=['cancelled', 'no_show'])
+        double_bookings = sum(
+            max(active.filter(start_at__date=day).count() - capacity, 0) for day, _ in targets
+        )
+        self.stdout.write(f'tempo: {elapsed:.2f}s  vazão: {attempts / elapsed:.1f} tentativas/s')
+        self.stdout.write(f'aceitas: {counts["ok"]}  rejeitadas: {counts["rejected"]}  erros: {counts["error"]}')
+        for message in sorted(set(errors))[:5]:
+            self.stdout.write(f'  {message}')
+        style = self.style.ERROR if double_bookings else self.style.SUCCESS
+        self.stdout.write(style(f'reservas duplicadas: {double_bookings}'))
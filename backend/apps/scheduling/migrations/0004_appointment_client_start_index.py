@@ -0,0 +1,17 @@
+# Index for per-client "last activity" lookups (reports: inactive clients)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0003_appointment_business_hours'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', 'start_at'], name='sched_appt_client_start_idx'),
+        ),
+    ]
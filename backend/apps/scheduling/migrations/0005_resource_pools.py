@@ -0,0 +1,51 @@
+# Resource pools for capacity-aware scheduling
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0004_appointment_client_start_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourcePool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nome')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+            ],
+            options={
+                'verbose_name': 'Grupo de Recursos',
+                'verbose_name_plural': 'Grupos de Recursos',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resources', to='scheduling.resourcepool', verbose_name='Grupo')),
+            ],
+            options={
+                'verbose_name': 'Recurso',
+                'verbose_name_plural': 'Recursos',
+                'ordering': ['pool', 'name'],
+                'unique_together': {('pool', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='resource',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='scheduling.resource', verbose_name='Recurso'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['resource', 'start_at'], name='sched_appt_resource_start_idx'),
+        ),
+    ]
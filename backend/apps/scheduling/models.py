@@ -51,6 +51,14 @@ class Appointment(models.Model):
         default='scheduled',
         verbose_name='Status'
     )
+    resource = models.ForeignKey(
+        'scheduling.Resource',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments',
+        verbose_name='Recurso'
+    )
     observations = models.TextField(blank=True, verbose_name='Observações')
     created_via = models.CharField(
         max_length=15,
@@ -80,6 +88,8 @@ class Appointment(models.Model):
             models.Index(fields=['service']),
             models.Index(fields=['start_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['client', 'start_at'], name='sched_appt_client_start_idx'),
+            models.Index(fields=['resource', 'start_at'], name='sched_appt_resource_start_idx'),
         ]
 
     def __str__(self):
@@ -152,3 +162,41 @@ class BusinessClosure(models.Model):
 
     def __str__(self):
         return f"{self.date}: {self.reason or 'Fechado'}"
+
+
+class ResourcePool(models.Model):
+    """
+    Grupo de recursos equivalentes (ex.: mesas de tosa, boxes de banho).
+    A capacidade por horário é o número de recursos ativos do grupo.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name='Nome')
+    is_active = models.BooleanField(default=True, verbose_name='Ativo')
+
+    class Meta:
+        verbose_name = 'Grupo de Recursos'
+        verbose_name_plural = 'Grupos de Recursos'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Resource(models.Model):
+    """Recurso físico que atende um agendamento por vez (mesa, box, profissional)."""
+    pool = models.ForeignKey(
+        ResourcePool,
+        on_delete=models.CASCADE,
+        related_name='resources',
+        verbose_name='Grupo'
+    )
+    name = models.CharField(max_length=100, verbose_name='Nome')
+    is_active = models.BooleanField(default=True, verbose_name='Ativo')
+
+    class Meta:
+        verbose_name = 'Recurso'
+        verbose_name_plural = 'Recursos'
+        ordering = ['pool', 'name']
+        unique_together = [('pool', 'name')]
+
+    def __str__(self):
+        return f"{self.pool.name}: {self.name}"
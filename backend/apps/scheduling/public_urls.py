@@ -8,6 +8,7 @@ urlpatterns = [
     path('check-cpf/', public_views.check_cpf),
     path('register/', public_views.register_client_pet),
     path('available-slots/', public_views.available_slots),
+    path('availability/', public_views.availability),
     path('appointments/', public_views.create_appointment),
     path('services/', public_views.list_services),
     path('my-appointments/', public_views.my_appointments),
@@ -19,7 +19,8 @@ from apps.services.serializers import ServiceSerializer
 
 from .models import Appointment
 from .serializers import AppointmentSerializer
-from .services.availability import get_available_slots, get_business_hours_metadata
+from .services.availability import get_available_slots
+from .services.availability_cache import cached_business_hours_metadata, cached_slots_range
 from .services.booking import create_booking
 
 
@@ -137,11 +138,69 @@ def available_slots(request):
         )
     exclude_id = request.query_params.get('exclude_appointment_id')
     exclude_id = int(exclude_id) if exclude_id else None
-    slots = get_available_slots(int(service_id), target_date, exclude_appointment_id=exclude_id)
-    meta = get_business_hours_metadata()
+    if exclude_id:
+        slots = get_available_slots(int(service_id), target_date, exclude_appointment_id=exclude_id)
+    else:
+        service = Service.objects.filter(pk=int(service_id), is_active=True).only(
+            'duration_minutes', 'resource_pool_id',
+        ).first()
+        slots = cached_slots_range(
+            service.duration_minutes, target_date, target_date, service.resource_pool_id,
+        )[target_date] if service else []
+    meta = cached_business_hours_metadata()
     return Response({'slots': slots, 'meta': meta})
 
 
+AVAILABILITY_MAX_DAYS = 62
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def availability(request):
+    """
+    GET /api/public/booking/availability?service_id=1&from=2026-02-01&to=2026-02-28
+    Response: {"service_id": 1, "from": "...", "to": "...",
+               "days": {"2026-02-01": ["08:00", ...], ...}, "meta": {...}}
+    Até 62 dias por requisição; resultados em cache por (data, duração, grupo de recursos).
+    """
+    service_id = request.query_params.get('service_id')
+    from_str = request.query_params.get('from')
+    to_str = request.query_params.get('to') or from_str
+    if not service_id or not from_str:
+        return Response(
+            {'detail': 'service_id e from são obrigatórios.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        from datetime import date
+        start_date = date.fromisoformat(from_str)
+        end_date = date.fromisoformat(to_str)
+    except (ValueError, TypeError):
+        return Response(
+            {'detail': 'Data inválida. Use formato YYYY-MM-DD.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if end_date < start_date:
+        return Response({'detail': 'to deve ser maior ou igual a from.'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end_date - start_date).days + 1 > AVAILABILITY_MAX_DAYS:
+        return Response(
+            {'detail': f'Período máximo de {AVAILABILITY_MAX_DAYS} dias.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        service = Service.objects.only('duration_minutes', 'resource_pool_id').get(pk=int(service_id), is_active=True)
+    except (Service.DoesNotExist, ValueError):
+        return Response({'detail': 'Serviço não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    days = cached_slots_range(service.duration_minutes, start_date, end_date, service.resource_pool_id)
+    return Response({
+        'service_id': service.id,
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'days': {d.isoformat(): slots for d, slots in days.items()},
+        'meta': cached_business_hours_metadata(),
+    })
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_appointment(request):
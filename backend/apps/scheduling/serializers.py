@@ -1,9 +1,12 @@
 """
 Scheduling serializers
 """
+from django.db import transaction
 from rest_framework import serializers
 from .models import Appointment, BusinessHoursConfig, BusinessHoursRule, BusinessClosure
 from .services.availability import get_available_slots, _is_date_closed, _get_rule_for_weekday
+from .services.availability import _get_tz
+from .services.booking import assign_resource, lock_booking_day
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -15,17 +18,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     created_by_name = serializers.SerializerMethodField()
     created_via_display = serializers.CharField(source='get_created_via_display', read_only=True)
+    resource_name = serializers.CharField(source='resource.name', read_only=True, default=None)
     
     class Meta:
         model = Appointment
         fields = [
             'id', 'client', 'client_name', 'pet', 'pet_name',
-            'service', 'service_name', 'service_price',
+            'service', 'service_name', 'service_price', 'resource', 'resource_name',
             'scheduled_date', 'start_at', 'end_at', 'status', 'status_display',
             'observations', 'created_via', 'created_via_display',
             'created_at', 'updated_at', 'created_by', 'created_by_name'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'start_at', 'end_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'start_at', 'end_at', 'resource']
 
     def get_created_by_name(self, obj):
         return obj.created_by.username if obj.created_by else None
@@ -70,7 +74,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if scheduled and service:
             validated_data['start_at'] = scheduled
             validated_data['end_at'] = scheduled + timedelta(minutes=service.duration_minutes)
-        return super().create(validated_data)
+        with transaction.atomic():
+            self._assign_resource(validated_data, service)
+            return super().create(validated_data)
 
     def update(self, instance, validated_data):
         from datetime import timedelta
@@ -79,7 +85,33 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if scheduled and service:
             validated_data['start_at'] = scheduled
             validated_data['end_at'] = scheduled + timedelta(minutes=service.duration_minutes)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            if 'scheduled_date' in validated_data or 'service' in validated_data:
+                self._assign_resource(validated_data, service, exclude_id=instance.pk)
+            return super().update(instance, validated_data)
+
+    def _assign_resource(self, validated_data, service, exclude_id=None):
+        """
+        Sob o lock de reserva do dia, confirma o horário (validate() roda fora da
+        transação) e atribui um recurso livre do grupo do serviço.
+        """
+        if not service or 'start_at' not in validated_data:
+            return
+        start_at = validated_data['start_at']
+        local_start = start_at.astimezone(_get_tz()) if start_at.tzinfo else start_at
+        day_locked = lock_booking_day(local_start.date(), service.resource_pool_id)
+        time_str = local_start.strftime('%H:%M')
+        if time_str not in get_available_slots(service.id, local_start.date(), exclude_appointment_id=exclude_id):
+            raise serializers.ValidationError({
+                'scheduled_date': f'Horário {time_str} não disponível para esta data.'
+            })
+        try:
+            validated_data['resource'] = assign_resource(
+                service, validated_data['start_at'], validated_data['end_at'],
+                exclude_appointment_id=exclude_id, day_locked=day_locked,
+            )
+        except ValueError as e:
+            raise serializers.ValidationError({'scheduled_date': str(e)})
 
 
 class BusinessHoursRuleSerializer(serializers.ModelSerializer):
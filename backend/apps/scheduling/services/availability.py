@@ -3,12 +3,12 @@ Serviço de disponibilidade de horários para agendamento.
 Timezone: America/Fortaleza
 """
 from datetime import date, time, datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pytz
 from django.db.models import Q
 
-from ..models import Appointment, BusinessHoursConfig, BusinessHoursRule, BusinessClosure
+from ..models import Appointment, BusinessHoursConfig, BusinessHoursRule, BusinessClosure, Resource
 from apps.services.models import Service
 
 
@@ -55,10 +55,6 @@ def _get_open_slots_for_day(
     close_dt = datetime.combine(target_date, close_time)
     delta = timedelta(minutes=slot_minutes)
 
-    if break_start and break_end:
-        break_start_dt = datetime.combine(target_date, break_start)
-        break_end_dt = datetime.combine(target_date, break_end)
-
     while current + delta <= close_dt:
         slot_time = current.time()
         # Excluir slots que se sobrepõem à pausa
@@ -73,98 +69,221 @@ def _get_open_slots_for_day(
     return slots
 
 
-def get_available_slots(
-    service_id: int,
-    target_date: date,
-    exclude_appointment_id: Optional[int] = None,
-) -> List[str]:
+def _to_local_naive(value: datetime, tz) -> datetime:
+    """Converte para o horário local (naive) do pet shop."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(tz).replace(tzinfo=None)
+
+
+def pool_appointments(qs, resource_pool_id: Optional[int]):
     """
-    Retorna horários disponíveis (strings HH:MM) para um serviço em uma data.
-    Considera:
-    - Dias da semana abertos
-    - Horário de funcionamento
-    - Pausa/intervalo
-    - Feriados/fechamentos
-    - Conflitos com agendamentos existentes (considerando duração do serviço)
+    Restringe agendamentos aos que ocupam o grupo de recursos: o do recurso
+    atribuído ou, sem recurso, o do serviço. None = agenda única da loja
+    (agendamentos sem grupo).
     """
-    try:
-        service = Service.objects.get(pk=service_id, is_active=True)
-    except Service.DoesNotExist:
-        return []
+    if resource_pool_id is None:
+        return qs.filter(resource__isnull=True, service__resource_pool__isnull=True)
+    return qs.filter(
+        Q(resource__pool_id=resource_pool_id)
+        | Q(resource__isnull=True, service__resource_pool_id=resource_pool_id)
+    )
 
-    config = _get_config()
-    slot_minutes = config.slot_minutes if config else 30
-    duration_minutes = service.duration_minutes
 
-    weekday = target_date.weekday()  # 0=Segunda, 6=Domingo
-    rule = _get_rule_for_weekday(weekday)
+def pool_resource_ids(resource_pool_id: Optional[int]) -> List[Optional[int]]:
+    """
+    Ids dos recursos ativos do grupo, em ordem de id. A agenda única da loja
+    (sem grupo) é um único recurso anônimo: [None].
+    """
+    if resource_pool_id is None:
+        return [None]
+    return list(
+        Resource.objects.filter(pool_id=resource_pool_id, pool__is_active=True, is_active=True)
+        .order_by('pk').values_list('pk', flat=True)
+    )
 
-    if _is_date_closed(target_date):
-        return []
 
-    if not rule or not rule.is_open or not rule.open_time or not rule.close_time:
-        return []
+def free_resources(resource_ids, appointments, start: datetime, end: datetime) -> list:
+    """
+    Recursos de resource_ids livres em [start, end), na mesma ordem.
+    appointments: (resource_id, início, fim) dos agendamentos do grupo. Um
+    agendamento com recurso ocupa só o seu recurso; um sem recurso (agenda
+    única ou agendamento antigo do grupo) ocupa um recurso qualquer e consome
+    o primeiro livre. Mesma regra na disponibilidade e em assign_resource.
+    """
+    taken = set()
+    unassigned = 0
+    for resource_id, apt_start, apt_end in appointments:
+        if apt_start < end and apt_end > start:
+            if resource_id is None:
+                unassigned += 1
+            else:
+                taken.add(resource_id)
+    free = [pk for pk in resource_ids if pk not in taken]
+    return free[unassigned:]
+
+
+def _load_busy_intervals(
+    start_date: date,
+    end_date: date,
+    tz,
+    exclude_appointment_id: Optional[int] = None,
+    resource_pool_id: Optional[int] = None,
+) -> Dict[date, List[Tuple[Optional[int], datetime, datetime]]]:
+    """
+    Agendamentos ativos do grupo entre start_date e end_date (uma única query),
+    em horário local naive, ordenados por início e agrupados por dia:
+    {data: [(resource_id, início, fim), ...]}. Um agendamento que atravessa a
+    meia-noite entra nos dois dias.
+    """
+    range_start = tz.localize(datetime.combine(start_date, time.min))
+    range_end = tz.localize(datetime.combine(end_date + timedelta(days=1), time.min))
+    qs = Appointment.objects.filter(
+        start_at__lt=range_end, end_at__gt=range_start,
+    ).exclude(status__in=['cancelled', 'no_show'])
+    qs = pool_appointments(qs, resource_pool_id)
+    if exclude_appointment_id:
+        qs = qs.exclude(pk=exclude_appointment_id)
 
-    all_slots = _get_open_slots_for_day(
-        target_date,
-        slot_minutes,
-        rule.open_time,
-        rule.close_time,
-        rule.break_start,
-        rule.break_end,
+    intervals = sorted(
+        ((resource_id, _to_local_naive(s, tz), _to_local_naive(e, tz))
+         for resource_id, s, e in qs.values_list('resource_id', 'start_at', 'end_at')),
+        key=lambda apt: (apt[1], apt[2]),
     )
+    by_day: Dict[date, List[Tuple[Optional[int], datetime, datetime]]] = {}
+    for apt in intervals:
+        day = apt[1].date()
+        while day <= apt[2].date() and day <= end_date:
+            by_day.setdefault(day, []).append(apt)
+            day += timedelta(days=1)
+    return by_day
 
-    tz = _get_tz()
-    # Horários em que o serviço terminaria (start + duration)
-    # Um slot é válido se start + duration <= próximo slot ou close_time
-    service_slots_needed = max(1, (duration_minutes + slot_minutes - 1) // slot_minutes)
 
-    # Buscar agendamentos do dia (não cancelados, não no_show)
-    busy_qs = Appointment.objects.filter(
-        start_at__date=target_date,
-    ).exclude(status__in=['cancelled', 'no_show'])
-    if exclude_appointment_id:
-        busy_qs = busy_qs.exclude(pk=exclude_appointment_id)
-    busy_appointments = busy_qs
+def _sweep_day(
+    target_date: date,
+    rule: BusinessHoursRule,
+    slot_minutes: int,
+    duration_minutes: int,
+    resource_ids: List[Optional[int]],
+    busy: List[Tuple[Optional[int], datetime, datetime]],
+) -> List[str]:
+    """
+    Varre os slots do dia em uma única passada sobre os agendamentos (ordenados
+    por início): como os slots crescem, o ponteiro só avança e só os
+    agendamentos ainda em curso são comparados. O slot está livre se algum
+    recurso fica livre durante toda a duração (free_resources), e precisa caber
+    inteiro (duração do serviço e do próprio slot) antes do fechamento e fora
+    da pausa.
+    """
+    step = timedelta(minutes=slot_minutes)
+    duration = timedelta(minutes=duration_minutes)
+    footprint = max(step, duration)
+    current = datetime.combine(target_date, rule.open_time)
+    close_dt = datetime.combine(target_date, rule.close_time)
+    has_break = bool(rule.break_start and rule.break_end)
+    if has_break:
+        break_start_dt = datetime.combine(target_date, rule.break_start)
+        break_end_dt = datetime.combine(target_date, rule.break_end)
 
     available = []
-    for slot_time in all_slots:
-        slot_start = datetime.combine(target_date, slot_time).replace(tzinfo=tz)
-        slot_end = slot_start + timedelta(minutes=duration_minutes)
-
-        # Verificar se cabe no horário de fechamento
-        close_dt = datetime.combine(target_date, rule.close_time).replace(tzinfo=tz)
-        if slot_end > close_dt:
+    active = []
+    idx, n = 0, len(busy)
+    while current + footprint <= close_dt:
+        if has_break and current < break_end_dt and current + footprint > break_start_dt:
+            current += step
             continue
+        slot_end = current + duration
+        while idx < n and busy[idx][1] < slot_end:
+            active.append(busy[idx])
+            idx += 1
+        active = [apt for apt in active if apt[2] > current]
+        if free_resources(resource_ids, active, current, slot_end):
+            available.append(current.strftime('%H:%M'))
+        current += step
+    return available
 
-        # Verificar pausa
-        if rule.break_start and rule.break_end:
-            break_start_dt = datetime.combine(target_date, rule.break_start).replace(tzinfo=tz)
-            break_end_dt = datetime.combine(target_date, rule.break_end).replace(tzinfo=tz)
-            if slot_start < break_end_dt and slot_end > break_start_dt:
-                continue
 
-        # Verificar conflito com agendamentos
-        has_conflict = False
-        for apt in busy_appointments:
-            apt_start = apt.start_at
-            apt_end = apt.end_at
-            if apt_start.tzinfo is None and hasattr(apt_start, 'replace'):
-                apt_start = tz.localize(apt_start.replace(tzinfo=None))
-            elif apt_start.tzinfo:
-                apt_start = apt_start.astimezone(tz)
-            if apt_end.tzinfo is None and hasattr(apt_end, 'replace'):
-                apt_end = tz.localize(apt_end.replace(tzinfo=None))
-            elif apt_end.tzinfo:
-                apt_end = apt_end.astimezone(tz)
-            if slot_start < apt_end and slot_end > apt_start:
-                has_conflict = True
-                break
-
-        if not has_conflict:
-            available.append(slot_time.strftime('%H:%M'))
+def get_available_slots_range(
+    service_id: int,
+    start_date: date,
+    end_date: date,
+    exclude_appointment_id: Optional[int] = None,
+) -> Dict[date, List[str]]:
+    """
+    Horários disponíveis (HH:MM) por data, de start_date a end_date (inclusive),
+    para um serviço. Configuração, regras, fechamentos e agendamentos do período
+    são lidos uma vez, independentemente do número de dias.
+    """
+    service = Service.objects.filter(pk=service_id, is_active=True).only(
+        'duration_minutes', 'resource_pool_id',
+    ).first()
+    if not service:
+        return {d: [] for d in _date_span(start_date, end_date)}
+    return get_available_slots_for_duration(
+        service.duration_minutes, start_date, end_date,
+        exclude_appointment_id=exclude_appointment_id,
+        resource_pool_id=service.resource_pool_id,
+    )
 
-    return available
+
+def _date_span(start_date: date, end_date: date) -> List[date]:
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def get_available_slots_for_duration(
+    duration_minutes: int,
+    start_date: date,
+    end_date: date,
+    exclude_appointment_id: Optional[int] = None,
+    resource_pool_id: Optional[int] = None,
+) -> Dict[date, List[str]]:
+    """
+    Como get_available_slots_range, para duração e grupo de recursos já conhecidos.
+    Um slot está livre se algum recurso ativo do grupo não tem agendamento no
+    intervalo (ver free_resources).
+    """
+    days = _date_span(start_date, end_date)
+    resource_ids = pool_resource_ids(resource_pool_id)
+    config = BusinessHoursConfig.objects.prefetch_related('rules').first()
+    if not config or not days or not resource_ids:
+        return {d: [] for d in days}
+    rules = {r.weekday: r for r in config.rules.all()}
+    tz = pytz.timezone(config.timezone or 'America/Fortaleza')
+
+    closed = set(BusinessClosure.objects.filter(
+        date__gte=start_date, date__lte=end_date,
+    ).values_list('date', flat=True))
+    busy = _load_busy_intervals(start_date, end_date, tz, exclude_appointment_id, resource_pool_id)
+
+    result = {}
+    for day in days:
+        rule = rules.get(day.weekday())
+        if day in closed or not rule or not rule.is_open or not rule.open_time or not rule.close_time:
+            result[day] = []
+            continue
+        result[day] = _sweep_day(
+            day, rule, config.slot_minutes, duration_minutes, resource_ids, busy.get(day, []),
+        )
+    return result
+
+
+def get_available_slots(
+    service_id: int,
+    target_date: date,
+    exclude_appointment_id: Optional[int] = None,
+) -> List[str]:
+    """
+    Retorna horários disponíveis (strings HH:MM) para um serviço em uma data.
+    Considera:
+    - Dias da semana abertos
+    - Horário de funcionamento
+    - Pausa/intervalo
+    - Feriados/fechamentos
+    - Conflitos com agendamentos existentes (considerando duração do serviço)
+    """
+    return get_available_slots_range(
+        service_id, target_date, target_date, exclude_appointment_id=exclude_appointment_id,
+    )[target_date]
 
 
 def get_business_hours_metadata() -> dict:
@@ -0,0 +1,100 @@
+"""
+Cache da disponibilidade pública de horários.
+
+Entradas por (data, duração do serviço, grupo de recursos). Cada data tem um contador de versão
+e há um contador global; as chaves das entradas embutem as versões, então
+invalidar é só incrementar um contador:
+- Appointment / BusinessClosure alterados -> versão das datas afetadas;
+- BusinessHoursRule / BusinessHoursConfig, recursos, grupos e serviços
+  alterados -> versão global.
+Os incrementos acontecem após o commit (ver signals.py), para que uma leitura
+concorrente não grave no cache o estado anterior com a versão nova.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .availability import get_available_slots_for_duration, get_business_hours_metadata
+
+PREFIX = 'sched-avail'
+GLOBAL_VERSION_KEY = f'{PREFIX}:v:global'
+
+
+def _ttl():
+    return getattr(settings, 'SCHEDULING_AVAILABILITY_CACHE_TTL', 60 * 60)
+
+
+def _date_version_key(day: date) -> str:
+    return f'{PREFIX}:v:{day.isoformat()}'
+
+
+def _bump(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def invalidate_dates(days: Iterable[date]):
+    """Invalida as entradas das datas informadas (todas as durações)."""
+    for day in set(days):
+        _bump(_date_version_key(day))
+
+
+def invalidate_all():
+    """Invalida toda a disponibilidade e os metadados de horário."""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def local_dates(start_at: Optional[datetime], end_at: Optional[datetime], tz) -> List[date]:
+    """Datas locais cobertas pelo intervalo [start_at, end_at]."""
+    if not start_at:
+        return []
+    first = start_at.astimezone(tz).date() if start_at.tzinfo else start_at.date()
+    last = first
+    if end_at:
+        last = end_at.astimezone(tz).date() if end_at.tzinfo else end_at.date()
+    return [first + timedelta(days=i) for i in range(max((last - first).days, 0) + 1)]
+
+
+def cached_slots_range(
+    duration_minutes: int,
+    start_date: date,
+    end_date: date,
+    resource_pool_id: Optional[int] = None,
+) -> Dict[date, List[str]]:
+    """
+    Disponibilidade por data vinda do cache; os dias ausentes são calculados
+    de uma vez (do primeiro ao último dia faltante) e gravados.
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    version_keys = [GLOBAL_VERSION_KEY] + [_date_version_key(d) for d in days]
+    versions = cache.get_many(version_keys)
+    global_v = versions.get(GLOBAL_VERSION_KEY, 0)
+    entry_keys = {
+        d: f'{PREFIX}:{global_v}:{versions.get(_date_version_key(d), 0)}:{d.isoformat()}:{duration_minutes}:{resource_pool_id or 0}'
+        for d in days
+    }
+    hits = cache.get_many(list(entry_keys.values()))
+    result = {d: hits[k] for d, k in entry_keys.items() if k in hits}
+    missing = [d for d in days if d not in result]
+    if missing:
+        computed = get_available_slots_for_duration(
+            duration_minutes, missing[0], missing[-1], resource_pool_id=resource_pool_id,
+        )
+        cache.set_many({entry_keys[d]: computed[d] for d in missing}, _ttl())
+        result.update((d, computed[d]) for d in missing)
+    return {d: result[d] for d in days}
+
+
+def cached_business_hours_metadata() -> dict:
+    """get_business_hours_metadata() em cache, invalidado junto com a versão global."""
+    key = f'{PREFIX}:meta:{cache.get(GLOBAL_VERSION_KEY, 0)}'
+    meta = cache.get(key)
+    if meta is None:
+        meta = get_business_hours_metadata()
+        cache.set(key, meta, _ttl())
+    return meta
@@ -1,18 +1,94 @@
 """
 Serviço de criação de agendamentos com validação atômica.
+
+Verificar a disponibilidade e inserir o agendamento precisam acontecer sem que
+outra reserva do mesmo dia e grupo de recursos se intercale: lock_booking_day()
+pega um advisory lock de transação do PostgreSQL por (dia, grupo), liberado no
+commit/rollback. Reservas de dias ou grupos diferentes não se bloqueiam: nem o
+serviço nem os recursos do grupo são travados com FOR UPDATE no PostgreSQL.
+Em outros bancos o fallback é travar as linhas dos recursos do grupo.
 """
+import zlib
 from datetime import datetime, date, time, timedelta
 
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
 
-from ..models import Appointment
-from ..services.availability import get_available_slots, _get_config
+from ..models import Appointment, Resource
+from ..services.availability import free_resources, get_available_slots, pool_appointments, _get_config
 from apps.services.models import Service
 from apps.clients.models import Client
 from apps.pets.models import Pet
 
 
+# Primeiro argumento de pg_advisory_xact_lock(int, int): separa estes locks de outros usos
+BOOKING_LOCK_NAMESPACE = 0x5343  # 'SC'
+
+
+def booking_lock_key(target_date: date, resource_pool_id=None) -> int:
+    """Chave int4 (com sinal) do lock de reserva para (dia, grupo)."""
+    key = zlib.crc32(f'{target_date.isoformat()}:{resource_pool_id or 0}'.encode())
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+def lock_booking_day(target_date: date, resource_pool_id=None):
+    """
+    Serializa reservas do mesmo dia e grupo de recursos até o fim da transação
+    corrente. Em bancos sem advisory locks (SQLite em desenvolvimento) não faz nada
+    e retorna False; retorna True quando o lock foi obtido.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, %s)',
+            [BOOKING_LOCK_NAMESPACE, booking_lock_key(target_date, resource_pool_id)],
+        )
+    return True
+
+
+def lock_pool_resources(resource_pool_id, day_locked=False):
+    """
+    Recursos ativos do grupo, em ordem de id. Com o lock do dia já obtido
+    (day_locked) apenas lê; sem ele, trava as linhas com select_for_update, o
+    que serializa as reservas do grupo em qualquer data.
+    """
+    if not resource_pool_id:
+        return []
+    qs = Resource.objects.filter(pool_id=resource_pool_id, pool__is_active=True, is_active=True)
+    if not day_locked:
+        qs = qs.select_for_update()
+    return list(qs.order_by('pk'))
+
+
+def assign_resource(service, start_at, end_at, exclude_appointment_id=None, resources=None, day_locked=False):
+    """
+    Escolhe um recurso do grupo do serviço livre em [start_at, end_at), com a
+    mesma regra da disponibilidade (free_resources): agendamentos do grupo sem
+    recurso também ocupam um recurso. Deve rodar dentro de uma transação, após
+    lock_booking_day(); day_locked é o retorno dele. Sem resources, carrega os
+    recursos do grupo (travando-os só se o dia não estiver travado). Retorna
+    None para serviços sem grupo.
+    Raises ValueError se nenhum recurso estiver livre.
+    """
+    if not service.resource_pool_id:
+        return None
+    if resources is None:
+        resources = lock_pool_resources(service.resource_pool_id, day_locked)
+    busy_qs = pool_appointments(
+        Appointment.objects.filter(start_at__lt=end_at, end_at__gt=start_at),
+        service.resource_pool_id,
+    ).exclude(status__in=['cancelled', 'no_show'])
+    if exclude_appointment_id:
+        busy_qs = busy_qs.exclude(pk=exclude_appointment_id)
+    free = free_resources(
+        [r.pk for r in resources], busy_qs.values_list('resource_id', 'start_at', 'end_at'), start_at, end_at,
+    )
+    if not free:
+        raise ValueError('Nenhum recurso livre para este horário.')
+    return next(r for r in resources if r.pk == free[0])
+
+
 def create_booking(
     client_id: int,
     pet_id: int,
@@ -41,7 +117,7 @@ def create_booking(
         except Pet.DoesNotExist:
             raise ValueError('Animal não encontrado ou não pertence ao cliente.')
         try:
-            service = Service.objects.select_for_update().get(pk=service_id, is_active=True)
+            service = Service.objects.get(pk=service_id, is_active=True)
         except Service.DoesNotExist:
             raise ValueError('Serviço não encontrado.')
 
@@ -57,6 +133,9 @@ def create_booking(
         except (ValueError, TypeError, IndexError):
             raise ValueError('Horário inválido.')
 
+        # PostgreSQL: só o lock de (dia, grupo); demais bancos: linhas dos recursos
+        day_locked = lock_booking_day(target_date, service.resource_pool_id)
+        pool_resources = lock_pool_resources(service.resource_pool_id, day_locked)
         available = get_available_slots(service_id, target_date)
         time_formatted = slot_time.strftime('%H:%M')
         if time_formatted not in available:
@@ -65,11 +144,16 @@ def create_booking(
         start_at_naive = datetime.combine(target_date, slot_time)
         start_at = timezone.make_aware(start_at_naive)
         end_at = start_at + timedelta(minutes=service.duration_minutes)
+        try:
+            resource = assign_resource(service, start_at, end_at, resources=pool_resources)
+        except ValueError:
+            raise ValueError(f'Horário {time_formatted} não está disponível para esta data.')
 
         apt = Appointment(
             client=client,
             pet=pet,
             service=service,
+            resource=resource,
             scheduled_date=start_at,
             start_at=start_at,
             end_at=end_at,
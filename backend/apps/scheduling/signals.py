@@ -0,0 +1,67 @@
+"""
+Signals que invalidam o cache de disponibilidade (services/availability_cache.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.services.models import Service
+from .models import (
+    Appointment, BusinessClosure, BusinessHoursConfig, BusinessHoursRule, Resource, ResourcePool,
+)
+from .services import availability_cache
+from .services.availability import _get_tz
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_interval(sender, instance, raw=False, **kwargs):
+    """Guarda o intervalo anterior para invalidar também a data de origem em remarcações."""
+    instance._availability_previous = None
+    if instance.pk and not raw:
+        instance._availability_previous = (
+            Appointment.objects.filter(pk=instance.pk).values_list('start_at', 'end_at').first()
+        )
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_dates(sender, instance, **kwargs):
+    tz = _get_tz()
+    days = availability_cache.local_dates(instance.start_at, instance.end_at, tz)
+    previous = getattr(instance, '_availability_previous', None)
+    if previous:
+        days += availability_cache.local_dates(previous[0], previous[1], tz)
+    transaction.on_commit(lambda: availability_cache.invalidate_dates(days))
+
+
+@receiver(pre_save, sender=BusinessClosure)
+def remember_closure_date(sender, instance, raw=False, **kwargs):
+    instance._availability_previous = None
+    if instance.pk and not raw:
+        instance._availability_previous = (
+            BusinessClosure.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=BusinessClosure)
+@receiver(post_delete, sender=BusinessClosure)
+def invalidate_closure_date(sender, instance, **kwargs):
+    days = [instance.date]
+    previous = getattr(instance, '_availability_previous', None)
+    if previous:
+        days.append(previous)
+    transaction.on_commit(lambda: availability_cache.invalidate_dates(days))
+
+
+@receiver(post_save, sender=BusinessHoursRule)
+@receiver(post_delete, sender=BusinessHoursRule)
+@receiver(post_save, sender=BusinessHoursConfig)
+@receiver(post_delete, sender=BusinessHoursConfig)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(post_save, sender=ResourcePool)
+@receiver(post_delete, sender=ResourcePool)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_schedule_setup(sender, instance, **kwargs):
+    transaction.on_commit(availability_cache.invalidate_all)
@@ -0,0 +1,228 @@
+"""
+Scheduling tests (disponibilidade de horários).
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import pytz
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.clients.models import Client
+from apps.pets.models import Pet
+from apps.services.models import Service
+from .models import (
+    Appointment, BusinessClosure, BusinessHoursConfig, BusinessHoursRule, Resource, ResourcePool,
+)
+from .checks import check_shared_cache
+from .services import availability_cache
+from .services.availability import get_available_slots, get_available_slots_range
+from .services.booking import booking_lock_key, create_booking
+
+TZ = pytz.timezone('America/Fortaleza')
+MONDAY = date(2030, 1, 7)
+
+
+class SchedulingFixtureMixin:
+    """Seg-Sex 08:00-12:00 com pausa 10:00-10:30, slots de 30 min."""
+
+    def setUp(self):
+        config = BusinessHoursConfig.objects.create(slot_minutes=30, timezone='America/Fortaleza')
+        for weekday in range(7):
+            BusinessHoursRule.objects.create(
+                config=config, weekday=weekday, is_open=weekday < 5,
+                open_time=time(8, 0), close_time=time(12, 0),
+                break_start=time(10, 0), break_end=time(10, 30),
+            )
+        self.service = Service.objects.create(name='Banho', price=Decimal('50'), duration_minutes=60)
+        self.client_obj = Client.objects.create(
+            name='Maria', document_type='cpf', document='12345678901', phone='11999999999',
+        )
+        self.pet = Pet.objects.create(client=self.client_obj, name='Rex', species='dog')
+
+    def _appointment(self, day, hour, minute=0, minutes=60, status='scheduled', resource=None):
+        start = TZ.localize(datetime.combine(day, time(hour, minute)))
+        return Appointment.objects.create(
+            client=self.client_obj, pet=self.pet, service=self.service, resource=resource,
+            start_at=start, end_at=start + timedelta(minutes=minutes), status=status,
+        )
+
+
+class AvailabilityTest(SchedulingFixtureMixin, TestCase):
+    """Varredura de slots sobre intervalos ocupados."""
+
+    def test_free_day_respects_break_and_close(self):
+        self.assertEqual(get_available_slots(self.service.id, MONDAY), ['08:00', '08:30', '09:00', '10:30', '11:00'])
+
+    def test_busy_intervals_block_overlapping_slots(self):
+        self._appointment(MONDAY, 8, 30)
+        self._appointment(MONDAY, 9, 0, minutes=30)  # sobrepõe o anterior: intervalos mesclados
+        self._appointment(MONDAY, 11, 0, status='cancelled')
+        self.assertEqual(get_available_slots(self.service.id, MONDAY), ['10:30', '11:00'])
+
+    def test_exclude_appointment(self):
+        apt = self._appointment(MONDAY, 8, 0)
+        self.assertNotIn('08:00', get_available_slots(self.service.id, MONDAY))
+        self.assertIn('08:00', get_available_slots(self.service.id, MONDAY, exclude_appointment_id=apt.pk))
+
+    def test_range_uses_constant_queries(self):
+        BusinessClosure.objects.create(date=MONDAY + timedelta(days=1), reason='Feriado')
+        self._appointment(MONDAY + timedelta(days=2), 8, 0)
+        with self.assertNumQueries(5):
+            result = get_available_slots_range(self.service.id, MONDAY, MONDAY + timedelta(days=13))
+        self.assertEqual(len(result), 14)
+        self.assertEqual(result[MONDAY + timedelta(days=1)], [])
+        self.assertEqual(result[MONDAY + timedelta(days=5)], [])  # sábado
+        self.assertEqual(result[MONDAY + timedelta(days=2)], ['09:00', '10:30', '11:00'])
+        self.assertEqual(result[MONDAY + timedelta(days=7)], result[MONDAY])
+
+
+class AvailabilityCacheTest(SchedulingFixtureMixin, TestCase):
+    """GET /api/public/booking/availability com cache invalidado por signals."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.api = APIClient()
+
+    def _get(self, start, end):
+        return self.api.get('/api/public/booking/availability/', {
+            'service_id': self.service.id, 'from': start.isoformat(), 'to': end.isoformat(),
+        })
+
+    def test_month_is_served_from_cache_until_appointment_changes(self):
+        end = MONDAY + timedelta(days=27)
+        first = self._get(MONDAY, end)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()['days']), 28)
+        self.assertIn('08:00', first.json()['days'][MONDAY.isoformat()])
+
+        with self.assertNumQueries(1):  # apenas o serviço
+            self.assertEqual(self._get(MONDAY, end).json(), first.json())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apt = self._appointment(MONDAY, 8, 0)
+        days = self._get(MONDAY, end).json()['days']
+        self.assertNotIn('08:00', days[MONDAY.isoformat()])
+        self.assertIn('08:00', days[(MONDAY + timedelta(days=7)).isoformat()])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apt.start_at += timedelta(days=7)
+            apt.end_at += timedelta(days=7)
+            apt.save()
+        days = self._get(MONDAY, end).json()['days']
+        self.assertIn('08:00', days[MONDAY.isoformat()])
+        self.assertNotIn('08:00', days[(MONDAY + timedelta(days=7)).isoformat()])
+
+    def test_business_hours_and_closure_invalidate(self):
+        self._get(MONDAY, MONDAY)
+        with self.captureOnCommitCallbacks(execute=True):
+            BusinessClosure.objects.create(date=MONDAY, reason='Feriado')
+        self.assertEqual(self._get(MONDAY, MONDAY).json()['days'][MONDAY.isoformat()], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            BusinessHoursRule.objects.filter(weekday=1).update(is_open=False)
+            BusinessHoursRule.objects.get(weekday=1).save()
+        tuesday = MONDAY + timedelta(days=1)
+        self.assertEqual(self._get(tuesday, tuesday).json()['days'][tuesday.isoformat()], [])
+
+    def test_service_delete_invalidates(self):
+        other = Service.objects.create(name='Hidratação', price=Decimal('30'), duration_minutes=60)
+        version = cache.get(availability_cache.GLOBAL_VERSION_KEY, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(cache.get(availability_cache.GLOBAL_VERSION_KEY), version + 1)
+
+    def test_production_requires_shared_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://x'}}
+        with self.settings(SCHEDULING_REQUIRE_SHARED_CACHE=True, CACHES=locmem):
+            self.assertEqual([e.id for e in check_shared_cache(None)], ['scheduling.E001'])
+        with self.settings(SCHEDULING_REQUIRE_SHARED_CACHE=True, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+        with self.settings(CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_range_validation(self):
+        self.assertEqual(self._get(MONDAY, MONDAY + timedelta(days=62)).status_code, 400)
+        self.assertEqual(self._get(MONDAY, MONDAY - timedelta(days=1)).status_code, 400)
+
+
+class ResourcePoolTest(SchedulingFixtureMixin, TestCase):
+    """Serviços com grupo de recursos: capacidade paralela por horário."""
+
+    def setUp(self):
+        super().setUp()
+        pool = ResourcePool.objects.create(name='Banho')
+        self.tub_a = Resource.objects.create(pool=pool, name='Box 1')
+        self.tub_b = Resource.objects.create(pool=pool, name='Box 2')
+        self.service.resource_pool = pool
+        self.service.save()
+        self.grooming = Service.objects.create(name='Tosa', price=Decimal('70'), duration_minutes=60)
+
+    def _book(self, slot, service=None):
+        return create_booking(
+            self.client_obj.id, self.pet.id, (service or self.service).id,
+            MONDAY.isoformat(), slot, created_via='admin',
+        )
+
+    def test_slot_stays_open_until_pool_is_full(self):
+        first = self._book('08:00')
+        self.assertIn('08:00', get_available_slots(self.service.id, MONDAY))
+        second = self._book('08:30')
+        self.assertEqual({first.resource, second.resource}, {self.tub_a, self.tub_b})
+        slots = get_available_slots(self.service.id, MONDAY)
+        self.assertNotIn('08:00', slots)
+        self.assertNotIn('08:30', slots)
+        self.assertIn('09:00', slots)  # box 1 libera às 09:00
+        with self.assertRaisesMessage(ValueError, 'Horário 08:30 não está disponível'):
+            self._book('08:30')
+
+    def test_pools_do_not_block_each_other(self):
+        self._book('08:00')
+        self._book('08:00')
+        self.assertIn('08:00', get_available_slots(self.grooming.id, MONDAY))
+        self._book('08:00', service=self.grooming)
+        self.assertIn('09:00', get_available_slots(self.service.id, MONDAY))
+        self.assertNotIn('08:00', get_available_slots(self.grooming.id, MONDAY))
+
+    def test_booking_lock_key_is_int4_per_day_and_pool(self):
+        keys = {booking_lock_key(MONDAY + timedelta(days=i), pool) for i in range(30) for pool in (None, 1, 2)}
+        self.assertEqual(len(keys), 90)
+        self.assertTrue(all(-2 ** 31 <= k < 2 ** 31 for k in keys))
+        self.assertEqual(booking_lock_key(MONDAY, None), booking_lock_key(MONDAY, 0))
+
+    def test_day_lock_replaces_row_locks(self):
+        # Com o advisory lock do dia (PostgreSQL) nenhuma linha é travada com FOR UPDATE
+        from django.db.models import QuerySet
+        with mock.patch('apps.scheduling.services.booking.lock_booking_day', return_value=True), \
+                mock.patch.object(QuerySet, 'select_for_update', side_effect=AssertionError('FOR UPDATE')):
+            self.assertIn(self._book('08:00').resource, {self.tub_a, self.tub_b})
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=lambda qs: qs) as locked:
+            self._book('08:00')
+        self.assertEqual([call.args[0].model for call in locked.call_args_list], [Resource])
+
+    def test_fragmented_pool_does_not_offer_unbookable_slot(self):
+        self._appointment(MONDAY, 8, 0, resource=self.tub_a)
+        self._appointment(MONDAY, 9, 0, resource=self.tub_b)
+        slots = get_available_slots(self.service.id, MONDAY)
+        self.assertNotIn('08:30', slots)  # nunca há mais de um ocupado, mas nenhum box fica livre 1h
+        self.assertIn('09:00', slots)
+        with self.assertRaisesMessage(ValueError, 'Horário 08:30 não está disponível'):
+            self._book('08:30')
+        self.assertEqual(self._book('09:00').resource, self.tub_a)
+
+    def test_unassigned_pool_appointment_takes_a_resource(self):
+        self._appointment(MONDAY, 8, 0)  # grupo do serviço, sem recurso atribuído
+        self.assertIn('08:00', get_available_slots(self.service.id, MONDAY))
+        self.assertEqual(self._book('08:00').resource, self.tub_b)
+        self.assertNotIn('08:00', get_available_slots(self.service.id, MONDAY))
+        with self.assertRaisesMessage(ValueError, 'Horário 08:00 não está disponível'):
+            self._book('08:00')
+
+    def test_inactive_resource_reduces_capacity(self):
+        self.tub_b.is_active = False
+        self.tub_b.save()
+        self._book('08:00')
+        self.assertNotIn('08:00', get_available_slots(self.service.id, MONDAY))
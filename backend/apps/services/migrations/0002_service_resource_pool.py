@@ -0,0 +1,20 @@
+# Service -> resource pool (capacity-aware scheduling)
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+        ('scheduling', '0005_resource_pools'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='resource_pool',
+            field=models.ForeignKey(blank=True, help_text='Sem grupo, o serviço usa a agenda única da loja (um atendimento por vez).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='services', to='scheduling.resourcepool', verbose_name='Grupo de recursos'),
+        ),
+    ]
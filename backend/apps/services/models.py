@@ -23,6 +23,15 @@ class Service(models.Model):
         validators=[MinValueValidator(1)],
         verbose_name='Duração (minutos)'
     )
+    resource_pool = models.ForeignKey(
+        'scheduling.ResourcePool',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='services',
+        verbose_name='Grupo de recursos',
+        help_text='Sem grupo, o serviço usa a agenda única da loja (um atendimento por vez).'
+    )
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
@@ -12,6 +12,6 @@ class ServiceSerializer(serializers.ModelSerializer):
         model = Service
         fields = [
             'id', 'name', 'description', 'price', 'duration_minutes',
-            'is_active', 'created_at', 'updated_at'
+            'resource_pool', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -1,13 +1,11 @@
 """
 Middleware que bloqueia requisições de escrita quando assinatura expirada.
 Regra: GET sempre permitido. POST/PUT/PATCH/DELETE bloqueados se trial expirado e status != ACTIVE.
+O estado da assinatura vem de state_cache (sem query no caminho de escrita).
 """
 import re
-from datetime import timedelta
 from django.http import JsonResponse
-from django.utils import timezone
-from apps.users.models import CompanySettings
-from .models import Subscription, SubscriptionStatus
+from . import state_cache
 
 
 # Rotas que sempre permitem escrita (independente da assinatura)
@@ -20,33 +18,14 @@ ALLOWED_PATHS = [
     r'^/api/subscription/webhook/?$',
     r'^/api/subscription/status/?$',  # GET já permitido; POST se existir
 ]
-ALLOWED_PATHS_RE = [re.compile(p) for p in ALLOWED_PATHS]
+ALLOWED_PATHS_RE = re.compile('|'.join(f'(?:{p})' for p in ALLOWED_PATHS))
 
 # Métodos considerados "leitura" - sempre permitidos
 READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
 
 
 def _path_allowed(path):
-    for pattern in ALLOWED_PATHS_RE:
-        if pattern.match(path):
-            return True
-    return False
-
-
-def _get_subscription():
-    """Obtém a assinatura da empresa (singleton). Cria trial se não existir."""
-    company = CompanySettings.objects.first()
-    if not company:
-        return None
-    sub, _ = Subscription.objects.get_or_create(
-        company=company,
-        defaults={
-            'status': SubscriptionStatus.TRIAL,
-            'trial_start': timezone.localdate(),
-            'trial_end': timezone.localdate() + timedelta(days=7),
-        }
-    )
-    return sub
+    return ALLOWED_PATHS_RE.match(path) is not None
 
 
 class SubscriptionMiddleware:
@@ -78,14 +57,11 @@ class SubscriptionMiddleware:
 
         # Verificar assinatura
         try:
-            sub = _get_subscription()
+            allowed = state_cache.can_write()
         except Exception:
             return self.get_response(request)
 
-        if not sub:
-            return self.get_response(request)
-
-        if sub.can_write:
+        if allowed:
             return self.get_response(request)
 
         # Bloqueado: trial expirado e não ativo
@@ -1,13 +1,14 @@
 """
-Signals para criar Subscription ao criar CompanySettings
+Signals para criar Subscription ao criar CompanySettings e invalidar o estado em cache
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 
 from apps.users.models import CompanySettings
 from .models import Subscription, Plan, SubscriptionStatus
+from . import state_cache
 
 
 @receiver(post_save, sender=CompanySettings)
@@ -26,3 +27,10 @@ def create_subscription_on_company_created(sender, instance, created, **kwargs):
                 'trial_end': trial_end,
             }
         )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_state(sender, instance, **kwargs):
+    """Assinatura alterada: descarta o estado usado pelo SubscriptionMiddleware."""
+    state_cache.invalidate()
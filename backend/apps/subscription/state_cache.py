@@ -0,0 +1,93 @@
+"""
+Estado da assinatura em cache para o SubscriptionMiddleware.
+
+Guarda só o que can_write precisa (status, trial_end, current_period_end) num
+dicionário local do processo e no cache do Django (Redis quando CACHE_URL está
+definido), com TTL curto (SUBSCRIPTION_STATE_CACHE_TTL). A data de hoje é
+comparada a cada requisição, então a virada do trial não depende do TTL.
+
+Invalidação: signals de Subscription (save/delete) e webhook do Mercado Pago,
+após o commit. Outros workers enxergam a mudança pelo cache compartilhado
+quando a cópia local expira (no máximo um TTL).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import CompanySettings
+
+from .models import Subscription, SubscriptionStatus
+
+CACHE_KEY = 'subscription-state'
+NO_COMPANY = {}  # sem CompanySettings: middleware libera a escrita
+
+_local = {'state': None, 'expires': 0.0}
+
+
+def _ttl():
+    return getattr(settings, 'SUBSCRIPTION_STATE_CACHE_TTL', 60)
+
+
+def get_subscription():
+    """Obtém a assinatura da empresa (singleton). Cria trial se não existir."""
+    company = CompanySettings.objects.first()
+    if not company:
+        return None
+    sub, _ = Subscription.objects.get_or_create(
+        company=company,
+        defaults={
+            'status': SubscriptionStatus.TRIAL,
+            'trial_start': timezone.localdate(),
+            'trial_end': timezone.localdate() + timedelta(days=7),
+        }
+    )
+    return sub
+
+
+def _load():
+    sub = get_subscription()
+    if sub is None:
+        return NO_COMPANY
+    return {
+        'status': sub.status,
+        'trial_end': sub.trial_end,
+        'current_period_end': sub.current_period_end,
+    }
+
+
+def state():
+    """Estado da assinatura: local do processo -> cache do Django -> banco."""
+    now = time.monotonic()
+    if _local['state'] is not None and now < _local['expires']:
+        return _local['state']
+    value = cache.get(CACHE_KEY)
+    if value is None:
+        value = _load()
+        cache.set(CACHE_KEY, value, _ttl())
+    _local['state'], _local['expires'] = value, now + _ttl()
+    return value
+
+
+def can_write():
+    """True se a assinatura permite escrita (ou se a empresa ainda não foi configurada)."""
+    value = state()
+    if not value:
+        return True
+    return Subscription(**value).can_write
+
+
+def invalidate():
+    """Descarta o estado (local e compartilhado) após o commit da transação corrente."""
+    def _clear():
+        reset()
+        cache.delete(CACHE_KEY)
+    transaction.on_commit(_clear)
+
+
+def reset():
+    """Descarta a cópia local do processo (testes)."""
+    _local['state'], _local['expires'] = None, 0.0
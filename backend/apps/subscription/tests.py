@@ -0,0 +1,67 @@
+"""
+Subscription tests (estado em cache do SubscriptionMiddleware).
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from apps.users.models import CompanySettings
+from . import state_cache
+from .middleware import SubscriptionMiddleware, _path_allowed
+from .models import Subscription, SubscriptionStatus
+
+
+class SubscriptionStateCacheTest(TestCase):
+
+    def setUp(self):
+        self._clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            company = CompanySettings.objects.create(name='Pet')
+        self.sub = Subscription.objects.get(company=company)
+        self.middleware = SubscriptionMiddleware(lambda request: HttpResponse('ok'))
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self._clear()
+
+    def _clear(self):
+        state_cache.reset()
+        cache.delete(state_cache.CACHE_KEY)
+
+    def _expire(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.trial_end = timezone.localdate() - timedelta(days=1)
+            self.sub.save()
+
+    def _post(self, path='/api/sales/sales/pdv/'):
+        return self.middleware(self.factory.post(path)).status_code
+
+    def test_write_path_hits_db_once_then_cache(self):
+        self._expire()
+        with self.assertNumQueries(2):
+            self.assertEqual(self._post(), 403)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._post(), 403)
+        state_cache.reset()  # outro worker: cópia local vazia, lê do cache compartilhado
+        with self.assertNumQueries(0):
+            self.assertEqual(self._post(), 403)
+
+    def test_subscription_save_invalidates_state(self):
+        self._expire()
+        self.assertEqual(self._post(), 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.status = SubscriptionStatus.ACTIVE
+            self.sub.current_period_end = timezone.localdate() + timedelta(days=30)
+            self.sub.save()
+        self.assertEqual(self._post(), 200)
+
+    def test_allowed_paths_single_regex(self):
+        self._expire()
+        self.assertTrue(_path_allowed('/api/auth/users/login/'))
+        self.assertTrue(_path_allowed('/api/subscription/webhook'))
+        self.assertFalse(_path_allowed('/api/subscription/webhook/extra'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._post('/api/subscription/pay/'), 200)
@@ -11,9 +11,9 @@ from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
 
-from apps.users.models import CompanySettings
 from .models import Subscription, SubscriptionStatus, Plan
 from .services import create_mercado_pago_preference
+from . import state_cache
 
 
 def _validate_mp_webhook_signature(request):
@@ -65,21 +65,6 @@ def _validate_mp_webhook_signature(request):
     return hmac.compare_digest(expected, v1_hash)
 
 
-def _get_subscription():
-    company = CompanySettings.objects.first()
-    if not company:
-        return None
-    sub, _ = Subscription.objects.get_or_create(
-        company=company,
-        defaults={
-            'status': SubscriptionStatus.TRIAL,
-            'trial_start': timezone.localdate(),
-            'trial_end': timezone.localdate() + timedelta(days=7),
-        }
-    )
-    return sub
-
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def subscription_status(request):
@@ -87,7 +72,7 @@ def subscription_status(request):
     GET /api/subscription/status
     Retorna status da assinatura: status, can_write, days_remaining_trial, plan, etc.
     """
-    sub = _get_subscription()
+    sub = state_cache.get_subscription()
     if not sub:
         return Response({
             'status': 'trial',
@@ -125,7 +110,7 @@ def subscription_pay(request):
     POST /api/subscription/pay
     Gera cobrança Mercado Pago e retorna init_point (URL para checkout).
     """
-    sub = _get_subscription()
+    sub = state_cache.get_subscription()
     if not sub:
         return Response(
             {'detail': 'Empresa não configurada.'},
@@ -197,5 +182,6 @@ def mp_webhook(request):
             'status', 'current_period_start', 'current_period_end',
             'mp_payment_id', 'updated_at'
         ])
+        state_cache.invalidate()
 
     return Response({'ok': True})
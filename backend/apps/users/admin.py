@@ -19,7 +19,7 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'role', 'custom_role', 'is_active', 'created_at')
     list_filter = ('role', 'is_active', 'is_staff', 'created_at')
     fieldsets = BaseUserAdmin.fieldsets + (
-        ('Informações Adicionais', {'fields': ('role', 'custom_role', 'phone')}),
+        ('Informações Adicionais', {'fields': ('role', 'custom_role', 'phone', 'badge_code')}),
     )
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Informações Adicionais', {'fields': ('role', 'custom_role', 'phone', 'email')}),
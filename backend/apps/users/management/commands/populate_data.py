@@ -58,6 +58,9 @@ class Command(BaseCommand):
         
         self.stdout.write('Creating sales...')
         self.create_sales()
+
+        from apps.reports.services.rollup import rebuild_all
+        rebuild_all()
         
         self.stdout.write(self.style.SUCCESS('\n✅ Database populated successfully!'))
 
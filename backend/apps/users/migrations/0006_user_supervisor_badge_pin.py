@@ -0,0 +1,23 @@
+# Migration: crachá e PIN de supervisor (autorização de cancelamento no PDV)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_must_change_password'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='badge_code',
+            field=models.CharField(blank=True, help_text='Código do crachá usado para autorizar operações de supervisor no PDV', max_length=32, null=True, unique=True, verbose_name='Crachá'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='supervisor_pin',
+            field=models.CharField(blank=True, default='', max_length=128, verbose_name='PIN de supervisor (hash)'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 """
 User models with RBAC support
 """
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
@@ -97,6 +98,20 @@ class User(AbstractUser):
         default=False,
         verbose_name='Alterar senha no próximo login'
     )
+    badge_code = models.CharField(
+        max_length=32,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Crachá',
+        help_text='Código do crachá usado para autorizar operações de supervisor no PDV'
+    )
+    supervisor_pin = models.CharField(
+        max_length=128,
+        blank=True,
+        default='',
+        verbose_name='PIN de supervisor (hash)'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
 
@@ -108,6 +123,16 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
+    def set_supervisor_pin(self, raw_pin):
+        """Grava o PIN de supervisor com o mesmo hasher das senhas (vazio remove o PIN)."""
+        self.supervisor_pin = make_password(raw_pin) if raw_pin else ''
+
+    def check_supervisor_pin(self, raw_pin):
+        if not self.supervisor_pin:
+            make_password(raw_pin)  # mesmo custo de um PIN cadastrado
+            return False
+        return check_password(raw_pin, self.supervisor_pin)
+
     @property
     def is_admin(self):
         """Acesso ao menu Administração: perfil built-in admin ou superuser/staff."""
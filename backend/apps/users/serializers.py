@@ -16,7 +16,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
             'full_name', 'role', 'role_display', 'phone', 'is_active',
-            'is_staff', 'is_superuser', 'must_change_password',
+            'is_staff', 'is_superuser', 'must_change_password', 'badge_code',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -52,18 +52,27 @@ class UserCreateSerializer(serializers.ModelSerializer):
 class UserUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating users"""
     password = serializers.CharField(write_only=True, required=False, validators=[validate_password])
+    supervisor_pin = serializers.RegexField(
+        r'^\d{4,8}$', write_only=True, required=False, allow_blank=True,
+        error_messages={'invalid': 'O PIN deve ter de 4 a 8 dígitos.'},
+    )
 
     class Meta:
         model = User
         fields = [
             'username', 'email', 'password', 'first_name',
-            'last_name', 'role', 'phone', 'is_active'
+            'last_name', 'role', 'phone', 'is_active',
+            'badge_code', 'supervisor_pin',
         ]
 
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
         if password:
             instance.set_password(password)
+        if 'supervisor_pin' in validated_data:
+            instance.set_supervisor_pin(validated_data.pop('supervisor_pin'))
+        if validated_data.get('badge_code') == '':
+            validated_data['badge_code'] = None
         return super().update(instance, validated_data)
 
 
@@ -0,0 +1,27 @@
+"""
+Utilitários dos comandos bench_* (dados sintéticos descartados e latência).
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Executa o bloco em uma transação desfeita ao final (não deixa dados no banco)."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+
+def percentile(timings, fraction):
+    """Percentil por posição (fraction=0.95 para o p95) de uma lista de tempos não vazia."""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
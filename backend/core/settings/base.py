@@ -4,6 +4,8 @@ Django settings for petshop project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
+from corsheaders.defaults import default_headers
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -164,6 +166,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# X-Terminal-Id: terminal do PDV ao qual o token de supervisor fica preso
+CORS_ALLOW_HEADERS = (*default_headers, 'x-terminal-id')
 
 # Spectacular Settings (Swagger)
 SPECTACULAR_SETTINGS = {
@@ -216,19 +220,99 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_ACKS_LATE = True
 CELERY_TASK_TIME_LIMIT = 120
 CELERY_TASK_SOFT_TIME_LIMIT = 90
+CELERY_TIMEZONE = TIME_ZONE  # crontab do Beat no horário da loja
 CELERY_BEAT_SCHEDULE = {
-    'fiscal-sync-nsu-daily': {
+    'fiscal-sync-nsu': {
         'task': 'apps.fiscal.tasks.sync_all_companies_by_nsu',
-        'schedule': 60 * 60 * 24,  # 24 horas
+        'schedule': 60 * 60,  # 1 hora; empresas em janela de bloqueio da SEFAZ são puladas
         'options': {'queue': 'default'},
         'kwargs': {'max_docs': 100},
     },
+    'sales-purge-idempotency-keys': {
+        'task': 'apps.sales.tasks.purge_expired_idempotency_keys',
+        'schedule': 60 * 60,  # 1 hora
+        'options': {'queue': 'default'},
+    },
+    'products-stock-snapshot-reconcile': {
+        'task': 'apps.products.tasks.snapshot_and_reconcile_stock',
+        'schedule': 60 * 60 * 24,  # 24 horas
+        'options': {'queue': 'default'},
+    },
+    # Vencidos: marcados à meia-noite do fuso da loja; leituras calculam o status no SQL
+    'sales-mark-overdue-installments': {
+        'task': 'apps.sales.tasks.mark_overdue_installments',
+        'schedule': crontab(hour=0, minute=1),
+        'options': {'queue': 'default'},
+    },
+    'payables-mark-overdue-bills': {
+        'task': 'apps.payables.tasks.mark_overdue_bills',
+        'schedule': crontab(hour=0, minute=1),
+        'options': {'queue': 'default'},
+    },
+    'reports-cash-flow-snapshot': {
+        'task': 'apps.reports.tasks.snapshot_cash_flow',
+        'schedule': crontab(hour=0, minute=10),
+        'options': {'queue': 'default'},
+    },
+    # Repara o rollup diário de vendas (falhas após o commit só vão para o log)
+    'reports-rebuild-recent-sales-rollup': {
+        'task': 'apps.reports.tasks.rebuild_recent_sales_rollup',
+        'schedule': crontab(hour=0, minute=20),
+        'options': {'queue': 'default'},
+    },
 }
 
+# Rollup de vendas: dias (até hoje) reconstruídos pelo Celery Beat toda madrugada
+SALES_ROLLUP_REBUILD_DAYS = config('SALES_ROLLUP_REBUILD_DAYS', default=7, cast=int)
+
+# Cache: Redis quando CACHE_URL estiver definido (ex.: redis://localhost:6379/1);
+# sem ele, cache em memória local de cada processo.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# PDV - Idempotency-Key: janela de replay (segundos) e cópia no cache do Django
+PDV_IDEMPOTENCY_TTL_SECONDS = config('PDV_IDEMPOTENCY_TTL_SECONDS', default=60 * 60 * 24, cast=int)
+PDV_IDEMPOTENCY_USE_CACHE = config('PDV_IDEMPOTENCY_USE_CACHE', default=True, cast=bool)
+
+# PDV - cache de produtos por código (SKU/GTIN/código de barras), em segundos
+PDV_CODE_CACHE_TTL = config('PDV_CODE_CACHE_TTL', default=60 * 60 * 12, cast=int)
+
+# Assinatura: validade (segundos) do estado em cache usado pelo SubscriptionMiddleware
+SUBSCRIPTION_STATE_CACHE_TTL = config('SUBSCRIPTION_STATE_CACHE_TTL', default=60, cast=int)
+
+# PDV - autorização de supervisor: validade do token (segundos) e limite de falhas por terminal na janela
+SUPERVISOR_OVERRIDE_TTL = config('SUPERVISOR_OVERRIDE_TTL', default=60 * 60 * 2, cast=int)
+SUPERVISOR_AUTH_MAX_FAILURES = config('SUPERVISOR_AUTH_MAX_FAILURES', default=5, cast=int)
+SUPERVISOR_AUTH_WINDOW = config('SUPERVISOR_AUTH_WINDOW', default=60 * 5, cast=int)
+
+# Agendamento público: validade (segundos) da disponibilidade em cache por (data, duração)
+SCHEDULING_AVAILABILITY_CACHE_TTL = config('SCHEDULING_AVAILABILITY_CACHE_TTL', default=60 * 60, cast=int)
+# Exige cache compartilhado (CACHE_URL): a invalidação por signals precisa chegar a todos os workers
+SCHEDULING_REQUIRE_SHARED_CACHE = False
+
 # Fiscal - chave de criptografia (certificado, senha, XML)
 # Gere com: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
 FISCAL_ENCRYPTION_KEY = config('DJANGO_FISCAL_ENCRYPTION_KEY', default='')
 
+# Sincronização NF-e por NSU (apps/fiscal/services/nsu_sync.py)
+FISCAL_SEFAZ_DIST_URL = config('FISCAL_SEFAZ_DIST_URL', default='')  # vazio = endpoints oficiais por UF
+FISCAL_NSU_SYNC_WORKERS = config('FISCAL_NSU_SYNC_WORKERS', default=4, cast=int)
+FISCAL_NSU_MIN_REQUEST_INTERVAL = config('FISCAL_NSU_MIN_REQUEST_INTERVAL', default=1.0, cast=float)
+FISCAL_NSU_BACKOFF_SECONDS = config('FISCAL_NSU_BACKOFF_SECONDS', default=3600, cast=int)
+FISCAL_NSU_DISPATCH_SPACING = config('FISCAL_NSU_DISPATCH_SPACING', default=5, cast=int)
+
 # NF-e: importação por chave de acesso (opcional)
 # Ex: "https://api.exemplo.com/nfe/{access_key}/xml"
 NFE_FETCH_XML_URL_TEMPLATE = config('NFE_FETCH_XML_URL_TEMPLATE', default='')
@@ -8,6 +8,9 @@ from decouple import config
 
 DEBUG = False
 
+# Vários workers do gunicorn: o cache precisa ser compartilhado (check scheduling.E001)
+SCHEDULING_REQUIRE_SHARED_CACHE = True
+
 # Garantir MEDIA_ROOT absoluto para Docker/volume
 MEDIA_ROOT = os.path.abspath(str(BASE_DIR / 'media'))
 
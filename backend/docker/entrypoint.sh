@@ -28,6 +28,7 @@ echo "PostgreSQL pronto."
 
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput --clear
+python manage.py warm_pdv_code_cache || echo "Aviso: cache de códigos do PDV não pré-carregado."
 
 echo "Iniciando Gunicorn..."
 exec "$@"
@@ -1,4 +1,5 @@
 import api from './api'
+import { terminalId } from '@/utils/terminal'
 
 export const salesService = {
   getAll(params = {}) {
@@ -39,11 +40,19 @@ export const salesService = {
     return api.get(`/sales/sales/${saleId}/receipt/`)
   },
 
-  /** Cancel a completed sale (restores stock). Requires reason and supervisor password (current user must be admin). */
-  cancelSale(saleId, reason, supervisorPassword) {
+  /** Authorize a supervisor (admin) once: returns { token, expires_in, supervisor }, valid on this terminal only. */
+  supervisorOverride(supervisorUsername, supervisorPassword) {
+    return api.post('/sales/sales/supervisor-override/', {
+      supervisor_username: supervisorUsername,
+      supervisor_password: supervisorPassword,
+    }, { headers: { 'X-Terminal-Id': terminalId() } })
+  },
+
+  /** Cancel a completed sale (restores stock). Requires reason and a supervisor token from supervisorOverride. */
+  cancelSale(saleId, reason, supervisorToken) {
     return api.post(`/sales/sales/${saleId}/cancel/`, {
       reason,
-      supervisor_password: supervisorPassword,
-    })
+      supervisor_token: supervisorToken,
+    }, { headers: { 'X-Terminal-Id': terminalId() } })
   },
 }
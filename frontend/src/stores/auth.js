@@ -92,6 +92,7 @@ export const useAuthStore = defineStore('auth', {
       localStorage.removeItem('token')
       localStorage.removeItem('refreshToken')
       localStorage.removeItem('auth_user')
+      sessionStorage.removeItem('pdv_supervisor_auth')
       import('@/stores/subscription').then(({ useSubscriptionStore }) => {
         useSubscriptionStore().reset()
       }).catch(() => {})
@@ -0,0 +1,16 @@
+const TERMINAL_KEY = 'pdv_terminal_id'
+
+/**
+ * Identificador estável deste terminal do PDV (gerado uma vez e guardado no navegador).
+ * Vai no header X-Terminal-Id: o token de supervisor só vale no terminal que o pediu.
+ */
+export function terminalId() {
+  let id = localStorage.getItem(TERMINAL_KEY)
+  if (!id) {
+    id = typeof crypto !== 'undefined' && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+    localStorage.setItem(TERMINAL_KEY, id)
+  }
+  return id
+}